@@ -0,0 +1,178 @@
+import json
+import re
+import time
+
+# 默认规则：包含规则与原来的关键词判断相同，另外对容易误判的情况增加排除规则。
+# 命中多条规则时优先级高的生效，优先级相同时排除规则优先。
+# "班"、"豆"这类单字关键词优先级较低，昵称中带学号（学生）或地名"班戈"时不再判为马哥教育成员；
+# 不带学号的昵称（如"豆豆"）仍按关键词判断，可以按群停用"豆"规则。
+DEFAULT_ADMIN_RULES = [
+    {'name': '马哥', 'keyword': '马哥', 'priority': 10},
+    {'name': '老师', 'keyword': '老师', 'priority': 10},
+    {'name': 'magedu', 'keyword': 'magedu', 'ignore_case': True, 'priority': 10},
+    {'name': '助手', 'keyword': '助手', 'priority': 10},
+    {'name': '学号', 'regex': r'^\d+\s*-', 'action': 'exclude', 'priority': 8},
+    {'name': '地名班戈', 'keyword': '班戈', 'action': 'exclude', 'priority': 6},
+    {'name': '班', 'keyword': '班', 'priority': 5},
+    {'name': '豆', 'keyword': '豆', 'priority': 5},
+]
+
+
+class AdminRules:
+    """马哥教育成员（工作人员）识别规则
+
+    规则为包含（include）或排除（exclude）模式，每条规则是关键词（keyword）或正则（regex），带优先级；
+    按群可以停用部分规则或追加规则。每个群的规则编译为一个正则：各规则按 (优先级降序, 排除优先) 排成
+    ".*?规则1|.*?规则2|..." 的分支，一次 match 调用即可得到成员名中生效的那条规则（分组名即规则）。
+    判断时先用只含包含规则的正则 search 一遍，没有命中任何包含规则的成员（绝大多数学生）直接判为否。
+    """
+
+    def __init__(self, rules=None, groups=None):
+        self.rules = [self._normalize(rule) for rule in (DEFAULT_ADMIN_RULES if rules is None else rules)]
+        self.groups = {name: {'disable': set(override.get('disable', [])),
+                              'rules': [self._normalize(rule) for rule in override.get('rules', [])]}
+                       for name, override in (groups or {}).items()}
+        self._compiled = {}  # 群名称 -> 编译后的正则
+
+    @classmethod
+    def load(cls, path):
+        """从JSON规则文件读取：{"rules": [...], "groups": {群名称: {"disable": [...], "rules": [...]}}}，
+        文件中没有 rules 时使用默认规则"""
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config.get('rules'), config.get('groups'))
+
+    @staticmethod
+    def _normalize(rule):
+        """校验一条规则并补全默认值"""
+        if ('keyword' in rule) == ('regex' in rule):
+            raise ValueError(f"规则必须且只能指定 keyword 或 regex：{rule}")
+        action = rule.get('action', 'include')
+        if action not in ('include', 'exclude'):
+            raise ValueError(f"规则的 action 只能是 include 或 exclude：{rule}")
+        pattern = re.escape(rule['keyword']) if 'keyword' in rule else rule['regex']
+        if rule.get('ignore_case'):
+            pattern = f'(?i:{pattern})'
+        # 尽早报告无效的正则；各规则编译进同一个正则时以 r0、r1... 命名分组区分，规则自身不能再有命名分组
+        if re.compile(pattern).groupindex:
+            raise ValueError(f"规则的正则不能包含命名分组 (?P<名称>...)，请改用 (?:...)：{rule}")
+        return {
+            'name': rule.get('name') or rule.get('keyword') or rule['regex'],
+            'pattern': pattern,
+            'action': action,
+            'priority': rule.get('priority', 0),
+        }
+
+    def rules_for(self, group=''):
+        """返回某个群实际生效的规则（默认规则去掉停用的，再加上该群追加的）"""
+        override = self.groups.get(group)
+        if override is None:
+            return list(self.rules)
+        return [rule for rule in self.rules if rule['name'] not in override['disable']] + override['rules']
+
+    def _compile(self, group=''):
+        """把某个群的规则编译为正则并缓存，返回 (包含规则预筛正则, 判定正则, 分组名 -> 规则)"""
+        compiled = self._compiled.get(group)
+        if compiled is None:
+            rules = sorted(self.rules_for(group), key=lambda r: (-r['priority'], r['action'] != 'exclude'))
+            by_key = {f'r{i}': rule for i, rule in enumerate(rules)}
+            includes = [rule['pattern'] for rule in rules if rule['action'] == 'include']
+            if rules:
+                # 按优先顺序逐个分支尝试，第一个在成员名任意位置出现的规则即生效的规则
+                decide = re.compile('(?s:' + '|'.join(f".*?(?P<{key}>{rule['pattern']})"
+                                                      for key, rule in by_key.items()) + ')')
+            else:
+                decide = None
+            prefilter = re.compile('|'.join(f'(?:{pattern})' for pattern in includes)) if includes else None
+            compiled = self._compiled[group] = (prefilter, decide, by_key)
+        return compiled
+
+    def match(self, member, group=''):
+        """返回 (生效的规则, 命中的文本)，没有命中任何规则时返回 None"""
+        _, decide, by_key = self._compile(group)
+        found = decide.match(member) if decide is not None else None
+        if found is None:
+            return None
+        return by_key[found.lastgroup], found.group(found.lastgroup)
+
+    def is_admin(self, member, group=''):
+        """判断成员是否为马哥教育成员，是则返回生效的规则名，否则返回 None"""
+        prefilter, decide, by_key = self._compile(group)
+        if prefilter is None or prefilter.search(member) is None:
+            return None
+        rule = by_key[decide.match(member).lastgroup]
+        return rule['name'] if rule['action'] == 'include' else None
+
+    def explain(self, member, group=''):
+        """返回判断依据：{'admin': 是否为马哥教育成员, 'rule': 生效的规则名, 'action', 'priority',
+        'matched': 命中的文本, 'hits': 所有命中的规则名, 'overridden': 是否有包含规则被排除规则推翻}，
+        没有命中任何规则时 rule 为 None"""
+        decision = self.match(member, group)
+        if decision is None:
+            return {'admin': False, 'rule': None, 'action': None, 'priority': None, 'matched': None,
+                    'hits': [], 'overridden': False}
+        rule, matched = decision
+        # 说明只在排查时使用，逐条规则检查即可
+        _, _, by_key = self._compile(group)
+        hits = [other for other in by_key.values() if re.search(other['pattern'], member)]
+        return {
+            'admin': rule['action'] == 'include',
+            'rule': rule['name'],
+            'action': rule['action'],
+            'priority': rule['priority'],
+            'matched': matched,
+            'hits': [other['name'] for other in hits],
+            'overridden': rule['action'] == 'exclude' and any(other['action'] == 'include' for other in hits),
+        }
+
+
+def legacy_is_admin(member):
+    """原来逐个关键词判断的写法，仅用于性能对比"""
+    return ('马哥' in member or '班' in member or '豆' in member or
+            '老师' in member or 'magedu' in member.lower() or '助手' in member)
+
+
+if __name__ == '__main__':
+    import argparse
+    import random
+
+    parser = argparse.ArgumentParser(description='马哥教育成员识别规则性能测试')
+    parser.add_argument('--members', type=int, default=100000, help='成员数量')
+    parser.add_argument('--rules', help='规则文件（默认使用内置规则）')
+    parser.add_argument('--group', default='', help='按哪个群的规则判断')
+    args = parser.parse_args()
+
+    # 模拟成员名：大部分为"学号-城市-昵称"，少量工作人员和无学号的昵称
+    rng = random.Random(0)
+    cities = ['北京', '上海', '深圳', '杭州', '成都', '班戈', '武汉', '西安']
+    nicknames = ['小明', '豆豆', 'Tom', '阿杰', '班长', '大鹏', 'Lucy', '晴天']
+    members = []
+    for i in range(args.members):
+        roll = rng.random()
+        if roll < 0.02:
+            members.append(rng.choice(['马哥教育-', '老师-', 'MageDu-', '助手-']) + rng.choice(nicknames))
+        elif roll < 0.1:
+            members.append(rng.choice(nicknames) + rng.choice(cities))
+        else:
+            members.append(f'{rng.randrange(100000)}-{rng.choice(cities)}-{rng.choice(nicknames)}')
+
+    rules = AdminRules.load(args.rules) if args.rules else AdminRules()
+    rules.is_admin('', args.group)  # 预先编译
+
+    timings = {}
+    for label, func in (('原关键词判断', legacy_is_admin),
+                        ('编译规则 is_admin', lambda m: rules.is_admin(m, args.group)),
+                        ('编译规则 explain', lambda m: rules.explain(m, args.group)['admin'])):
+        start = time.perf_counter()
+        results = [bool(func(member)) for member in members]
+        timings[label] = time.perf_counter() - start
+        if label == '原关键词判断':
+            legacy = results
+        elif label == '编译规则 is_admin':
+            current = results
+
+    print(f"成员数量：{args.members}，规则数量：{len(rules.rules_for(args.group))}")
+    for label, elapsed in timings.items():
+        print(f"{label}：{elapsed * 1000:.1f} ms（每人 {elapsed / args.members * 1e6:.2f} µs）")
+    print(f"原写法判为马哥教育成员：{sum(legacy)}人，规则判为：{sum(current)}人，"
+          f"结果不同：{sum(1 for a, b in zip(legacy, current) if a != b)}人")
@@ -0,0 +1,203 @@
+import argparse
+import base64
+import html
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from wechat_group_analysis import WeChatGroupAnalyzer
+
+# 每个工作进程持有一个常驻的分析器实例（地名索引、地图、字体均已预热）
+_worker_analyzer = None
+
+
+def _init_worker():
+    """工作进程初始化：切换到无界面绘图后端并预热分析器"""
+    global _worker_analyzer
+    import matplotlib
+    matplotlib.use('Agg')
+    _worker_analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    _worker_analyzer.warm_up()
+
+
+def _analyze_task(members):
+    """在工作进程中分析成员并返回统计结果"""
+    _worker_analyzer.analyze_members(members, verbose=False)
+    return _worker_analyzer.get_statistics()
+
+
+def _report_task(members, fmt):
+    """在工作进程中生成报告，返回 (Content-Type, 内容字节)"""
+    _worker_analyzer.analyze_members(members, verbose=False)
+    text_content = _worker_analyzer.generate_text_result()
+    image = _worker_analyzer.render_report_image(text_content)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    png_data = buffer.getvalue()
+
+    if fmt == 'png':
+        return 'image/png', png_data
+
+    # HTML格式：内嵌图片和文本报告
+    page = (
+        '<!DOCTYPE html>\n'
+        '<html><head><meta charset="utf-8"><title>微信群成员分析报告</title></head>\n'
+        '<body>\n'
+        f'<img src="data:image/png;base64,{base64.b64encode(png_data).decode("ascii")}" '
+        'style="max-width:100%">\n'
+        f'<pre>{html.escape(text_content)}</pre>\n'
+        '</body></html>\n'
+    )
+    return 'text/html; charset=utf-8', page.encode('utf-8')
+
+
+class ServiceBusy(Exception):
+    """排队等待超时，在途请求仍然已满"""
+
+
+class AnalysisService:
+    """有界工作进程池：限制同时在途的请求数，超出时排队等待，等待超过 queue_timeout 秒才拒绝"""
+
+    def __init__(self, workers=None, max_pending=None, timeout=300, queue_timeout=30):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def warm_up(self):
+        """启动所有工作进程，使首个请求无需等待冷启动"""
+        futures = [self._executor.submit(_analyze_task, []) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def submit(self, func, *args):
+        """提交任务并等待结果；在途请求已满时最多排队等待 queue_timeout 秒"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceBusy()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理：POST /analyze 返回JSON统计，POST /report 返回PNG或HTML报告"""
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self._send(status, 'application/json; charset=utf-8', body)
+
+    def _read_members(self):
+        """读取请求体中的成员列表：JSON（列表或 {"members": [...]}）或每行一个成员的纯文本"""
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        content_type = self.headers.get('Content-Type', '')
+
+        if 'json' in content_type:
+            data = json.loads(body)
+            if isinstance(data, dict):
+                data = data.get('members', [])
+            if not isinstance(data, list):
+                raise ValueError("members 必须是列表")
+            members = [str(m).strip() for m in data]
+        else:
+            members = [line.strip() for line in body.splitlines()]
+
+        # 去重并去掉空行
+        return list(dict.fromkeys(m for m in members if m))
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/health':
+            service = self.server.service
+            self._send_json(200, {'status': 'ok', 'workers': service.workers, 'max_pending': service.max_pending,
+                                  'queue_timeout': service.queue_timeout})
+        else:
+            self._send_json(404, {'error': '未知路径'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ('/analyze', '/report'):
+            self._send_json(404, {'error': '未知路径'})
+            return
+
+        try:
+            members = self._read_members()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {'error': f'请求体无法解析：{str(e)}'})
+            return
+
+        try:
+            if url.path == '/analyze':
+                self._send_json(200, self.server.service.submit(_analyze_task, members))
+            else:
+                fmt = parse_qs(url.query).get('format', ['png'])[0].lower()
+                if fmt not in ('png', 'html'):
+                    self._send_json(400, {'error': 'format 仅支持 png 或 html'})
+                    return
+                content_type, body = self.server.service.submit(_report_task, members, fmt)
+                self._send(200, content_type, body)
+        except ServiceBusy:
+            self._send_json(503, {'error': '服务繁忙，请稍后重试'})
+        except FutureTimeoutError:
+            self._send_json(504, {'error': '处理超时'})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微信群成员分析本地HTTP服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--max-pending', type=int, default=None, help='最大在途请求数（默认工作进程数的2倍）')
+    parser.add_argument('--timeout', type=int, default=300, help='单个请求的处理超时（秒）')
+    parser.add_argument('--queue-timeout', type=float, default=30, help='在途请求已满时最多排队等待的秒数，超过后返回503')
+    parser.add_argument('--verbose', action='store_true', help='输出访问日志')
+    args = parser.parse_args()
+
+    service = AnalysisService(args.workers, args.max_pending, args.timeout, args.queue_timeout)
+    print(f"正在预热 {service.workers} 个工作进程...")
+    service.warm_up()
+
+    server = ThreadingHTTPServer((args.host, args.port), AnalysisRequestHandler)
+    server.service = service
+    server.verbose = args.verbose
+    print(f"分析服务已启动：http://{args.host}:{args.port}")
+    print("POST /analyze  -> JSON统计结果")
+    print("POST /report?format=png|html  -> 报告图片或网页")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在关闭服务...")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
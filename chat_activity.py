@@ -0,0 +1,256 @@
+import csv
+import heapq
+import os
+import re
+import time
+from array import array
+
+from wechat_group_analysis import normalize_member_name, parse_student_id
+
+# 聊天记录TXT中的消息头："时间 发送者" 或 "时间 发送者: 内容"（消息内容在后续行或同一行冒号之后），
+# 以及 "发送者 时间"（从电脑版微信复制的格式）。不是消息头的行视为上一条消息的内容。
+# 以时间开头或结尾的消息内容（如"2024-05-02 10:00 开会"、"会议改到 2024-05-01 10:00"）也符合消息头的格式，
+# 所以两种格式都只在消息边界（文件开头或空行之后）或发送者是已知成员时才作为消息头
+_TIME = r'\[?\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2}日?\s+\d{1,2}:\d{2}(?::\d{2})?\]?'
+TIME_FIRST_HEADER = re.compile(rf'^{_TIME}\s+(?P<sender>[^:：]+?)\s*(?:[:：].*)?$')
+SENDER_FIRST_HEADER = re.compile(rf'^(?P<sender>.+?)\s+{_TIME}$')
+
+# 聊天记录CSV中可能的发送者列名（未指定 --sender-column 时按顺序查找）
+SENDER_COLUMNS = ('发送者', '发送人', '昵称', 'sender', 'Sender', 'NickName', 'nickname', 'talker')
+
+# 发送者名称 -> 成员ID 的解析缓存上限，超过时清空，保证内存占用有上限
+RESOLVE_CACHE_SIZE = 100000
+
+# 马哥教育成员、国外和未知地区成员在省份统计中的分组名称
+ADMIN_BUCKET = '马哥教育'
+FOREIGN_BUCKET = '国外'
+UNKNOWN_BUCKET = '未知地区'
+
+
+def iter_senders(path, sender_column=None, is_member=None):
+    """逐条产生聊天记录中每条消息的发送者，.csv 按发送者列读取，其余按TXT消息头识别；不会一次性读入整个文件
+
+    is_member(发送者) 判断是否为已知成员，用于识别不在消息边界处（不在空行之后）的消息头
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='' if path.lower().endswith('.csv') else None) as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.reader(f)
+            header = [column.strip() for column in next(reader, [])]
+            columns = [sender_column] if sender_column else SENDER_COLUMNS
+            index = next((header.index(column) for column in columns if column in header), None)
+            if index is None:
+                raise ValueError(f"聊天记录 {path} 中没有发送者列（可用 --sender-column 指定，现有列：{'、'.join(header)}）")
+            for row in reader:
+                if len(row) > index and row[index].strip():
+                    yield row[index]
+            return
+
+        boundary = True  # 文件开头或空行之后
+        for line in f:
+            line = line.strip()
+            if not line:
+                boundary = True
+                continue
+            match = TIME_FIRST_HEADER.match(line) or SENDER_FIRST_HEADER.match(line)
+            if match is not None and not boundary and not (is_member and is_member(match.group('sender'))):
+                match = None
+            boundary = False
+            if match is not None:
+                yield match.group('sender')
+
+
+class MemberIndex:
+    """分类结果中的成员表：成员名和学号建立哈希索引，每个成员对应一个整数ID和所属分组（省份等）"""
+
+    def __init__(self, analyzer):
+        self.members = []   # 成员ID -> 成员名
+        self.buckets = []   # 成员ID -> 分组名称（省份、马哥教育、国外、未知地区）
+        self.cities = []    # 成员ID -> 城市（省会或无城市时为 None）
+        for member in analyzer.admin_members:
+            self._add(member, ADMIN_BUCKET, None)
+        for province, data in analyzer.province_city_members.items():
+            for city, members in data['cities'].items():
+                for member in members:
+                    self._add(member, province, None if city == '省会' else city)
+        for member in analyzer.foreign_members:
+            self._add(member, FOREIGN_BUCKET, None)
+        for member in analyzer.unknown_members:
+            self._add(member, UNKNOWN_BUCKET, None)
+
+        self.by_name = {}
+        self.by_student_id = {}
+        for member_id, member in enumerate(self.members):
+            self.by_name.setdefault(normalize_member_name(member), member_id)
+            student_id = parse_student_id(member)
+            if student_id is not None:
+                # 同一学号对应多个成员名时无法确定是谁，不按学号解析
+                self.by_student_id[student_id] = -1 if student_id in self.by_student_id else member_id
+
+    def _add(self, member, bucket, city):
+        self.members.append(member)
+        self.buckets.append(bucket)
+        self.cities.append(city)
+
+    def __len__(self):
+        return len(self.members)
+
+    def resolve(self, sender):
+        """把发送者名称解析为成员ID：先按完整成员名，再按学号（群昵称改过城市或昵称时仍能对上），解析不到返回 None"""
+        name = normalize_member_name(sender)
+        member_id = self.by_name.get(name)
+        if member_id is not None:
+            return member_id
+        student_id = parse_student_id(name)
+        if student_id is not None:
+            member_id = self.by_student_id.get(student_id, -1)
+            if member_id >= 0:
+                return member_id
+        return None
+
+
+class ActivityCounter:
+    """流式统计每个成员的发言数：计数保存在按成员ID索引的数组中，内存只与成员数有关，与聊天记录长度无关
+
+    未能对应到成员的发送者（已退群、改了昵称或系统消息）用 Count-Min 草图统计，只保留出现最多的少量候选。
+    """
+
+    def __init__(self, index, unmatched_top=20):
+        from sketches import CountMinSketch, HeavyHitters
+
+        self.index = index
+        self.counts = array('L', [0]) * len(index)
+        self.messages = 0
+        self.unmatched_messages = 0
+        self.unmatched = HeavyHitters(CountMinSketch(1024, 4), unmatched_top)
+        self._resolved = {}  # 发送者名称 -> 成员ID（-1 表示解析不到）
+
+    def add(self, sender):
+        member_id = self._resolved.get(sender)
+        if member_id is None:
+            if len(self._resolved) >= RESOLVE_CACHE_SIZE:
+                self._resolved.clear()
+            member_id = self.index.resolve(sender)
+            member_id = self._resolved[sender] = -1 if member_id is None else member_id
+        self.messages += 1
+        if member_id >= 0:
+            self.counts[member_id] += 1
+        else:
+            self.unmatched_messages += 1
+            self.unmatched.add(normalize_member_name(sender))
+
+    def is_member(self, sender):
+        """发送者能否对应到成员"""
+        return self.index.resolve(sender) is not None
+
+    def add_file(self, path, sender_column=None):
+        """统计一个聊天记录文件，返回其中的消息数"""
+        before = self.messages
+        for sender in iter_senders(path, sender_column, self.is_member):
+            self.add(sender)
+        return self.messages - before
+
+    def top_speakers(self, k=20):
+        """发言最多的 k 名成员：[(成员名, 分组, 城市, 消息数)]，用大小为 k 的堆选出，不对全部成员排序"""
+        counts = self.counts
+        top = heapq.nlargest(k, (member_id for member_id in range(len(counts)) if counts[member_id]),
+                             key=counts.__getitem__)
+        return [(self.index.members[i], self.index.buckets[i], self.index.cities[i], counts[i]) for i in top]
+
+    def bucket_activity(self):
+        """按分组统计：[(分组, 成员数, 发言成员数, 消息数, 人均消息数)]，按人均消息数降序"""
+        totals = {}
+        for bucket, count in zip(self.index.buckets, self.counts):
+            entry = totals.setdefault(bucket, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += count > 0
+            entry[2] += count
+        rows = [(bucket, members, active, messages, messages / members)
+                for bucket, (members, active, messages) in totals.items()]
+        return sorted(rows, key=lambda row: (-row[4], -row[3]))
+
+    def memory(self):
+        """计数数组和草图占用的字节数（不含成员索引）"""
+        return self.counts.itemsize * len(self.counts) + self.unmatched.sketch.memory()
+
+
+def write_activity_csv(counter, path, top=100):
+    """将分组统计和发言最多的成员写入CSV"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['类型', '名称', '地区', '成员数', '发言成员数', '消息数', '人均消息数'])
+        for bucket, members, active, messages, per_capita in counter.bucket_activity():
+            writer.writerow(['地区', bucket, bucket, members, active, messages, f'{per_capita:.2f}'])
+        for member, bucket, city, messages in counter.top_speakers(top):
+            writer.writerow(['成员', member, city or bucket, '', '', messages, ''])
+
+
+def generate_chat_log(path, members, messages, seed=0):
+    """按 Zipf 分布生成模拟聊天记录（少数成员发言很多），用于性能测试"""
+    import random
+
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(len(members))]
+    senders = rng.choices(members, weights=weights, k=messages)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, sender in enumerate(senders):
+            f.write(f'2024-{i * 12 // messages + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}:00 {sender}\n')
+            f.write('收到，谢谢老师\n\n')
+
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+
+    from wechat_group_analysis import WeChatGroupAnalyzer, read_members_file
+
+    parser = argparse.ArgumentParser(description='聊天活跃度统计性能测试')
+    parser.add_argument('members', help='成员文件')
+    parser.add_argument('--messages', type=int, default=1000000, help='模拟的消息数')
+    args = parser.parse_args()
+
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    members = read_members_file(args.members)
+    analyzer.analyze_members(members, verbose=False)
+    index = MemberIndex(analyzer)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # 自测：以时间开头或结尾的消息内容不应被当作消息头
+        path = os.path.join(directory, 'headers.txt')
+        first, second = members[0], members[-1]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'{first} 2024-05-01 09:00\n明天的会议\n会议改到 2024-05-01 10:00\n\n'
+                    f'{second} 2024-05-01 09:05\n收到\n{first} 2024-05-01 09:06\n好的\n'
+                    f'2024-05-01 09:07 {second}: 会议改到 2024-05-02 10:00\n'
+                    f'2024-05-02 10:00 开会\n\n2024-05-02 11:00 已退群的人\n再见\n')
+        counter = ActivityCounter(index)
+        senders = list(iter_senders(path, is_member=counter.is_member))
+        expected = [first, second, first, second, '已退群的人']
+        if senders != expected:
+            raise SystemExit(f"消息头识别自测失败：识别出 {senders}，应为 {expected}")
+        print("消息头识别自测通过")
+
+        path = os.path.join(directory, 'chat.txt')
+        generate_chat_log(path, members, args.messages)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        counter = ActivityCounter(index)
+        counter.add_file(path)
+        elapsed = time.perf_counter() - start
+
+        # 对照：逐条消息在成员列表中查找发送者，计数放在字典里
+        start = time.perf_counter()
+        naive = {}
+        for sender in iter_senders(path, is_member=counter.is_member):
+            for member in members:
+                if normalize_member_name(member) == normalize_member_name(sender):
+                    naive[member] = naive.get(member, 0) + 1
+                    break
+            if time.perf_counter() - start > 10:  # 太慢，只跑10秒估算速度
+                break
+        naive_messages = sum(naive.values())
+        naive_elapsed = time.perf_counter() - start
+
+    print(f"成员 {len(members)} 人，消息 {counter.messages} 条（{size / 1024 / 1024:.1f}MB）")
+    print(f"哈希索引：{elapsed:.2f}s（每秒 {counter.messages / elapsed:,.0f} 条），计数占用 {counter.memory() / 1024:.0f}KB")
+    print(f"逐个查找：{naive_elapsed:.2f}s 只处理了 {naive_messages} 条（每秒 {naive_messages / naive_elapsed:,.0f} 条）")
@@ -0,0 +1,73 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# 文本分析阶段不允许加载的重量级依赖
+HEAVY_MODULES = ['wxauto', 'geopandas', 'shapely', 'matplotlib', 'wordcloud',
+                 'requests', 'pandas', 'numpy', 'PIL']
+
+# 在子进程中执行的纯文本流程：导入模块 -> 分类 -> 生成 group_analysis.txt
+TEXT_ONLY_SNIPPET = '''
+import wechat_group_analysis as w
+w.main(['report', '--members', 'members.txt', '--text-only', '--quiet'])
+'''
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 {模块名: 累计耗时(微秒)}"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        cumulative_us = int(parts[1].strip())
+        name = parts[2].strip()
+        timings[name] = cumulative_us
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检查纯文本分析流程的导入耗时预算')
+    parser.add_argument('--budget-ms', type=float, default=150.0,
+                        help='导入 wechat_group_analysis 的累计耗时上限（毫秒）')
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(os.path.join(work_dir, 'members.txt'), 'w', encoding='utf-8') as f:
+            f.write('1001-深圳-小明\n1002-川-小红\n1003-多伦多-Tom\n马哥教育-助教\n')
+
+        env = dict(os.environ, PYTHONPATH=repo_dir, PYTHONIOENCODING='utf-8')
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', TEXT_ONLY_SNIPPET],
+                                cwd=work_dir, env=env, capture_output=True, text=True, encoding='utf-8')
+        if result.returncode != 0:
+            print(result.stderr)
+            print("纯文本流程运行失败")
+            return 1
+        if not os.path.exists(os.path.join(work_dir, 'group_analysis.txt')):
+            print("纯文本流程没有生成 group_analysis.txt")
+            return 1
+
+    timings = parse_importtime(result.stderr)
+    failed = False
+
+    loaded_heavy = sorted(name for name in timings
+                          if name.split('.')[0] in HEAVY_MODULES)
+    if loaded_heavy:
+        print(f"纯文本流程加载了重量级依赖：{', '.join(loaded_heavy)}")
+        failed = True
+
+    module_ms = timings.get('wechat_group_analysis', 0) / 1000
+    print(f"导入 wechat_group_analysis 累计耗时：{module_ms:.1f}ms（预算 {args.budget_ms:.0f}ms）")
+    if module_ms > args.budget_ms:
+        print("导入耗时超出预算")
+        failed = True
+
+    print("检查失败" if failed else "检查通过")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# 地名表中各城市（地级行政区驻地）的大致经纬度 (经度, 纬度)，精度约 0.1 度，用于绘制城市分布密度
+CITY_COORDINATES = {
+    # 直辖市
+    '北京': (116.40, 39.90), '上海': (121.47, 31.23), '天津': (117.20, 39.08), '重庆': (106.55, 29.56),
+
+    # 广东
+    '广州': (113.26, 23.13), '深圳': (114.06, 22.54), '珠海': (113.58, 22.27), '汕头': (116.68, 23.35),
+    '佛山': (113.12, 23.02), '韶关': (113.60, 24.81), '湛江': (110.36, 21.27), '肇庆': (112.47, 23.05),
+    '江门': (113.08, 22.58), '茂名': (110.93, 21.66), '惠州': (114.42, 23.11), '梅州': (116.12, 24.29),
+    '汕尾': (115.38, 22.79), '河源': (114.70, 23.74), '阳江': (111.98, 21.86), '清远': (113.06, 23.68),
+    '东莞': (113.75, 23.02), '中山': (113.39, 22.52), '潮州': (116.62, 23.66), '揭阳': (116.37, 23.55),
+    '云浮': (112.04, 22.92),
+
+    # 浙江
+    '杭州': (120.16, 30.27), '宁波': (121.55, 29.87), '温州': (120.70, 28.00), '嘉兴': (120.76, 30.75),
+    '湖州': (120.09, 30.89), '绍兴': (120.58, 30.03), '金华': (119.65, 29.08), '衢州': (118.87, 28.94),
+    '舟山': (122.21, 29.99), '台州': (121.42, 28.66), '丽水': (119.92, 28.45),
+
+    # 江苏
+    '南京': (118.80, 32.06), '无锡': (120.31, 31.49), '徐州': (117.28, 34.21), '常州': (119.97, 31.81),
+    '苏州': (120.59, 31.30), '南通': (120.89, 31.98), '连云港': (119.22, 34.60), '淮安': (119.02, 33.61),
+    '盐城': (120.16, 33.35), '扬州': (119.41, 32.39), '镇江': (119.43, 32.19), '泰州': (119.92, 32.46),
+    '宿迁': (118.28, 33.96),
+
+    # 山东
+    '济南': (117.00, 36.67), '青岛': (120.38, 36.07), '淄博': (118.05, 36.81), '枣庄': (117.32, 34.81),
+    '东营': (118.67, 37.43), '烟台': (121.45, 37.46), '潍坊': (119.16, 36.71), '济宁': (116.59, 35.41),
+    '泰安': (117.09, 36.20), '威海': (122.12, 37.51), '日照': (119.53, 35.42), '临沂': (118.36, 35.10),
+    '德州': (116.36, 37.44), '聊城': (115.99, 36.46), '滨州': (117.97, 37.38), '菏泽': (115.48, 35.23),
+
+    # 河南
+    '郑州': (113.63, 34.75), '开封': (114.31, 34.80), '洛阳': (112.45, 34.62), '平顶山': (113.19, 33.77),
+    '安阳': (114.39, 36.10), '鹤壁': (114.30, 35.75), '新乡': (113.93, 35.30), '焦作': (113.24, 35.22),
+    '濮阳': (115.03, 35.76), '许昌': (113.85, 34.04), '漯河': (114.02, 33.58), '三门峡': (111.20, 34.77),
+    '南阳': (112.53, 33.00), '商丘': (115.66, 34.41), '信阳': (114.09, 32.15), '周口': (114.70, 33.63),
+    '驻马店': (114.02, 33.01),
+
+    # 湖北
+    '武汉': (114.31, 30.59), '黄石': (115.04, 30.20), '十堰': (110.80, 32.63), '宜昌': (111.29, 30.69),
+    '襄阳': (112.14, 32.04), '鄂州': (114.89, 30.39), '荆门': (112.20, 31.04), '孝感': (113.92, 30.92),
+    '荆州': (112.24, 30.33), '黄冈': (114.87, 30.45), '咸宁': (114.32, 29.84), '随州': (113.38, 31.69),
+    '恩施': (109.49, 30.27),
+
+    # 湖南
+    '长沙': (112.94, 28.23), '株洲': (113.13, 27.83), '湘潭': (112.94, 27.83), '衡阳': (112.57, 26.89),
+    '邵阳': (111.47, 27.24), '岳阳': (113.13, 29.36), '常德': (111.70, 29.03), '张家界': (110.48, 29.12),
+    '益阳': (112.36, 28.55), '郴州': (113.01, 25.77), '永州': (111.61, 26.42), '怀化': (110.00, 27.57),
+    '娄底': (112.00, 27.70), '湘西': (109.74, 28.31),
+
+    # 河北
+    '石家庄': (114.51, 38.04), '唐山': (118.18, 39.63), '秦皇岛': (119.60, 39.94), '邯郸': (114.54, 36.63),
+    '邢台': (114.50, 37.07), '保定': (115.46, 38.87), '张家口': (114.89, 40.82), '承德': (117.96, 40.95),
+    '沧州': (116.84, 38.30), '廊坊': (116.68, 39.54), '衡水': (115.67, 37.74),
+
+    # 山西
+    '太原': (112.55, 37.87), '大同': (113.30, 40.08), '阳泉': (113.58, 37.86), '长治': (113.12, 36.20),
+    '晋城': (112.85, 35.49), '朔州': (112.43, 39.33), '晋中': (112.75, 37.69), '运城': (111.01, 35.03),
+    '忻州': (112.73, 38.42), '临汾': (111.52, 36.09), '吕梁': (111.14, 37.52),
+
+    # 内蒙古
+    '呼和浩特': (111.75, 40.84), '包头': (109.84, 40.66), '乌海': (106.79, 39.66), '赤峰': (118.89, 42.26),
+    '通辽': (122.24, 43.65), '鄂尔多斯': (109.78, 39.61), '呼伦贝尔': (119.77, 49.21), '巴彦淖尔': (107.39, 40.74),
+    '乌兰察布': (113.13, 40.99),
+
+    # 辽宁
+    '沈阳': (123.43, 41.81), '大连': (121.61, 38.91), '鞍山': (122.99, 41.11), '抚顺': (123.96, 41.88),
+    '本溪': (123.77, 41.29), '丹东': (124.35, 40.00), '锦州': (121.13, 41.10), '营口': (122.24, 40.67),
+    '阜新': (121.67, 42.02), '辽阳': (123.24, 41.27), '盘锦': (122.07, 41.12), '铁岭': (123.84, 42.29),
+    '朝阳': (120.45, 41.57), '葫芦岛': (120.84, 40.71),
+
+    # 吉林
+    '长春': (125.32, 43.82), '吉林': (126.55, 43.84), '四平': (124.35, 43.17), '辽源': (125.14, 42.89),
+    '通化': (125.94, 41.73), '白山': (126.42, 41.94), '松原': (124.83, 45.14), '白城': (122.84, 45.62),
+    '延边': (129.51, 42.89),
+
+    # 黑龙江
+    '哈尔滨': (126.53, 45.80), '齐齐哈尔': (123.92, 47.35), '鸡西': (130.97, 45.30), '鹤岗': (130.30, 47.35),
+    '双鸭山': (131.16, 46.65), '大庆': (125.10, 46.59), '伊春': (128.84, 47.73), '佳木斯': (130.32, 46.80),
+    '七台河': (131.00, 45.77), '牡丹江': (129.63, 44.55), '黑河': (127.53, 50.25), '绥化': (126.97, 46.65),
+    '大兴安岭': (124.12, 50.41),
+
+    # 陕西
+    '西安': (108.94, 34.34), '铜川': (108.95, 34.90), '宝鸡': (107.24, 34.36), '咸阳': (108.71, 34.33),
+    '渭南': (109.51, 34.50), '延安': (109.49, 36.59), '汉中': (107.02, 33.07), '榆林': (109.73, 38.29),
+    '安康': (109.03, 32.69), '商洛': (109.94, 33.87),
+
+    # 甘肃
+    '兰州': (103.83, 36.06), '嘉峪关': (98.29, 39.77), '金昌': (102.19, 38.52), '白银': (104.14, 36.55),
+    '天水': (105.72, 34.58), '武威': (102.64, 37.93), '张掖': (100.45, 38.93), '平凉': (106.67, 35.54),
+    '酒泉': (98.49, 39.73), '庆阳': (107.64, 35.71), '定西': (104.63, 35.58), '陇南': (104.92, 33.40),
+    '临夏': (103.21, 35.60), '甘南': (102.91, 34.98),
+
+    # 青海
+    '西宁': (101.78, 36.62), '海东': (102.10, 36.50), '海北': (100.90, 36.95), '黄南': (102.02, 35.52),
+    '海南': (100.62, 36.29), '果洛': (100.24, 34.47), '玉树': (97.01, 33.00), '海西': (97.37, 37.38),
+
+    # 宁夏
+    '银川': (106.23, 38.49), '石嘴山': (106.38, 39.02), '吴忠': (106.20, 37.99), '固原': (106.24, 36.02),
+    '中卫': (105.19, 37.51),
+
+    # 新疆
+    '乌鲁木齐': (87.62, 43.83), '克拉玛依': (84.89, 45.58), '吐鲁番': (89.19, 42.95), '哈密': (93.51, 42.82),
+    '昌吉': (87.31, 44.01), '博尔塔拉': (82.07, 44.91), '巴音郭楞': (86.15, 41.76), '阿克苏': (80.26, 41.17),
+    '克孜勒苏': (76.17, 39.71), '喀什': (75.99, 39.47), '和田': (79.92, 37.11), '伊犁': (81.32, 43.92),
+    '塔城': (82.98, 46.75), '阿勒泰': (88.14, 47.84),
+
+    # 四川
+    '成都': (104.07, 30.57), '自贡': (104.78, 29.34), '攀枝花': (101.72, 26.58), '泸州': (105.44, 28.87),
+    '德阳': (104.40, 31.13), '绵阳': (104.68, 31.47), '广元': (105.84, 32.44), '遂宁': (105.59, 30.53),
+    '内江': (105.06, 29.58), '乐山': (103.77, 29.55), '南充': (106.11, 30.84), '眉山': (103.85, 30.08),
+    '宜宾': (104.64, 28.75), '广安': (106.63, 30.46), '达州': (107.47, 31.21), '雅安': (103.04, 30.01),
+    '巴中': (106.75, 31.87), '资阳': (104.63, 30.13), '阿坝': (102.22, 31.90), '甘孜': (101.96, 30.05),
+    '凉山': (102.27, 27.88),
+
+    # 贵州
+    '贵阳': (106.63, 26.65), '六盘水': (104.83, 26.59), '遵义': (106.93, 27.73), '安顺': (105.95, 26.25),
+    '毕节': (105.29, 27.30), '铜仁': (109.19, 27.72), '黔西南': (104.90, 25.09), '黔东南': (107.98, 26.58),
+    '黔南': (107.52, 26.25),
+
+    # 云南
+    '昆明': (102.83, 24.88), '曲靖': (103.80, 25.49), '玉溪': (102.55, 24.35), '保山': (99.16, 25.11),
+    '昭通': (103.72, 27.34), '丽江': (100.23, 26.86), '普洱': (100.97, 22.83), '临沧': (100.09, 23.88),
+    '楚雄': (101.53, 25.05), '红河': (103.38, 23.36), '文山': (104.22, 23.40), '西双版纳': (100.80, 22.01),
+    '大理': (100.27, 25.61), '德宏': (98.58, 24.43), '怒江': (98.86, 25.85), '迪庆': (99.70, 27.82),
+
+    # 西藏
+    '拉萨': (91.13, 29.65), '日喀则': (88.88, 29.27), '昌都': (97.17, 31.14), '林芝': (94.36, 29.65),
+    '山南': (91.77, 29.24), '那曲': (92.05, 31.48), '阿里': (80.11, 32.50),
+
+    # 安徽
+    '合肥': (117.23, 31.82), '芜湖': (118.43, 31.35), '蚌埠': (117.39, 32.92), '淮南': (117.00, 32.63),
+    '马鞍山': (118.51, 31.67), '淮北': (116.80, 33.96), '铜陵': (117.81, 30.95), '安庆': (117.06, 30.53),
+    '黄山': (118.34, 29.72), '滁州': (118.33, 32.26), '阜阳': (115.81, 32.89), '宿州': (116.96, 33.65),
+    '六安': (116.52, 31.74), '亳州': (115.78, 33.85), '池州': (117.49, 30.66), '宣城': (118.76, 30.94),
+
+    # 江西
+    '南昌': (115.86, 28.68), '景德镇': (117.18, 29.27), '萍乡': (113.85, 27.62), '九江': (116.00, 29.71),
+    '新余': (114.92, 27.82), '鹰潭': (117.07, 28.26), '赣州': (114.93, 25.83), '吉安': (114.99, 27.11),
+    '宜春': (114.42, 27.81), '抚州': (116.36, 27.95), '上饶': (117.94, 28.45),
+
+    # 福建
+    '福州': (119.30, 26.08), '厦门': (118.09, 24.48), '莆田': (119.01, 25.45), '三明': (117.64, 26.26),
+    '泉州': (118.68, 24.87), '漳州': (117.65, 24.51), '南平': (118.18, 26.64), '龙岩': (117.02, 25.08),
+    '宁德': (119.55, 26.67),
+
+    # 广西
+    '南宁': (108.37, 22.82), '柳州': (109.41, 24.33), '桂林': (110.29, 25.27), '梧州': (111.28, 23.48),
+    '北海': (109.12, 21.48), '防城港': (108.35, 21.69), '钦州': (108.65, 21.98), '贵港': (109.60, 23.11),
+    '玉林': (110.18, 22.65), '百色': (106.62, 23.90), '贺州': (111.57, 24.40), '河池': (108.09, 24.69),
+    '来宾': (109.22, 23.75), '崇左': (107.36, 22.38),
+
+    # 海南
+    '海口': (110.20, 20.04), '三亚': (109.51, 18.25), '三沙': (112.34, 16.83), '儋州': (109.58, 19.52),
+
+    # 特别行政区、台湾
+    '香港': (114.17, 22.32), '澳门': (113.54, 22.19),
+    '台北': (121.56, 25.04), '高雄': (120.31, 22.63), '台中': (120.68, 24.14), '台南': (120.21, 22.99),
+    '新北': (121.47, 25.01),
+}
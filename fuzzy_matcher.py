@@ -0,0 +1,250 @@
+import re
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 地名中常见繁体字到简体字的映射（覆盖内置地名表用到的字）
+_TRADITIONAL = (
+    '廣東門蘇遼龍寧陝貴雲樂漢濟島廈鄭華溫興紹麗長無錫蘭烏魯齊爾濱撫錦營鐵葫蘆黃岡鹹隨張關遠寶銅義'
+    '順畢臨滄連鹽揚鎮贛饒鷹鄉餘蕪馬內倫貝懷婁嶽濰煙棗開頂鶴許峽駐臺灣節雙納紅達資綿瀘貢涼壩薩區維'
+    '瑪則銀隴樹荊雞崗鴨綏嶺瀋邊鄲莊晉運呂頭彥亞滬紐約磯頓圖徹賽聖羅慶陽'
+)
+_SIMPLIFIED = (
+    '广东门苏辽龙宁陕贵云乐汉济岛厦郑华温兴绍丽长无锡兰乌鲁齐尔滨抚锦营铁葫芦黄冈咸随张关远宝铜义'
+    '顺毕临沧连盐扬镇赣饶鹰乡余芜马内伦贝怀娄岳潍烟枣开顶鹤许峡驻台湾节双纳红达资绵泸贡凉坝萨区维'
+    '玛则银陇树荆鸡岗鸭绥岭沈边郸庄晋运吕头彦亚沪纽约矶顿图彻赛圣罗庆阳'
+)
+TRADITIONAL_TO_SIMPLIFIED = str.maketrans(_TRADITIONAL, _SIMPLIFIED)
+
+# 常见的英文/旧式拼写
+EXONYMS = {
+    'hongkong': '香港', 'hk': '香港', 'macau': '澳门', 'macao': '澳门',
+    'taipei': '台北', 'kaohsiung': '高雄', 'taichung': '台中', 'tainan': '台南',
+    'peking': '北京', 'canton': '广州', 'tibet': '西藏', 'innermongolia': '内蒙古',
+    'amoy': '厦门', 'harbin': '哈尔滨', 'urumqi': '乌鲁木齐',
+}
+
+# 约定俗成的城市缩写（首字母缩写本身歧义较大，只认这些）
+COMMON_ABBREVIATIONS = {
+    'bj': '北京', 'sh': '上海', 'tj': '天津', 'cq': '重庆', 'sz': '深圳', 'gz': '广州',
+    'hz': '杭州', 'nj': '南京', 'cd': '成都', 'wh': '武汉', 'xa': '西安', 'cs': '长沙',
+}
+
+# pypinyin 默认读音不符合地名习惯的多音字地名
+PINYIN_OVERRIDES = {'朝阳': 'chaoyang', '六安': 'luan', '蚌埠': 'bengbu', '乐山': 'leshan', '昌都': 'changdu'}
+
+# 匹配来源及其基础置信度
+SOURCE_CONFIDENCE = {
+    'traditional': 0.95,
+    'english': 0.9,
+    'pinyin': 0.9,
+    'pinyin_fuzzy': 0.8,
+    'abbreviation': 0.7,
+    'fuzzy': 0.8,
+}
+
+_SEGMENT_SPLIT = re.compile(r'[-－—_|｜/,，、()（）\[\]【】]+')
+_TOKEN = re.compile(r'[A-Za-z]+(?:\s+[A-Za-z]+)*|[\u4e00-\u9fff]+')
+
+
+def levenshtein(a, b):
+    """计算两个字符串的编辑距离"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class DeletionIndex:
+    """删除变体索引：预先生成每个词删去至多 max_distance 个字符的所有变体，
+    查询时只查找查询词自身的删除变体再逐个验证，代价与词表大小基本无关"""
+
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self._variants = {}  # 删除变体 -> {原词}
+        self._values = {}    # 原词 -> 值列表
+
+    @staticmethod
+    def _deletes(word, depth):
+        variants = {word}
+        frontier = {word}
+        for _ in range(depth):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def add(self, word, value):
+        values = self._values.setdefault(word, [])
+        if value not in values:
+            values.append(value)
+        for variant in self._deletes(word, self.max_distance):
+            self._variants.setdefault(variant, set()).add(word)
+
+    def search(self, word, max_distance):
+        """返回 [(距离, 词, 值列表)]，按距离升序"""
+        max_distance = min(max_distance, self.max_distance)
+        candidates = set()
+        for variant in self._deletes(word, max_distance):
+            candidates |= self._variants.get(variant, set())
+        results = []
+        for candidate in candidates:
+            distance = levenshtein(word, candidate)
+            if distance <= max_distance:
+                results.append((distance, candidate, self._values[candidate]))
+        results.sort(key=lambda x: (x[0], x[1]))
+        return results
+
+
+class LocationFuzzyMatcher:
+    """未知地区成员的二次匹配：繁体转换、拼音/缩写索引和编辑距离索引
+
+    地名和拼音的编辑距离查找都使用删除变体索引。地名大多只有2~4个字，彼此的编辑距离集中在很小的范围内，
+    BK树的剪枝几乎失效；删除变体索引的查询代价只取决于查询词长度。
+    """
+
+    def __init__(self, location_info, city_to_province, sorted_cities, min_confidence=0.6):
+        self.location_info = location_info
+        self.city_to_province = city_to_province
+        self.sorted_cities = sorted_cities
+        self.min_confidence = min_confidence
+
+        # 地名 -> (省份, 城市)；省份本身的城市为 None
+        self.places = {}
+        for province, info in location_info.items():
+            self.places[province] = (province, None)
+            for alias in info['aliases']:
+                if len(alias) >= 2:
+                    self.places.setdefault(alias, (province, None))
+        for city, province in city_to_province.items():
+            # 直辖市、特别行政区的城市名与省份同名，按省份处理
+            if city not in location_info:
+                self.places[city] = (province, city)
+
+        self.name_tree = DeletionIndex(max_distance=2)
+        for name in self.places:
+            self.name_tree.add(name, name)
+
+        self.pinyin_index = {}   # 全拼 -> [地名]
+        self.initials_index = {}  # 首字母缩写 -> [地名]
+        self.pinyin_tree = DeletionIndex(max_distance=2)
+        if lazy_pinyin is None:
+            print("未安装 pypinyin，拼音匹配不可用（pip install pypinyin）")
+        else:
+            for name in self.places:
+                syllables = lazy_pinyin(name)
+                full = PINYIN_OVERRIDES.get(name, ''.join(syllables))
+                initials = ''.join(s[0] for s in syllables)
+                self.pinyin_index.setdefault(full, []).append(name)
+                self.initials_index.setdefault(initials, []).append(name)
+                self.pinyin_tree.add(full, name)
+
+    def _candidate_tokens(self, member):
+        """按分隔符切分成员名，返回 [(片段, 是否在城市位置)]，城市位置的片段排在前面"""
+        segments = [s.strip() for s in _SEGMENT_SPLIT.split(member) if s.strip()]
+        # "学号-城市-昵称"格式中第二段是城市位置
+        location_index = 1 if len(segments) > 1 and segments[0].isdigit() else None
+        tokens = []
+        for i, segment in enumerate(segments):
+            for token in _TOKEN.findall(segment):
+                tokens.append((token, i == location_index))
+        tokens.sort(key=lambda x: not x[1])
+        return tokens
+
+    def _result(self, name, source, token, distance=0, in_location=True):
+        province, city = self.places[name]
+        confidence = SOURCE_CONFIDENCE[source]
+        # 每差一个字符扣除一部分置信度
+        confidence -= 0.15 * distance
+        # 昵称位置的命中很可能是巧合（如昵称 jian 与"吉安"），大幅降低置信度
+        if not in_location:
+            confidence *= 0.65
+        return {'province': province, 'city': city, 'confidence': round(confidence, 3),
+                'source': source, 'token': token, 'matched': name}
+
+    def _unique(self, names):
+        """多个候选地名都指向同一省份和城市时才视为唯一"""
+        targets = {self.places[name] for name in names}
+        return names[0] if len(targets) == 1 else None
+
+    def _match_traditional(self, member):
+        """繁体转简体后按原规则重新匹配"""
+        simplified = member.translate(TRADITIONAL_TO_SIMPLIFIED)
+        if simplified == member:
+            return None
+        for city in self.sorted_cities:
+            if city in simplified:
+                name = city if city in self.places else self.city_to_province[city]
+                return self._result(name, 'traditional', city)
+        for token, in_location in self._candidate_tokens(simplified):
+            if token in self.places:
+                return self._result(token, 'traditional', token, in_location=in_location)
+        return None
+
+    def _match_latin(self, token, in_location):
+        key = token.replace(' ', '').lower()
+        if key in EXONYMS:
+            return self._result(EXONYMS[key], 'english', token, in_location=in_location)
+        if not self.pinyin_index:
+            return None
+        if len(key) >= 4 and key in self.pinyin_index:
+            name = self._unique(self.pinyin_index[key])
+            if name:
+                return self._result(name, 'pinyin', token, in_location=in_location)
+        # 缩写（如 SZ）歧义大，只在城市位置使用：优先约定俗成的缩写，其次要求首字母缩写唯一
+        if in_location and key in COMMON_ABBREVIATIONS:
+            return self._result(COMMON_ABBREVIATIONS[key], 'abbreviation', token)
+        if in_location and 2 <= len(key) <= 4 and key in self.initials_index:
+            name = self._unique(self.initials_index[key])
+            if name:
+                return self._result(name, 'abbreviation', token)
+        if len(key) >= 5:
+            max_distance = 1 if len(key) < 9 else 2
+            matches = self.pinyin_tree.search(key, max_distance)
+            if matches:
+                best = [m for m in matches if m[0] == matches[0][0]]
+                name = self._unique([n for m in best for n in m[2]])
+                if name:
+                    return self._result(name, 'pinyin_fuzzy', token, matches[0][0], in_location)
+        return None
+
+    def _match_chinese(self, token, in_location):
+        if len(token) < 2:
+            return None
+        max_distance = 1 if len(token) <= 4 else 2
+        matches = self.name_tree.search(token, max_distance)
+        # 只接受长度相同的错别字或多一个/少一个字的写法，并要求最优候选唯一
+        matches = [m for m in matches if abs(len(m[1]) - len(token)) <= 1 and m[0] < len(m[1])]
+        if not matches:
+            return None
+        best = [m for m in matches if m[0] == matches[0][0]]
+        name = self._unique([n for m in best for n in m[2]])
+        if name:
+            return self._result(name, 'fuzzy', token, matches[0][0], in_location)
+        return None
+
+    def match(self, member):
+        """对单个成员进行二次匹配，返回置信度最高且达到阈值的结果，否则返回 None"""
+        candidates = []
+        result = self._match_traditional(member)
+        if result:
+            candidates.append(result)
+
+        for token, in_location in self._candidate_tokens(member):
+            if token.isascii():
+                result = self._match_latin(token, in_location)
+            else:
+                result = self._match_chinese(token, in_location)
+            if result:
+                candidates.append(result)
+
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda x: x['confidence'])
+        return best if best['confidence'] >= self.min_confidence else None
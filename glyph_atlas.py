@@ -0,0 +1,256 @@
+import math
+import time
+
+
+def font_key(font):
+    """字体的缓存键：同一字体文件、字号和排版引擎的字体对象共用缓存的字形"""
+    return (getattr(font, 'path', None) or id(font), font.size, getattr(font, 'index', 0), font.layout_engine)
+
+
+def rasterize(font, text, start=(0, 0)):
+    """用 Pillow 把文本栅格化为灰度掩码，返回 (掩码数组, (x偏移, y偏移))，偏移为掩码左上角相对文本原点的位置；
+    没有可见像素（如空格）时掩码为 None。start 为原点的小数部分，与 ImageDraw.text 的亚像素定位一致"""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    x0, y0, x1, y1 = font.getbbox(text)
+    # 原点留出边距，保证负的字形偏移和小数部分都落在画布内
+    pad_x, pad_y = max(0, -x0) + 1, max(0, -y0) + 1
+    image = Image.new('L', (pad_x + max(x1, 0) + 2, pad_y + max(y1, 0) + 2), 0)
+    # 在黑底上用 255 绘制，混合结果正好等于字形的覆盖率
+    ImageDraw.Draw(image).text((pad_x + start[0], pad_y + start[1]), text, font=font, fill=255)
+    mask = np.asarray(image)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not rows.size:
+        return None, (0, 0)
+    columns = np.flatnonzero(mask.any(axis=0))
+    top, bottom, left, right = rows[0], rows[-1] + 1, columns[0], columns[-1] + 1
+    return np.ascontiguousarray(mask[top:bottom, left:right]), (int(left) - pad_x, int(top) - pad_y)
+
+
+class GlyphAtlas:
+    """字形缓存：每个 (字体, 字号, 字符) 只经 FreeType 栅格化一次，之后按字符前进宽度和字距排版、直接拼接掩码
+
+    成员名单中反复出现的只是有限的汉字、数字和标点，缓存命中后一行文本无需再调用 FreeType。
+    坐标的小数部分（如行高为 37.5 像素时）作为缓存键的一部分，与 ImageDraw.text 一样交给 FreeType 做亚像素定位。
+    前进宽度或字距不是整数像素时（各字形的小数偏移不同），该行退回整行栅格化，保证结果与 ImageDraw.text 相同。
+    """
+
+    def __init__(self):
+        self._glyphs = {}   # (字体键, 字符, 坐标小数部分) -> (掩码, x偏移, y偏移, 前进宽度或None)
+        self._kerning = {}  # (字体键, 前一字符, 字符) -> 字距调整或None
+        self.hits = 0
+        self.misses = 0
+
+    def glyph(self, font, key, char, start=(0, 0)):
+        glyph = self._glyphs.get((key, char, start))
+        if glyph is None:
+            self.misses += 1
+            mask, (x, y) = rasterize(font, char, start)
+            advance = font.getlength(char)
+            glyph = self._glyphs[(key, char, start)] = (mask, x, y, int(advance) if advance == int(advance) else None)
+        else:
+            self.hits += 1
+        return glyph
+
+    def kerning(self, font, key, previous, char):
+        """两个字符之间的字距调整（整行宽度减去两字各自的宽度），不是整数像素时返回 None"""
+        pair = (key, previous, char)
+        kerning = self._kerning.get(pair)
+        if kerning is None and pair not in self._kerning:
+            value = font.getlength(previous + char) - font.getlength(previous) - font.getlength(char)
+            kerning = self._kerning[pair] = int(value) if value == int(value) else None
+        return kerning
+
+    def layout(self, font, text, start=(0, 0)):
+        """排版一行文本，返回 [(掩码, x, y)]（相对原点的整数部分）；字形之间有亚像素偏移时返回 None"""
+        key = font_key(font)
+        placements = []
+        pen = 0
+        previous = None
+        for char in text:
+            mask, x, y, advance = self.glyph(font, key, char, start)
+            if advance is None:
+                return None
+            if previous is not None:
+                kerning = self.kerning(font, key, previous, char)
+                if kerning is None:
+                    return None
+                pen += kerning
+            if mask is not None:
+                placements.append((mask, pen + x, y))
+            pen += advance
+            previous = char
+        return placements
+
+    def line_mask(self, font, text, start=(0, 0)):
+        """把一行文本的字形拼成一个掩码，返回 (掩码, (x偏移, y偏移))；字形重叠处取最大值，与 FreeType 整行渲染相同。
+        字形之间有亚像素偏移时返回 None"""
+        import numpy as np
+
+        placements = self.layout(font, text, start)
+        if placements is None:
+            return None
+        if not placements:
+            return None, (0, 0)
+        if len(placements) == 1:
+            mask, x, y = placements[0]
+            return mask, (x, y)
+        left = min(x for _, x, _ in placements)
+        top = min(y for _, _, y in placements)
+        right = max(x + mask.shape[1] for mask, x, _ in placements)
+        bottom = max(y + mask.shape[0] for mask, _, y in placements)
+        line = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for mask, x, y in placements:
+            height, width = mask.shape
+            region = line[y - top:y - top + height, x - left:x - left + width]
+            np.maximum(region, mask, out=region)
+        return line, (left, top)
+
+
+class TextCanvas:
+    """在 NumPy 数组上绘制文本，与 ImageDraw.text 逐像素相同（按覆盖率把文字颜色混合到背景上）"""
+
+    def __init__(self, width, height, background='#FFFFFF', atlas=None):
+        import numpy as np
+        from PIL import ImageColor
+
+        # 先填好一行再按行复制，比直接用颜色元组广播快得多
+        row = np.tile(np.array(ImageColor.getrgb(background)[:3], dtype=np.uint8), (width, 1))
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+        self.pixels[...] = row
+        self.atlas = atlas if atlas is not None else GlyphAtlas()
+        self._inks = {}  # 颜色 -> RGB数组
+
+    @classmethod
+    def from_image(cls, image, atlas=None):
+        """在已有图片（如已画好图形的背景）上继续绘制文本"""
+        import numpy as np
+
+        canvas = cls(0, 0, atlas=atlas)
+        canvas.pixels = np.array(image if image.mode == 'RGB' else image.convert('RGB'))
+        return canvas
+
+    def ink(self, fill):
+        color = self._inks.get(fill)
+        if color is None:
+            import numpy as np
+            from PIL import ImageColor
+
+            color = self._inks[fill] = np.array(ImageColor.getrgb(fill)[:3], dtype=np.uint16)
+        return color
+
+    def text(self, xy, text, font, fill):
+        """在 xy（文本左上角，与 ImageDraw.text 的默认锚点相同）处绘制一行文本"""
+        x, y = xy
+        # 与 ImageDraw.text 一样把整数部分作为坐标、小数部分交给 FreeType
+        start = (math.modf(x)[0], math.modf(y)[0])
+        result = self.atlas.line_mask(font, text, start)
+        if result is None:
+            result = rasterize(font, text, start)
+        mask, (offset_x, offset_y) = result
+        if mask is not None:
+            self.blend(mask, int(x) + offset_x, int(y) + offset_y, self.ink(fill))
+
+    def blend(self, mask, left, top, ink):
+        """out = (背景 * (255 - 覆盖率) + 颜色 * 覆盖率) / 255，除以255的舍入方式与 Pillow 相同；
+        中间结果最大为 255 * 255 + 128，用 uint16 计算即可"""
+        height, width = self.pixels.shape[:2]
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + mask.shape[1], width), min(top + mask.shape[0], height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        coverage = mask[y0 - top:y1 - top, x0 - left:x1 - left, None].astype('uint16')
+        region = self.pixels[y0:y1, x0:x1]
+        value = region * (255 - coverage) + ink * coverage + 128
+        region[...] = ((value >> 8) + value) >> 8
+
+    def to_image(self):
+        from PIL import Image
+
+        return Image.fromarray(self.pixels, 'RGB')
+
+
+def benchmark_lines(count=10000, seed=0):
+    """生成与文本报告相同结构的若干行（标题、省份、城市和成员列表），用于性能测试"""
+    import random
+
+    rng = random.Random(seed)
+    provinces = ['广东', '四川', '河南', '浙江', '江苏', '北京', '上海', '湖北', '山东', '福建']
+    cities = ['广州', '成都', '郑州', '杭州', '南京', '武汉', '济南', '厦门', '深圳', '苏州']
+    nicknames = ['小明', '阿杰', 'Tom', '晴天', '大鹏', 'Lucy', '学习中', '努力']
+    lines = ['=== 马哥教育大模型1期微信群成员分析报告 ===', '', '【总体统计】', f'总人数：{count}']
+    while len(lines) < count:
+        province = rng.choice(provinces)
+        lines.append(f'【{province}】{rng.randrange(50, 500)}人')
+        for _ in range(rng.randrange(1, 4)):
+            lines.append(f'- {rng.choice(cities)}：{rng.randrange(5, 100)}人')
+            for _ in range(rng.randrange(3, 12)):
+                lines.append(f'  * {rng.randrange(100000)}-{rng.choice(cities)}-{rng.choice(nicknames)}')
+    return lines[:count]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    parser = argparse.ArgumentParser(description='字形缓存文本渲染与 ImageDraw.text 的性能对比')
+    parser.add_argument('--lines', type=int, default=10000, help='报告行数')
+    parser.add_argument('--font', default='simhei.ttf', help='字体文件')
+    args = parser.parse_args()
+
+    # 与 create_text_image 相同的字号、颜色和行距
+    fonts = {size: ImageFont.truetype(args.font, size) for size in (20, 24, 26, 28)}
+    styled = []
+    for line in benchmark_lines(args.lines):
+        content = line.lstrip()
+        if content.startswith('==='):
+            styled.append((line, fonts[28], '#FF6B6B'))
+        elif content.startswith('【'):
+            styled.append((line, fonts[26], '#4ECDC4'))
+        elif content.startswith('* '):
+            styled.append((line, fonts[20], '#5D6D7E'))
+        else:
+            styled.append((line, fonts[24], '#2C3E50'))
+    size = (1200, len(styled) * 36 + 80)
+
+    def render_with_draw():
+        image = Image.new('RGB', size, '#FFFFFF')
+        draw = ImageDraw.Draw(image)
+        for index, (line, font, color) in enumerate(styled):
+            draw.text((40, 40 + index * 36), line, font=font, fill=color)
+        return image
+
+    def render_with_atlas(atlas):
+        canvas = TextCanvas(size[0], size[1], '#FFFFFF', atlas)
+        for index, (line, font, color) in enumerate(styled):
+            canvas.text((40, 40 + index * 36), line, font, color)
+        return canvas.pixels
+
+    timings = {}
+    start = time.perf_counter()
+    expected = render_with_draw()
+    timings['ImageDraw.text'] = time.perf_counter() - start
+    atlas = GlyphAtlas()
+    start = time.perf_counter()
+    result = render_with_atlas(atlas)
+    del result
+    timings['字形缓存（首次，含栅格化）'] = time.perf_counter() - start
+    start = time.perf_counter()
+    result = render_with_atlas(atlas)
+    timings['字形缓存（缓存已建立）'] = time.perf_counter() - start
+
+    # 报告很长时整张图片有上GB，分段比较
+    different = largest = 0
+    for top in range(0, size[1], 4096):
+        bottom = min(top + 4096, size[1])
+        strip = np.asarray(expected.crop((0, top, size[0], bottom)), dtype=np.int16)
+        difference = np.abs(strip - result[top:bottom])
+        different += int((difference.max(axis=2) > 0).sum())
+        largest = max(largest, int(difference.max()))
+    print(f"{args.lines} 行，图片 {size[0]}x{size[1]}，缓存字形 {len(atlas._glyphs)} 个")
+    for label, elapsed in timings.items():
+        print(f"{label}：{elapsed:.2f}s")
+    print(f"与 ImageDraw.text 不同的像素：{different}，最大差值 {largest}")
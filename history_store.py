@@ -0,0 +1,172 @@
+import sqlite3
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    admin_count INTEGER NOT NULL,
+    foreign_count INTEGER NOT NULL,
+    unknown_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_group_ts ON runs (group_name, ts);
+CREATE INDEX IF NOT EXISTS idx_runs_ts ON runs (ts);
+
+CREATE TABLE IF NOT EXISTS province_counts (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    group_name TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    province TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_province_group_ts ON province_counts (group_name, ts, province, count);
+CREATE INDEX IF NOT EXISTS idx_province_province_ts ON province_counts (province, ts);
+
+CREATE TABLE IF NOT EXISTS city_counts (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    group_name TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    province TEXT NOT NULL,
+    city TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_city_group_ts ON city_counts (group_name, ts);
+'''
+
+DAY_SECONDS = 24 * 3600
+
+
+class HistoryStore:
+    """群成员构成的历史时间序列存储（SQLite），按群、时间和省份建立索引"""
+
+    def __init__(self, path='group_history.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, statistics, group_name='', timestamp=None):
+        """追加一次分析结果（WeChatGroupAnalyzer.get_statistics() 的返回值），返回记录ID"""
+        ts = int(timestamp if timestamp is not None else time.time())
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (group_name, ts, total, admin_count, foreign_count, unknown_count) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (group_name, ts, statistics['total'], statistics['admin_count'],
+                 statistics['foreign_count'], statistics['unknown_count']))
+            run_id = cursor.lastrowid
+
+            provinces = statistics['provinces']
+            self.conn.executemany(
+                'INSERT INTO province_counts (run_id, group_name, ts, province, count) VALUES (?, ?, ?, ?, ?)',
+                [(run_id, group_name, ts, province, data['total']) for province, data in provinces.items()])
+            self.conn.executemany(
+                'INSERT INTO city_counts (run_id, group_name, ts, province, city, count) VALUES (?, ?, ?, ?, ?, ?)',
+                [(run_id, group_name, ts, province, city, count)
+                 for province, data in provinces.items()
+                 for city, count in data['cities'].items()])
+        return run_id
+
+    def _range_clause(self, group_name, since, until):
+        """构造按群和时间范围过滤的 WHERE 子句"""
+        clauses = []
+        params = []
+        if group_name is not None:
+            clauses.append('group_name = ?')
+            params.append(group_name)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(int(since))
+        if until is not None:
+            clauses.append('ts <= ?')
+            params.append(int(until))
+        where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        return where, params
+
+    def groups(self):
+        """返回存储中出现过的群名称"""
+        return [row[0] for row in self.conn.execute('SELECT DISTINCT group_name FROM runs ORDER BY group_name')]
+
+    def list_runs(self, group_name=None, since=None, until=None):
+        """查询时间范围内的分析记录，按时间升序"""
+        where, params = self._range_clause(group_name, since, until)
+        rows = self.conn.execute(
+            f'SELECT id, group_name, ts, total, admin_count, foreign_count, unknown_count '
+            f'FROM runs {where} ORDER BY ts, id', params)
+        keys = ('id', 'group_name', 'ts', 'total', 'admin_count', 'foreign_count', 'unknown_count')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def province_share(self, group_name=None, days=90, now=None):
+        """汇总最近 days 天内各省份人数占比（按记录人数加权），按占比降序返回 [(省份, 占比, 人数)]"""
+        now = now if now is not None else time.time()
+        where, params = self._range_clause(group_name, now - days * DAY_SECONDS, now)
+
+        total = self.conn.execute(f'SELECT COALESCE(SUM(total), 0) FROM runs {where}', params).fetchone()[0]
+        if not total:
+            return []
+        rows = self.conn.execute(
+            f'SELECT province, SUM(count) FROM province_counts {where} '
+            f'GROUP BY province ORDER BY SUM(count) DESC, province', params)
+        return [(province, count / total, count) for province, count in rows]
+
+    def province_trend(self, group_name=None, since=None, until=None, provinces=None):
+        """查询各省份占比随时间的变化，返回 (时间戳列表, {省份: 占比列表})"""
+        runs = self.list_runs(group_name, since, until)
+        if not runs:
+            return [], {}
+
+        where, params = self._range_clause(group_name, since, until)
+        index = {run['id']: i for i, run in enumerate(runs)}
+        series = {}
+        for run_id, province, count in self.conn.execute(
+                f'SELECT run_id, province, count FROM province_counts {where}', params):
+            if provinces is not None and province not in provinces:
+                continue
+            if province not in series:
+                series[province] = [0.0] * len(runs)
+            total = runs[index[run_id]]['total']
+            series[province][index[run_id]] = count / total if total else 0.0
+
+        return [run['ts'] for run in runs], series
+
+    def plot_trend(self, output='group_trend.png', group_name=None, days=90, top_n=8, now=None):
+        """从存储中直接生成省份占比趋势图，无需重新获取或分类成员"""
+        import matplotlib.pyplot as plt
+        from datetime import datetime
+
+        now = now if now is not None else time.time()
+        top_provinces = [p for p, _, _ in self.province_share(group_name, days, now)[:top_n]]
+        timestamps, series = self.province_trend(group_name, now - days * DAY_SECONDS, now, set(top_provinces))
+        if not timestamps:
+            print("所选时间范围内没有历史记录")
+            return False
+
+        plt.rcParams['font.sans-serif'] = ['SimHei']
+        plt.rcParams['axes.unicode_minus'] = False
+
+        dates = [datetime.fromtimestamp(ts) for ts in timestamps]
+        fig, ax = plt.subplots(figsize=(12, 6), dpi=150)
+        for province in top_provinces:
+            ax.plot(dates, [v * 100 for v in series[province]], marker='o', label=province)
+
+        title = f'{group_name} ' if group_name else ''
+        ax.set_title(f'{title}近{days}天省份占比变化', pad=20, fontsize=16)
+        ax.set_ylabel('占比（%）', fontsize=12)
+        ax.grid(True, linestyle='--', alpha=0.7)
+        ax.legend(loc='upper left', bbox_to_anchor=(1.01, 1))
+        fig.autofmt_xdate()
+        fig.savefig(output, bbox_inches='tight')
+        plt.close(fig)
+        return True
@@ -0,0 +1,234 @@
+import io
+import os
+import struct
+import time
+import zlib
+
+# 支持的输出格式：格式名 -> (扩展名, 说明)
+IMAGE_FORMATS = {
+    'png': ('.png', '真彩色PNG（无损，分条带并行压缩）'),
+    'png8': ('.png', '256色调色板PNG（分条带并行压缩）'),
+    'webp': ('.webp', 'WebP'),
+    'jpeg': ('.jpg', '渐进式JPEG'),
+}
+
+# WebP/JPEG 单张图片的最大边长，报告图片超过时按高度分页保存为多张
+MAX_DIMENSION = {'webp': 16383, 'jpeg': 65500}
+
+# 大小目标模式下依次尝试的设置：有损格式为质量，调色板PNG为颜色数
+QUALITY_STEPS = (90, 85, 80, 75, 70, 60, 50, 40, 30)
+COLOR_STEPS = (256, 128, 64, 32, 16)
+
+# 每个条带的行数：条带越小并行度越高，压缩率损失越多（每个条带都从空字典开始）
+STRIP_ROWS = 512
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def _filter_rows(pixels, bytes_per_pixel):
+    """对每行应用 PNG 的 Sub 过滤（与左侧像素作差），返回带过滤类型字节的扫描行"""
+    import numpy as np
+
+    height, row_bytes = pixels.shape
+    rows = np.empty((height, row_bytes + 1), dtype=np.uint8)
+    rows[:, 0] = 1
+    rows[:, 1:bytes_per_pixel + 1] = pixels[:, :bytes_per_pixel]
+    np.subtract(pixels[:, bytes_per_pixel:], pixels[:, :-bytes_per_pixel], out=rows[:, bytes_per_pixel + 1:])
+    return rows
+
+
+def _deflate_strip(data, level, last):
+    """把一个条带压缩为原始 deflate 数据；非最后一个条带以 Z_FULL_FLUSH 结束（字节对齐、不带结束标志），
+    各条带的输出直接拼接即为一个完整的 deflate 流。zlib 压缩时会释放 GIL，可以用线程并行"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+
+
+def encode_png(image, compress_level=6, dpi=(300, 300), workers=None, strip_rows=STRIP_ROWS):
+    """把 RGB/L/P 模式的图片编码为 PNG 字节，扫描行按条带并行压缩"""
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    if image.mode not in ('RGB', 'L', 'P'):
+        image = image.convert('RGB')
+    width, height = image.size
+    pixels = np.asarray(image, dtype=np.uint8).reshape(height, -1)
+
+    if image.mode == 'P':
+        # 调色板图片不适合差分过滤，使用 None 过滤
+        rows = np.empty((height, pixels.shape[1] + 1), dtype=np.uint8)
+        rows[:, 0] = 0
+        rows[:, 1:] = pixels
+        color_type, bytes_per_pixel = 3, 1
+    else:
+        bytes_per_pixel = 3 if image.mode == 'RGB' else 1
+        rows = _filter_rows(pixels, bytes_per_pixel)
+        color_type = 2 if image.mode == 'RGB' else 0
+    raw = memoryview(rows.reshape(-1))
+
+    strip_bytes = strip_rows * rows.shape[1]
+    strips = [raw[start:start + strip_bytes] for start in range(0, len(raw), strip_bytes)]
+    last = len(strips) - 1
+    workers = workers or min(8, os.cpu_count() or 1)
+    if workers > 1 and len(strips) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            compressed = list(executor.map(lambda item: _deflate_strip(item[1], compress_level, item[0] == last),
+                                           enumerate(strips)))
+    else:
+        compressed = [_deflate_strip(strip, compress_level, index == last) for index, strip in enumerate(strips)]
+
+    # zlib 头 + 拼接的 deflate 数据 + 整个数据的 Adler-32 校验
+    idat = b''.join([b'\x78\x9c'] + compressed + [struct.pack('>I', zlib.adler32(raw))])
+
+    output = io.BytesIO()
+    output.write(PNG_SIGNATURE)
+    output.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)))
+    if dpi:
+        pixels_per_meter = [int(round(value / 0.0254)) for value in dpi]
+        output.write(_png_chunk(b'pHYs', struct.pack('>IIB', pixels_per_meter[0], pixels_per_meter[1], 1)))
+    if image.mode == 'P':
+        palette = image.getpalette()[:3 * (int(pixels.max()) + 1)]
+        output.write(_png_chunk(b'PLTE', bytes(palette)))
+    output.write(_png_chunk(b'IDAT', idat))
+    output.write(_png_chunk(b'IEND', b''))
+    return output.getvalue()
+
+
+def quantize(image, colors=256):
+    """把图片量化为调色板图片（报告以纯色背景、文字和图表为主，颜色很少，量化损失很小）"""
+    from PIL import Image
+
+    return image.convert('RGB').quantize(colors, method=Image.Quantize.FASTOCTREE)
+
+
+def split_pages(image, max_height):
+    """按高度把图片切成不超过 max_height 的若干页"""
+    if image.height <= max_height:
+        return [image]
+    return [image.crop((0, top, image.width, min(top + max_height, image.height)))
+            for top in range(0, image.height, max_height)]
+
+
+def encode_image(image, image_format='png', setting=None, dpi=(300, 300), workers=None):
+    """按格式编码图片，返回字节列表（WebP/JPEG 图片过高时分页，每页一项）
+
+    setting：webp/jpeg 为质量（默认 85），png8 为颜色数（默认 256），png 为压缩级别（默认 6）。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if image_format == 'png':
+        return [encode_png(image, 6 if setting is None else setting, dpi, workers)]
+    if image_format == 'png8':
+        return [encode_png(quantize(image, setting or 256), 6, dpi, workers)]
+    if image_format not in MAX_DIMENSION:
+        raise ValueError(f"不支持的图片格式：{image_format}（可选：{'、'.join(IMAGE_FORMATS)}）")
+
+    quality = setting or 85
+    image = image.convert('RGB')
+
+    def encode_page(page):
+        buffer = io.BytesIO()
+        if image_format == 'webp':
+            page.save(buffer, format='WEBP', quality=quality, method=4)
+        else:
+            page.save(buffer, format='JPEG', quality=quality, progressive=True, optimize=True, dpi=dpi)
+        return buffer.getvalue()
+
+    pages = split_pages(image, MAX_DIMENSION[image_format])
+    # Pillow 编码时释放 GIL，多页时用线程并行
+    workers = workers or min(8, os.cpu_count() or 1)
+    if workers > 1 and len(pages) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(encode_page, pages))
+    return [encode_page(page) for page in pages]
+
+
+def encode_to_target(image, image_format, max_bytes, dpi=(300, 300), workers=None):
+    """在不超过 max_bytes 的前提下选择质量最高的设置，返回 (字节列表, 设置, 是否达到目标)
+
+    质量/颜色数从高到低二分查找；最低设置仍超过目标时返回最小的结果。png 为无损格式，只使用最高压缩级别。
+    """
+    if image_format == 'png':
+        encoded = encode_image(image, 'png', 9, dpi, workers)
+        return encoded, 9, sum(map(len, encoded)) <= max_bytes
+
+    steps = COLOR_STEPS if image_format == 'png8' else QUALITY_STEPS
+    image = image.convert('RGB')
+    best = None
+    low, high = 0, len(steps) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        encoded = encode_image(image, image_format, steps[middle], dpi, workers)
+        if sum(map(len, encoded)) <= max_bytes:
+            best = (encoded, steps[middle])
+            high = middle - 1
+        else:
+            low = middle + 1
+    if best is not None:
+        return best[0], best[1], True
+    encoded = encode_image(image, image_format, steps[-1], dpi, workers)
+    return encoded, steps[-1], False
+
+
+def save_image(image, path, image_format='png', target_mb=None, dpi=(300, 300), workers=None):
+    """编码并保存图片，返回写出的文件列表；path 不含扩展名，按格式补全，分页时依次加 _1、_2 后缀"""
+    if target_mb:
+        encoded, setting, reached = encode_to_target(image, image_format, int(target_mb * 1024 * 1024), dpi, workers)
+        if not reached:
+            print(f"使用 {image_format} 的最低设置仍无法压缩到 {target_mb}MB 以内")
+    else:
+        encoded = encode_image(image, image_format, dpi=dpi, workers=workers)
+
+    extension = IMAGE_FORMATS[image_format][0]
+    if len(encoded) == 1:
+        paths = [path + extension]
+    else:
+        paths = [f'{path}_{index}{extension}' for index in range(1, len(encoded) + 1)]
+    for page_path, data in zip(paths, encoded):
+        with open(page_path, 'wb') as f:
+            f.write(data)
+    return paths
+
+
+def benchmark(image, formats=None, workers=None, repeat=1):
+    """对每种格式编码 repeat 次，返回 [(格式, 最快耗时, 总字节数, 页数)]"""
+    results = []
+    for image_format in formats or IMAGE_FORMATS:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            encoded = encode_image(image, image_format, workers=workers)
+            timings.append(time.perf_counter() - start)
+        results.append((image_format, min(timings), sum(map(len, encoded)), len(encoded)))
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from PIL import Image
+
+    parser = argparse.ArgumentParser(description='报告图片编码性能测试')
+    parser.add_argument('image', nargs='?', default='group_analysis.png', help='要测试的图片')
+    parser.add_argument('--workers', type=int, help='并行压缩的线程数（默认按CPU核数）')
+    parser.add_argument('--repeat', type=int, default=1, help='重复次数')
+    args = parser.parse_args()
+
+    Image.MAX_IMAGE_PIXELS = None
+    source = Image.open(args.image)
+    source.load()
+    print(f"图片尺寸：{source.width}x{source.height}")
+
+    # 原来的保存方式作为对照
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    source.save(buffer, format='PNG', quality=95, dpi=(300, 300))
+    print(f"{'Pillow PNG（原写法）':<20} {time.perf_counter() - start:7.2f}s {buffer.tell() / 1024 / 1024:8.2f}MB")
+
+    for image_format, elapsed, size, pages in benchmark(source, workers=args.workers, repeat=args.repeat):
+        note = f"（{pages}页）" if pages > 1 else ''
+        print(f"{IMAGE_FORMATS[image_format][1]:<20} {elapsed:7.2f}s {size / 1024 / 1024:8.2f}MB{note}")
@@ -0,0 +1,248 @@
+import math
+import random
+import time
+
+# 候选位置的方向（单位向量），依次为：右上、左上、右下、左下、右、左、上、下
+DIRECTIONS = [
+    (1, 1), (-1, 1), (1, -1), (-1, -1),
+    (1, 0), (-1, 0), (0, 1), (0, -1),
+]
+
+# 候选位置离锚点的距离（以标签高度为单位），0 表示标签正好居中在锚点上
+RINGS = (0, 0.6, 1.6, 3.0)
+
+# 重叠的惩罚远大于位置本身的代价，优先保证标签不重叠
+OVERLAP_PENALTY = 100.0
+# 标签盖住其他锚点的惩罚
+ANCHOR_PENALTY = 8.0
+
+
+def estimate_label_size(text, fontsize, pad=0.3):
+    """估算多行标签（含文本框边距）的宽高，单位为磅；中文字符按整字宽，其余按半角宽"""
+    lines = text.split('\n')
+    width = max(sum(1.0 if ord(ch) > 0x2E80 else 0.6 for ch in line) for line in lines) * fontsize
+    height = len(lines) * fontsize * 1.2
+    padding = 2 * pad * fontsize
+    return width + padding, height + padding
+
+
+class LabelPlacer:
+    """基于 STRtree 的标签自动避让
+
+    为每个标签生成若干候选位置（锚点居中、四周紧贴、逐圈外移），用 STRtree 一次性求出所有候选框之间的相交关系，
+    然后按优先级贪心选择不与已放置标签冲突、代价最小的位置，最后用模拟退火修复剩余的重叠。
+    坐标使用屏幕坐标（像素），与地图的经纬度无关。
+    """
+
+    def __init__(self, rings=RINGS, directions=DIRECTIONS, anneal_steps=2000, seed=0):
+        self.rings = rings
+        self.directions = directions
+        self.anneal_steps = anneal_steps
+        self.seed = seed
+
+    def _candidates(self, anchors, sizes):
+        """生成候选框，返回 (候选框数组[n, 4], 所属标签数组, 偏移数组[n, 2], 位置代价数组, 每个标签的候选数)"""
+        import numpy as np
+
+        anchors = np.asarray(anchors, dtype=float).reshape(-1, 2)
+        sizes = np.asarray(sizes, dtype=float).reshape(-1, 2)
+
+        offsets = [(0.0, 0.0, 0.0)]
+        for ring_index, ring in enumerate(self.rings):
+            if ring == 0:
+                continue
+            for direction_index, (dx, dy) in enumerate(self.directions):
+                offsets.append((dx, dy, ring_index * 10 + direction_index * 0.1))
+        # 每个候选的偏移：紧贴锚点的距离为半个标签宽/高，再按圈数外移
+        unit = np.array([[dx, dy] for dx, dy, _ in offsets])                   # (k, 2)
+        ring = np.array([0.0] + [r for r in self.rings if r != 0 for _ in self.directions])
+        cost = np.array([c for _, _, c in offsets])
+
+        half = sizes / 2                                                       # (m, 2)
+        gap = (ring[None, :] * sizes[:, 1:2])                                  # (m, k)
+        shift = unit[None, :, :] * (half[:, None, :] + gap[:, :, None])        # (m, k, 2)
+        centers = anchors[:, None, :] + shift
+
+        boxes = np.concatenate([centers - half[:, None, :], centers + half[:, None, :]], axis=2)
+        count = len(offsets)
+        owners = np.repeat(np.arange(len(anchors)), count)
+        return boxes.reshape(-1, 4), owners, shift.reshape(-1, 2), np.tile(cost, len(anchors)), count
+
+    def place(self, anchors, sizes, priorities=None, obstacles=None, hide_overlapping=False):
+        """计算标签位置
+
+        anchors：锚点屏幕坐标 [(x, y)]；sizes：标签宽高 [(w, h)]，与锚点使用相同单位；
+        priorities：优先级，越大越先放置（默认按输入顺序）；obstacles：标签应避开的额外矩形 [(x0, y0, x1, y1)]。
+        hide_overlapping 为 True 时，按优先级保留标签，与已保留标签重叠的标签被隐藏。
+        返回 [(dx, dy, 是否需要指引线, 是否仍有重叠或被隐藏)]，dx/dy 为标签中心相对锚点的偏移。
+        """
+        import numpy as np
+        import shapely
+        from shapely import STRtree
+
+        label_count = len(anchors)
+        if label_count == 0:
+            return []
+        anchors = np.asarray(anchors, dtype=float).reshape(-1, 2)
+        boxes, owners, shifts, costs, per_label = self._candidates(anchors, sizes)
+        geometries = shapely.box(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+
+        # 候选框盖住其他标签锚点、或压到障碍物时增加代价；压到障碍物的候选视同重叠
+        costs = costs.astype(float)
+        left, right = STRtree(shapely.points(anchors)).query(geometries, predicate='intersects')
+        foreign = owners[left] != right
+        np.add.at(costs, left[foreign], ANCHOR_PENALTY)
+        blocked = np.zeros(len(boxes), dtype=bool)
+        if obstacles is not None and len(obstacles):
+            obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 4)
+            obstacle_tree = STRtree(shapely.box(obstacles[:, 0], obstacles[:, 1], obstacles[:, 2], obstacles[:, 3]))
+            left = np.unique(obstacle_tree.query(geometries)[0])
+            blocked[left] = True
+            costs[left] += OVERLAP_PENALTY
+
+        # 一次查询求出所有候选框两两相交的关系（候选框都是与坐标轴对齐的矩形，外包框相交即相交，
+        # 不需要再做精确的几何判断），只保留属于不同标签的候选对，按 CSR 方式存放：
+        # 候选 c 冲突的候选为 right[ptr[c]:ptr[c + 1]]
+        left, right = STRtree(geometries).query(geometries)
+        keep = owners[left] != owners[right]
+        left, right = left[keep], right[keep]
+        order = np.argsort(left, kind='stable')
+        left, right = left[order], right[order]
+        ptr = np.searchsorted(left, np.arange(len(boxes) + 1))
+
+        placed = np.zeros(len(boxes), dtype=bool)  # 已选中的候选
+        chosen = [None] * label_count
+
+        def overlaps(candidate):
+            return int(placed[right[ptr[candidate]:ptr[candidate + 1]]].sum()) + int(blocked[candidate])
+
+        # 贪心：按优先级依次放置，选择不与已放置标签重叠且代价最小的候选；都重叠时选重叠最少的
+        label_order = range(label_count) if priorities is None else \
+            sorted(range(label_count), key=lambda i: -priorities[i])
+        for i in label_order:
+            start, end = i * per_label, (i + 1) * per_label
+            segment = slice(ptr[start], ptr[end])
+            counts = np.bincount(left[segment] - start, weights=placed[right[segment]], minlength=per_label)
+            best = start + int(np.argmin(counts * OVERLAP_PENALTY + costs[start:end]))  # 障碍物的惩罚已计入代价
+            chosen[i] = best
+            placed[best] = True
+
+        self._anneal(chosen, placed, costs, per_label, overlaps)
+
+        hidden = set()
+        if hide_overlapping:
+            placed[:] = False
+            for i in label_order:
+                if overlaps(chosen[i]):
+                    hidden.add(i)
+                else:
+                    placed[chosen[i]] = True
+
+        result = []
+        for i, candidate in enumerate(chosen):
+            dx, dy = shifts[candidate]
+            width, height = boxes[candidate, 2] - boxes[candidate, 0], boxes[candidate, 3] - boxes[candidate, 1]
+            # 标签框不再覆盖锚点时才需要指引线
+            leader = abs(dx) > width / 2 or abs(dy) > height / 2
+            result.append((float(dx), float(dy), leader, i in hidden or overlaps(candidate) > 0))
+        return result
+
+    def _anneal(self, chosen, placed, costs, per_label, overlaps):
+        """模拟退火：只在仍有重叠的标签上随机换位，允许以一定概率接受变差的解以跳出局部最优"""
+        conflicted = [i for i, c in enumerate(chosen) if overlaps(c)]
+        if not conflicted or not self.anneal_steps:
+            return
+        rng = random.Random(self.seed)
+        temperature = OVERLAP_PENALTY
+
+        for step in range(self.anneal_steps):
+            i = rng.choice(conflicted)
+            current = chosen[i]
+            candidate = i * per_label + rng.randrange(per_label)
+            if candidate == current:
+                continue
+            # 换位对总能量的影响：自身的代价变化，重叠会同时影响双方，计两次
+            delta = costs[candidate] - costs[current] + \
+                2 * OVERLAP_PENALTY * (overlaps(candidate) - overlaps(current))
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                placed[current] = False
+                placed[candidate] = True
+                chosen[i] = candidate
+            temperature = max(temperature * 0.995, 0.1)
+            if step % 200 == 199:
+                conflicted = [j for j, c in enumerate(chosen) if overlaps(c)]
+                if not conflicted:
+                    break
+
+
+def place_annotations(ax, anchors, labels, fontsize=10, priorities=None, placer=None, pad=0.3,
+                      hide_overlapping=False, obstacles=None, boxes=None):
+    """在 matplotlib 坐标轴上为数据坐标锚点计算标签位置
+
+    返回 [(xytext, 是否需要指引线)]，xytext 为相对锚点的偏移（磅），可直接用于
+    ax.annotate(..., xytext=xytext, textcoords='offset points')；
+    hide_overlapping 为 True 时，无法避开重叠的标签返回 None（适合城市这类可以省略的标签）。
+    obstacles 为标签需要避开的屏幕坐标矩形（如先放置的另一组标签）；传入列表 boxes 时，
+    把显示出来的标签的屏幕坐标矩形追加到其中，可作为下一组标签的 obstacles。
+    """
+    import numpy as np
+
+    if not len(anchors):
+        return []
+    # 地图使用等比例坐标轴，先应用纵横比才能得到最终的屏幕坐标
+    ax.apply_aspect()
+    dpi = ax.figure.dpi
+    scale = dpi / 72.0
+    fontsizes = fontsize if isinstance(fontsize, (list, tuple)) else [fontsize] * len(labels)
+    sizes = np.array([estimate_label_size(text, size, pad) for text, size in zip(labels, fontsizes)]) * scale
+    display = ax.transData.transform(np.asarray(anchors, dtype=float).reshape(-1, 2))
+
+    placer = placer or LabelPlacer()
+    placements = placer.place(display, sizes, priorities, obstacles, hide_overlapping=hide_overlapping)
+    result = []
+    for (x, y), (width, height), (dx, dy, leader, overlapped) in zip(display, sizes, placements):
+        if hide_overlapping and overlapped:
+            result.append(None)
+            continue
+        if boxes is not None:
+            boxes.append((x + dx - width / 2, y + dy - height / 2, x + dx + width / 2, y + dy + height / 2))
+        result.append(((dx / scale, dy / scale), leader))
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description='标签避让性能测试')
+    parser.add_argument('--labels', type=int, default=300, help='标签数量')
+    parser.add_argument('--fontsize', type=float, default=8, help='标签字号（磅）')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    args = parser.parse_args()
+
+    # 模拟东部城市密集、西部稀疏的分布（屏幕坐标，与统计图中 300dpi 的地图子图尺寸相当，约 4800x4200 像素）
+    rng = np.random.default_rng(0)
+    east = rng.normal([3400, 1900], [500, 700], size=(args.labels * 3 // 4, 2))
+    west = rng.uniform([400, 1000], [2800, 3800], size=(args.labels - len(east), 2))
+    anchors = np.concatenate([east, west])
+    texts = [f'城市{i}\n{rng.integers(1, 500)}人' for i in range(args.labels)]
+    sizes = np.array([estimate_label_size(text, args.fontsize) for text in texts]) * (300 / 72.0)
+    priorities = rng.integers(1, 500, size=args.labels).tolist()
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        placements = LabelPlacer().place(anchors, sizes, priorities)
+        timings.append(time.perf_counter() - start)
+
+    remaining = sum(1 for p in placements if p[3])
+    leaders = sum(1 for p in placements if p[2])
+    start = time.perf_counter()
+    hidden = sum(1 for p in LabelPlacer().place(anchors, sizes, priorities, hide_overlapping=True) if p[3])
+    hide_elapsed = time.perf_counter() - start
+    print(f"标签数量：{args.labels}")
+    print(f"最快耗时：{min(timings) * 1000:.1f} ms，平均耗时：{sum(timings) / len(timings) * 1000:.1f} ms")
+    print(f"需要指引线：{leaders}，全部显示时仍有重叠：{remaining}")
+    print(f"隐藏重叠标签（地图上的城市标签）：显示 {args.labels - hidden}，隐藏 {hidden}，"
+          f"显示的标签互不重叠（{hide_elapsed * 1000:.1f} ms）")
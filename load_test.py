@@ -0,0 +1,98 @@
+import argparse
+import json
+import math
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# 生成测试成员名时使用的地名样本
+SAMPLE_LOCATIONS = ['北京', '上海', '深圳', '广州', '杭州', '南京', '成都', '武汉', '西安', '长沙',
+                    '郑州', '济南', '沈阳', '昆明', '福州', '川', '粤', '浙', '多伦多', '东京', '火星']
+
+
+def generate_members(count, seed=0):
+    """生成"学号-城市-昵称"格式的测试成员列表"""
+    rng = random.Random(seed)
+    members = [f"{1000 + i}-{rng.choice(SAMPLE_LOCATIONS)}-用户{i}" for i in range(count)]
+    members.append('马哥教育-助教老师')
+    return members
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def send_request(url, payload):
+    """发送一次请求，返回 (是否成功, 耗时秒, HTTP状态码)"""
+    request = urllib.request.Request(url, data=payload, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except urllib.error.URLError:
+        status = 0
+    return status == 200, time.perf_counter() - start, status
+
+
+def fetch_health(base_url):
+    """读取服务的 /health 信息（工作进程数、最大在途请求数等），读取失败时返回 None"""
+    try:
+        with urllib.request.urlopen(f"{base_url}/health", timeout=10) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (urllib.error.URLError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析服务压测脚本')
+    parser.add_argument('--url', default='http://127.0.0.1:8765', help='服务地址')
+    parser.add_argument('--endpoint', default='analyze', choices=['analyze', 'report'], help='压测接口')
+    parser.add_argument('--format', default='png', choices=['png', 'html'], help='report 接口的输出格式')
+    parser.add_argument('--requests', type=int, default=200, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+    parser.add_argument('--members', type=int, default=500, help='每个请求的成员数')
+    args = parser.parse_args()
+
+    url = f"{args.url.rstrip('/')}/{args.endpoint}"
+    if args.endpoint == 'report':
+        url += f"?format={args.format}"
+    payload = json.dumps({'members': generate_members(args.members)}, ensure_ascii=False).encode('utf-8')
+
+    print(f"压测 {url}：{args.requests} 个请求，并发 {args.concurrency}，每个请求 {args.members} 个成员")
+    health = fetch_health(args.url.rstrip('/'))
+    if health and health.get('max_pending') and args.concurrency > health['max_pending']:
+        print(f"注意：并发数 {args.concurrency} 超过服务的最大在途请求数 {health['max_pending']}，"
+              f"多出的请求会排队（最多 {health.get('queue_timeout')} 秒），排队时间计入延迟，超时的请求返回503")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda _: send_request(url, payload), range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for ok, latency, _ in results if ok)
+    failures = {}
+    for ok, _, status in results:
+        if not ok:
+            failures[status] = failures.get(status, 0) + 1
+
+    print(f"成功：{len(latencies)}  失败：{sum(failures.values())} {failures if failures else ''}")
+    if failures:
+        print("以下吞吐量和延迟只统计成功的请求")
+    print(f"总耗时：{elapsed:.2f}s  吞吐量：{len(latencies) / elapsed:.1f} 请求/秒")
+    if latencies:
+        print(f"延迟 p50：{percentile(latencies, 50) * 1000:.1f}ms  "
+              f"p99：{percentile(latencies, 99) * 1000:.1f}ms  "
+              f"max：{latencies[-1] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import json
+import os
+
+from wechat_group_analysis import parse_student_id
+
+# 导出的列，顺序即输出顺序
+EXPORT_FIELDS = ('member', 'student_id', 'role', 'province', 'city', 'country', 'match_source', 'group')
+
+# 取值重复度高的列，在 Parquet/Arrow 中按字典编码存放
+DICTIONARY_FIELDS = ('role', 'province', 'city', 'country', 'match_source', 'group')
+
+# 按扩展名推断导出格式
+EXPORT_FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.jsonl': 'jsonl'}
+
+
+def member_record(member, category, key, city, group='', fuzzy_match=None):
+    """把 classify_member 的分类结果转换为一行导出记录
+
+    match_source：keyword（马哥教育关键词）、city（城市名）、province（省份名或别名）、gazetteer（世界地名），
+    二次匹配成功的成员为匹配器给出的来源（pinyin、traditional 等）；未知地区成员为 None。
+    城市未知（'省会'）时 city 为 None，国内成员的 country 为 CHN。
+    """
+    record = {
+        'member': member,
+        'student_id': parse_student_id(member),
+        'role': 'admin' if category == 'admin' else 'member',
+        'province': None,
+        'city': None,
+        'country': None,
+        'match_source': None,
+        'group': group or None,
+    }
+    if category == 'admin':
+        record['match_source'] = 'keyword'
+    elif category == 'province':
+        record['province'] = key
+        record['city'] = None if city == '省会' else city
+        record['country'] = 'CHN'
+        if fuzzy_match is not None:
+            record['match_source'] = fuzzy_match['source']
+        else:
+            record['match_source'] = 'province' if city == '省会' else 'city'
+    elif category == 'foreign':
+        record['country'] = key
+        record['match_source'] = 'gazetteer'
+    return record
+
+
+def iter_analysis_records(analyzer):
+    """按分类结果逐个产生导出记录（顺序：马哥教育成员、各省份城市、国外、未知）"""
+    group = analyzer.group_name
+    for member in analyzer.admin_members:
+        yield member_record(member, 'admin', None, None, group)
+    for province, data in analyzer.province_city_members.items():
+        for city, members in data['cities'].items():
+            for member in members:
+                yield member_record(member, 'province', province, city, group,
+                                    analyzer.fuzzy_matches.get(member))
+    for code, members in analyzer.foreign_country_members.items():
+        for member in members:
+            yield member_record(member, 'foreign', code, None, group)
+    for member in analyzer.unknown_members:
+        yield member_record(member, 'unknown', None, None, group)
+
+
+class MemberExportWriter:
+    """按批写出成员记录，支持 Parquet、Arrow（IPC 文件）和 JSONL
+
+    内存中最多缓冲 batch_size 行，写满一批即落盘，导出数百万行时内存占用固定。
+    Parquet/Arrow 中重复度高的列使用字典编码：每列维护一个只增不减的字典，
+    每批只写出字典的新增部分（Arrow 的字典增量），因此各批次共用同一套编码。
+    Arrow IPC 文件把"空字典变为非空"视为字典替换而拒绝写入，所以 Arrow 的每个字典预先放入一个空字符串，
+    之后的新取值都是增量（空字符串只在字典中，不会出现在数据里）。
+    """
+
+    def __init__(self, path, format=None, batch_size=50000):
+        self.path = path
+        self.format = format or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if self.format not in ('parquet', 'arrow', 'jsonl'):
+            raise ValueError(f"无法识别导出格式：{path}（支持 .parquet、.arrow、.jsonl）")
+        self.batch_size = batch_size
+        self.rows = 0
+        self._batch = {field: [] for field in EXPORT_FIELDS}
+        self._batch_rows = 0
+        self._dictionaries = {field: {} for field in DICTIONARY_FIELDS}  # 列 -> {取值: 编码}
+        self._writer = None
+        self._file = None
+        self._open()
+
+    def _open(self):
+        if self.format == 'jsonl':
+            self._file = open(self.path, 'w', encoding='utf-8')
+            return
+
+        import pyarrow as pa
+
+        dictionary_type = pa.dictionary(pa.int32(), pa.string())
+        self._schema = pa.schema([(field, dictionary_type if field in DICTIONARY_FIELDS else pa.string())
+                                  for field in EXPORT_FIELDS])
+        if self.format == 'parquet':
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(self.path, self._schema, use_dictionary=True)
+        else:
+            for dictionary in self._dictionaries.values():
+                dictionary[''] = 0
+            self._file = pa.OSFile(self.path, 'wb')
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._writer = pa.ipc.new_file(self._file, self._schema, options=options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record):
+        """写入一行记录（字典，键为 EXPORT_FIELDS）"""
+        for field in EXPORT_FIELDS:
+            self._batch[field].append(record.get(field))
+        self._batch_rows += 1
+        if self._batch_rows >= self.batch_size:
+            self.flush()
+
+    def write_all(self, records):
+        """写入多行记录（可以是生成器）"""
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """把当前批次写出到文件"""
+        if not self._batch_rows:
+            return
+        if self.format == 'jsonl':
+            columns = [self._batch[field] for field in EXPORT_FIELDS]
+            lines = [json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) for row in zip(*columns)]
+            self._file.write('\n'.join(lines))
+            self._file.write('\n')
+        else:
+            self._writer.write_batch(self._record_batch())
+        self.rows += self._batch_rows
+        self._batch = {field: [] for field in EXPORT_FIELDS}
+        self._batch_rows = 0
+
+    def _record_batch(self):
+        """把当前批次转换为 Arrow RecordBatch，字典列按累积字典编码"""
+        import pyarrow as pa
+
+        arrays = []
+        for field in EXPORT_FIELDS:
+            values = self._batch[field]
+            if field not in DICTIONARY_FIELDS:
+                arrays.append(pa.array(values, type=pa.string()))
+                continue
+            dictionary = self._dictionaries[field]
+            indices = []
+            for value in values:
+                if value is None:
+                    indices.append(None)
+                    continue
+                index = dictionary.get(value)
+                if index is None:
+                    index = dictionary[value] = len(dictionary)
+                indices.append(index)
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()),
+                                                         pa.array(list(dictionary), type=pa.string())))
+        return pa.record_batch(arrays, schema=self._schema)
+
+    def close(self):
+        """写出剩余记录并关闭文件"""
+        if self._writer is None and self._file is None:
+            return
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def export_analysis(analyzer, path, format=None, batch_size=50000):
+    """把分类结果中的全部成员导出到 path，返回导出的行数；导出失败时删除写了一半的文件"""
+    writer = MemberExportWriter(path, format, batch_size)
+    try:
+        with writer:
+            writer.write_all(iter_analysis_records(analyzer))
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return writer.rows
+
+
+def read_export(path, format=None):
+    """读回导出文件，返回记录列表（用于检查）"""
+    format = format or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if format == 'jsonl':
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).to_pylist()
+    import pyarrow as pa
+
+    with pa.OSFile(path, 'rb') as f:
+        return pa.ipc.open_file(f).read_all().to_pylist()
+
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='分批导出自测：各格式写出多个批次后读回，检查与原记录一致')
+    parser.add_argument('--batch-size', type=int, default=2, help='每批行数（取小值以产生多个批次）')
+    args = parser.parse_args()
+
+    # 前几批只有马哥教育成员和城市未知的成员（city、country 等字典为空），之后才出现城市、国外成员和二次匹配
+    records = [
+        member_record('马哥教育-小李', 'admin', None, None),
+        member_record('马哥-助教', 'admin', None, None),
+        member_record('1001-广东-小明', 'province', '广东', '省会'),
+        member_record('1002-广州-阿杰', 'province', '广东', '广州'),
+        member_record('1003-chengdu-Tom', 'province', '四川', '成都', '群B',
+                      {'source': 'pinyin', 'confidence': 0.9}),
+        member_record('1004-Toronto-Lucy', 'foreign', 'CAN', None, '群B'),
+        member_record('路人甲', 'unknown', None, None, '群B'),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for format in ('jsonl', 'parquet', 'arrow'):
+            path = os.path.join(directory, f'members.{format}')
+            try:
+                with MemberExportWriter(path, format, args.batch_size) as writer:
+                    writer.write_all(records)
+            except ImportError:
+                print(f"{format}：未安装 pyarrow，跳过")
+                continue
+            result = read_export(path, format) == records
+            print(f"{format}：{len(records)} 行分 {-(-len(records) // args.batch_size)} 批写出，"
+                  f"读回{'一致' if result else '不一致'}")
+            if not result:
+                raise SystemExit(1)
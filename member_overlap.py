@@ -0,0 +1,122 @@
+import csv
+import hashlib
+
+from wechat_group_analysis import normalize_member_name, parse_student_id
+
+
+def member_identity(member):
+    """解析成员身份：优先使用学号，没有学号时使用规范化昵称的哈希"""
+    name = normalize_member_name(member)
+    student_id = parse_student_id(name)
+    if student_id is not None:
+        return f'id:{student_id}'
+    digest = hashlib.blake2b(name.lower().encode('utf-8'), digest_size=8).hexdigest()
+    return f'nick:{digest}'
+
+
+class MemberOverlapIndex:
+    """跨群成员索引：把成员身份映射为整数ID，用稀疏的 (群, 成员) 对计算群与群的重叠矩阵"""
+
+    def __init__(self):
+        self.groups = []          # 群名称，下标即群ID
+        self.identities = []      # 成员身份键，下标即成员ID
+        self.display_names = []   # 每个成员首次出现时的名称
+        self._identity_ids = {}   # 身份键 -> 成员ID
+        self._name_ids = {}       # 原始成员名 -> 成员ID（同一名称出现在多个群时免去重复解析）
+        self._group_ids = []      # 每个群的成员ID列表
+        self._memberships = None  # 缓存的去重后 (群ID数组, 成员ID数组)
+
+    def add_group(self, group_name, members):
+        """加入一个群的成员列表，返回群ID"""
+        group_id = len(self.groups)
+        self.groups.append(group_name)
+
+        ids = []
+        for member in members:
+            member_id = self._name_ids.get(member)
+            if member_id is None:
+                key = member_identity(member)
+                member_id = self._identity_ids.get(key)
+                if member_id is None:
+                    member_id = len(self.identities)
+                    self._identity_ids[key] = member_id
+                    self.identities.append(key)
+                    self.display_names.append(normalize_member_name(member))
+                self._name_ids[member] = member_id
+            ids.append(member_id)
+
+        self._group_ids.append(ids)
+        self._memberships = None
+        return group_id
+
+    def memberships(self):
+        """返回去重后的 (群ID数组, 成员ID数组)，按成员ID排序"""
+        import numpy as np
+
+        if self._memberships is None:
+            group_count = len(self.groups)
+            gids = np.concatenate([np.full(len(ids), g, dtype=np.int64)
+                                   for g, ids in enumerate(self._group_ids)] or [np.empty(0, np.int64)])
+            mids = np.concatenate([np.asarray(ids, dtype=np.int64)
+                                   for ids in self._group_ids] or [np.empty(0, np.int64)])
+            # 同一成员在同一个群里只计一次；编码后的键按成员ID排序
+            keys = np.unique(mids * max(group_count, 1) + gids)
+            self._memberships = (keys % max(group_count, 1), keys // max(group_count, 1))
+        return self._memberships
+
+    def group_counts(self):
+        """每个成员所在的群数量"""
+        import numpy as np
+
+        _, mids = self.memberships()
+        return np.bincount(mids, minlength=len(self.identities))
+
+    def overlap_matrix(self):
+        """计算群×群重叠矩阵，[i, j] 为同时在群 i 和群 j 中的成员数，对角线为各群人数"""
+        import numpy as np
+
+        group_count = len(self.groups)
+        gids, mids = self.memberships()
+        matrix = np.zeros(group_count * group_count, dtype=np.int64)
+        if not len(mids):
+            return matrix.reshape(group_count, group_count)
+
+        # 成员ID已排序，每个成员的群ID是连续的一段
+        degrees = np.bincount(mids)
+        starts = np.concatenate(([0], np.cumsum(degrees)[:-1]))
+
+        # 按所在群数量 k 分批：k 相同的成员组成 (n, k) 矩阵，一次性展开成 n*k*k 个群对
+        for k in np.unique(degrees[degrees > 0]):
+            member_starts = starts[degrees == k]
+            rows = gids[member_starts[:, None] + np.arange(k)]
+            pairs = rows[:, :, None] * group_count + rows[:, None, :]
+            matrix += np.bincount(pairs.ravel(), minlength=group_count * group_count)
+
+        return matrix.reshape(group_count, group_count)
+
+    def members_in_groups(self, min_groups=2):
+        """列出至少在 min_groups 个群中出现的成员，返回 [(身份键, 名称, [群名称])]，按群数量降序"""
+        import numpy as np
+
+        gids, mids = self.memberships()
+        counts = self.group_counts()
+        selected = np.nonzero(counts >= min_groups)[0]
+        if not len(selected):
+            return []
+
+        starts = np.searchsorted(mids, selected, side='left')
+        result = []
+        for member_id, start, count in zip(selected, starts, counts[selected]):
+            groups = [self.groups[g] for g in gids[start:start + count]]
+            result.append((self.identities[member_id], self.display_names[member_id], groups))
+        result.sort(key=lambda x: (-len(x[2]), x[0]))
+        return result
+
+
+def write_overlap_csv(index, matrix, path):
+    """将重叠矩阵写入CSV（首行首列为群名称）"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([''] + index.groups)
+        for group_name, row in zip(index.groups, matrix):
+            writer.writerow([group_name] + [int(v) for v in row])
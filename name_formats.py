@@ -0,0 +1,108 @@
+import re
+
+# 字段之间的分隔符（含全角）
+SEPARATORS = '-－—|｜'
+_SEP = rf'\s*[{SEPARATORS}]\s*'
+_FIELD = rf'[^{SEPARATORS}]'
+_OPEN, _CLOSE = r'[(（【\[]', r'[)）】\]]'
+
+# 昵称格式模板：(名称, 说明, 正则)，正则用命名分组标出 student_id、location、nickname 字段。
+# 按从具体到宽泛的顺序排列，得分相同时取靠前的模板
+NAME_TEMPLATES = [
+    ('id-city-nick', '学号-城市-昵称',
+     rf'^(?P<student_id>\d+){_SEP}(?P<location>{_FIELD}+?){_SEP}(?P<nickname>.*)$'),
+    ('city-nick', '城市-昵称',
+     rf'^(?P<location>[^{SEPARATORS}\d]{_FIELD}*?){_SEP}(?P<nickname>.+)$'),
+    ('nick-city', '昵称-城市',
+     rf'^(?P<nickname>.+?){_SEP}(?P<location>{_FIELD}+)$'),
+    ('nick(city)', '昵称(城市)',
+     rf'^(?P<nickname>.+?)\s*{_OPEN}(?P<location>[^()（）【】\[\]]+){_CLOSE}$'),
+    ('(city)nick', '(城市)昵称',
+     rf'^{_OPEN}(?P<location>[^()（）【】\[\]]+){_CLOSE}\s*(?P<nickname>.+)$'),
+]
+
+# 匹配格式与地区字段能识别各占的权重：只看格式的话宽泛的模板总能匹配，地区字段能否识别才是关键
+MATCH_WEIGHT = 0.2
+LOCATION_WEIGHT = 0.8
+
+# 最佳模板得分低于该值时认为群内没有统一的昵称格式
+MIN_SCORE = 0.2
+
+
+class NameParser:
+    """按一种昵称格式模板解析成员名，模板正则只编译一次"""
+
+    def __init__(self, name, description, pattern):
+        self.name = name
+        self.description = description
+        self.pattern = re.compile(pattern)
+
+    def parse(self, member):
+        """解析单个成员名，返回 {'student_id', 'location', 'nickname'}，不符合格式时返回 None"""
+        match = self.pattern.match(member)
+        if match is None:
+            return None
+        fields = match.groupdict()
+        return {'student_id': fields.get('student_id'),
+                'location': fields['location'].strip(),
+                'nickname': fields['nickname'].strip()}
+
+    def location(self, member):
+        """只取地区字段，不符合格式时返回 None"""
+        match = self.pattern.match(member)
+        return match.group('location').strip() if match else None
+
+    def extract_locations(self, members):
+        """对整个成员列表提取地区字段，返回与 members 等长的列表"""
+        matches = map(self.pattern.match, members)
+        return [match.group('location').strip() if match else None for match in matches]
+
+
+def get_name_parser(name):
+    """按模板名称获取解析器"""
+    for template in NAME_TEMPLATES:
+        if template[0] == name:
+            return NameParser(*template)
+    raise ValueError(f"未知的昵称格式：{name}（可选：{'、'.join(t[0] for t in NAME_TEMPLATES)}）")
+
+
+def sample_members(members, sample_size=300):
+    """从成员列表中等间隔抽样"""
+    members = list(members)
+    if len(members) <= sample_size:
+        return members
+    step = len(members) / sample_size
+    return [members[int(i * step)] for i in range(sample_size)]
+
+
+def detect_name_format(members, is_location, sample_size=300):
+    """抽样为每个模板打分，返回 (最佳模板的解析器或None, [(模板名, 说明, 得分)] 按得分降序)
+
+    得分 = 格式匹配比例 * MATCH_WEIGHT + 地区字段可识别比例 * LOCATION_WEIGHT；
+    is_location(text) 判断地区字段是否为可识别的地名。
+    """
+    sample = sample_members(members, sample_size)
+    if not sample:
+        return None, []
+    known = {}  # 同一地名只判断一次
+
+    scores = []
+    for template in NAME_TEMPLATES:
+        parser = NameParser(*template)
+        locations = parser.extract_locations(sample)
+        matched = resolved = 0
+        for location in locations:
+            if location is None:
+                continue
+            matched += 1
+            if location not in known:
+                known[location] = bool(is_location(location))
+            resolved += known[location]
+        score = (matched * MATCH_WEIGHT + resolved * LOCATION_WEIGHT) / len(sample)
+        scores.append((template[0], template[1], score))
+
+    best = max(range(len(scores)), key=lambda i: (scores[i][2], -i))
+    ranking = sorted(scores, key=lambda x: -x[2])
+    if scores[best][2] < MIN_SCORE:
+        return None, ranking
+    return NameParser(*NAME_TEMPLATES[best]), ranking
@@ -0,0 +1,146 @@
+import os
+import pickle
+import time
+
+from wechat_group_analysis import normalize_member_name, read_members_file
+
+# 流水线各阶段及其依赖的上游阶段，按执行顺序排列
+STAGES = [
+    ('acquire', ()),                      # 获取成员（微信或成员文件）
+    ('normalize', ('acquire',)),          # 规范化成员名并去重
+    ('classify', ('normalize',)),         # 分类，得到分类结果
+    ('aggregate', ('classify',)),         # 统计汇总、生成文本报告、追加历史记录
+    ('render', ('classify', 'aggregate')),  # 渲染条形图、地图、文本图片和世界分布图
+    ('compose', ('aggregate', 'render')),   # 合并报告图片，写出全部结果文件
+]
+STAGE_NAMES = [name for name, _ in STAGES]
+
+CHECKPOINT_DIR = '.group_checkpoints'
+
+
+class ReportPipeline:
+    """分阶段的报告流水线，每个阶段的输出用 pickle 保存为检查点
+
+    从某个阶段开始运行时，只读取它依赖的上游检查点，不再重复之前的阶段，例如地图渲染失败后
+    修好字体，用 from_stage='render' 即可在几秒内重新出图，无需再次从微信获取成员。
+    """
+
+    def __init__(self, analyzer, checkpoint_dir=CHECKPOINT_DIR, members_file=None, fuzzy=False,
+                 parallel=True, text_only=False, history='group_history.db', verbose=True,
+                 image_format='png', target_mb=None):
+        self.analyzer = analyzer
+        self.checkpoint_dir = checkpoint_dir
+        self.members_file = members_file
+        self.fuzzy = fuzzy
+        self.parallel = parallel
+        self.text_only = text_only
+        self.history = history   # None 时不追加历史记录
+        self.verbose = verbose
+        self.image_format = image_format
+        self.target_mb = target_mb
+        self.outputs = {}        # 阶段 -> 输出（本次运行产生或从检查点读取）
+
+    def checkpoint_path(self, stage):
+        return os.path.join(self.checkpoint_dir, f'{stage}.pkl')
+
+    def save_checkpoint(self, stage, data):
+        """先写临时文件再改名，阶段中途失败不会留下不完整的检查点"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self.checkpoint_path(stage)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def load_checkpoint(self, stage):
+        path = self.checkpoint_path(stage)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"缺少阶段 {stage} 的检查点 {path}，请从更早的阶段开始运行")
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def run(self, from_stage='acquire', to_stage='compose', group_name=None):
+        """依次运行 from_stage 到 to_stage 的各阶段，返回各阶段的输出"""
+        start, end = STAGE_NAMES.index(from_stage), STAGE_NAMES.index(to_stage)
+        if start > end:
+            raise ValueError(f"起始阶段 {from_stage} 在结束阶段 {to_stage} 之后")
+        self.group_name = group_name
+
+        # 读取要运行的阶段所依赖、但本次不运行的上游检查点
+        needed = {dependency for name, dependencies in STAGES[start:end + 1] for dependency in dependencies}
+        for name in STAGE_NAMES[:start]:
+            if name in needed:
+                self.outputs[name] = self.load_checkpoint(name)
+
+        for name, _ in STAGES[start:end + 1]:
+            stage_start = time.perf_counter()
+            self.outputs[name] = getattr(self, f'stage_{name}')()
+            self.save_checkpoint(name, self.outputs[name])
+            if self.verbose:
+                print(f"[{name}] 完成，耗时 {time.perf_counter() - stage_start:.2f}s")
+        return self.outputs
+
+    def stage_acquire(self):
+        """获取成员：指定了成员文件时读取文件，否则从微信获取"""
+        if self.members_file:
+            members = read_members_file(self.members_file)
+            group_name = self.group_name or ''
+        else:
+            group_name = self.group_name or input("请输入要分析的微信群名称：")
+            members = self.analyzer.get_group_members(group_name)
+        return {'group_name': group_name, 'members': members}
+
+    def stage_normalize(self):
+        """规范化成员名（去掉不可打印字符、压缩空白），去掉空名并去重"""
+        acquired = self.outputs['acquire']
+        members = (normalize_member_name(member) for member in acquired['members'])
+        return {'group_name': acquired['group_name'], 'members': list(dict.fromkeys(m for m in members if m))}
+
+    def stage_classify(self):
+        """分类，输出与 save_analysis 相同的分类结果"""
+        normalized = self.outputs['normalize']
+        self.analyzer.group_name = normalized['group_name']
+        self.analyzer.analyze_members(normalized['members'], verbose=self.verbose, fuzzy=self.fuzzy)
+        return self.analyzer.get_state()
+
+    def stage_aggregate(self):
+        """统计汇总并生成文本报告"""
+        self.analyzer.set_state(self.outputs['classify'])
+        if self.history is not None:
+            self.analyzer.record_history(self.history)
+        return {'statistics': self.analyzer.get_statistics(),
+                'text': self.analyzer.generate_text_result()}
+
+    def stage_render(self):
+        """渲染报告图片的各部分（PNG字节），有国外成员时包括世界分布图"""
+        if self.text_only:
+            return {}
+        self.analyzer.set_state(self.outputs['classify'])
+        pieces = ('bar', 'map', 'text') + (('world',) if self.analyzer.foreign_members else ())
+        executor = self.analyzer._create_render_executor() if self.parallel else None
+        try:
+            return self.analyzer.render_report_pieces(self.outputs['aggregate']['text'], executor, pieces)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def stage_compose(self):
+        """写出文本报告，合并报告图片，返回生成的文件列表"""
+        files = []
+        with open('group_analysis.txt', 'w', encoding='utf-8') as f:
+            f.write(self.outputs['aggregate']['text'])
+        files.append(('group_analysis.txt', '文本格式统计结果'))
+
+        pieces = self.outputs['render']
+        if pieces:
+            final_image = self.analyzer.compose_report_image(pieces)
+            paths = self.analyzer.save_report_image(final_image, self.image_format, self.target_mb)
+            files.insert(0, ('、'.join(paths), '完整的图片格式分析报告'))
+        if 'world' in pieces:
+            with open('group_world_map.png', 'wb') as f:
+                f.write(pieces['world'])
+            files.append(('group_world_map.png', '世界分布图'))
+
+        print("分析完成！生成的文件：")
+        for index, (path, description) in enumerate(files, 1):
+            print(f"{index}. {path} - {description}")
+        return files
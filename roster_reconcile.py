@@ -0,0 +1,134 @@
+import csv
+
+from wechat_group_analysis import normalize_member_name, parse_student_id, resolve_location
+
+
+def load_roster(path, id_column='学号', city_column='城市'):
+    """读取花名册CSV，建立 {学号: 城市} 哈希索引"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return {}
+        header = [column.strip() for column in header]
+        if id_column not in header:
+            raise ValueError(f"花名册中没有学号列：{id_column}")
+        id_index = header.index(id_column)
+        city_index = header.index(city_column) if city_column in header else None
+
+        roster = {}
+        for row in reader:
+            if len(row) <= id_index:
+                continue
+            student_id = row[id_index].strip()
+            if not student_id:
+                continue
+            city = row[city_index].strip() if city_index is not None and len(row) > city_index else ''
+            roster[student_id] = city
+        return roster
+
+
+def locations_match(roster_location, inferred_location):
+    """比较花名册地点和昵称推断地点；任意一方只有省份时只比较省份"""
+    roster_province, roster_city = roster_location
+    inferred_province, inferred_city = inferred_location
+    if roster_province != inferred_province:
+        return False
+    if roster_city is None or inferred_city is None:
+        return True
+    return roster_city == inferred_city
+
+
+def reconcile(roster, members, member_locations, location_info, city_to_province, ignored=(),
+              member_countries=None):
+    """将群成员逐个与花名册比对，返回缺失、多余、城市不一致和无法推断地点的名单；ignored 中的成员（如管理员）不参与比对
+
+    member_locations 为 {成员: (省份, 城市)}（国内成员），member_countries 为 {成员: 国家名称}（国外成员）；
+    花名册是国内城市而昵称推断为国外时算作城市不一致，昵称推断不出地点时列入无法推断。
+    """
+    seen = set()
+    extra = []        # 群里有但花名册没有：[(学号或None, 成员)]
+    mismatched = []   # 城市不一致：[(学号, 成员, 花名册城市, 推断地点)]
+    unresolved = []   # 花名册有城市、昵称推断不出地点：[(学号, 成员, 花名册城市)]
+    resolved = {}     # 花名册城市名 -> (省份, 城市)，同名城市只解析一次
+    member_countries = member_countries or {}
+
+    for member in members:
+        member = normalize_member_name(member)
+        if member in ignored:
+            continue
+        student_id = parse_student_id(member)
+        if student_id is None or student_id not in roster:
+            extra.append((student_id, member))
+            continue
+        seen.add(student_id)
+
+        roster_city = roster[student_id]
+        if not roster_city:
+            continue
+        if roster_city not in resolved:
+            resolved[roster_city] = resolve_location(roster_city, location_info, city_to_province)
+        roster_location = resolved[roster_city]
+        if roster_location[0] is None:
+            continue
+        inferred = member_locations.get(member)
+        if inferred is None:
+            country = member_countries.get(member)
+            if country is not None:
+                mismatched.append((student_id, member, roster_city, country))
+            else:
+                unresolved.append((student_id, member, roster_city))
+            continue
+        if not locations_match(roster_location, inferred):
+            inferred_name = inferred[1] or inferred[0]
+            mismatched.append((student_id, member, roster_city, inferred_name))
+
+    missing = [(student_id, roster[student_id]) for student_id in roster if student_id not in seen]
+    return {'missing': missing, 'extra': extra, 'mismatched': mismatched, 'unresolved': unresolved}
+
+
+def write_reconciliation_csv(result, path):
+    """将比对结果写入CSV"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['类型', '学号', '成员', '花名册城市', '昵称推断地点'])
+        for student_id, city in result['missing']:
+            writer.writerow(['未入群', student_id, '', city, ''])
+        for student_id, member in result['extra']:
+            writer.writerow(['不在花名册', student_id or '', member, '', ''])
+        for student_id, member, roster_city, inferred in result['mismatched']:
+            writer.writerow(['城市不一致', student_id, member, roster_city, inferred])
+        for student_id, member, roster_city in result['unresolved']:
+            writer.writerow(['无法推断地点', student_id, member, roster_city, ''])
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    from wechat_group_analysis import WeChatGroupAnalyzer
+
+    # 自测：花名册为国内城市时，昵称推断为国外或推断不出地点的成员也要列出，不能跳过
+    roster_rows = [('1000', '北京'), ('1001', '上海'), ('1002', '北京'), ('1003', '北京'), ('1004', '杭州')]
+    members = ['1000-US-用户0', '1001-用户1', '1002-北京-用户2', '1003-广州-用户3', '1005-成都-用户5']
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'roster.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows([('学号', '城市'), *roster_rows])
+        roster = load_roster(path)
+
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.analyze_members(members, verbose=False)
+    location_info, city_to_province, _ = analyzer.get_location_index()
+    result = reconcile(roster, members, analyzer.get_member_locations(), location_info, city_to_province,
+                       set(analyzer.admin_members), analyzer.get_member_countries())
+    expected = {
+        'missing': [('1004', '杭州')],
+        'extra': [('1005', '1005-成都-用户5')],
+        'mismatched': [('1000', '1000-US-用户0', '北京', analyzer.get_world_gazetteer().country_name('USA')),
+                       ('1003', '1003-广州-用户3', '北京', '广州')],
+        'unresolved': [('1001', '1001-用户1', '上海')],
+    }
+    if result != expected:
+        raise SystemExit(f"花名册比对自测失败：\n结果 {result}\n应为 {expected}")
+    print("花名册比对自测通过")
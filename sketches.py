@@ -0,0 +1,406 @@
+import base64
+import binascii
+import hashlib
+import itertools
+import json
+import math
+import re
+import sys
+import time
+import zlib
+from array import array
+
+# 聊天内容中的关键词：英文单词，或中文连续片段中的相邻两字
+_WORD = re.compile(r'[A-Za-z][A-Za-z0-9+#.]+|[\u4e00-\u9fff]+')
+
+# 草图文件格式：JSON，寄存器和计数器为 zlib 压缩后的 base64 字节（计数器按小端序）
+SKETCH_FORMAT = 'wechat-group-sketch'
+SKETCH_VERSION = 1
+
+# 识别昵称格式时抽样的成员数（取每个群的前若干个，与 stream 子命令相同）
+NAME_FORMAT_SAMPLE = 2000
+
+
+def _pack(data):
+    return base64.b64encode(zlib.compress(bytes(data))).decode('ascii')
+
+
+def _unpack(text, size):
+    """解码 _pack 的结果，并检查长度是否为 size 字节（最多解压 size + 1 字节，损坏的文件不会占满内存）"""
+    data = zlib.decompressobj().decompress(base64.b64decode(text.encode('ascii'), validate=True), size + 1)
+    if len(data) != size:
+        raise ValueError(f"数据长度为 {len(data)} 字节，应为 {size} 字节")
+    return data
+
+
+def hash64(item):
+    """稳定的64位哈希（与进程无关，不同机器、不同次运行生成的草图可以合并）"""
+    return int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计：2^precision 个寄存器，每个 1 字节，标准误差约 1.04/sqrt(2^precision)
+
+    两个参数相同的草图按寄存器取最大值即可合并，结果等同于对两个数据流的并集计数。
+    """
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog 的精度应在 4 到 18 之间：{precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item):
+        self.add_hash(hash64(item))
+
+    def add_hash(self, value):
+        rest_bits = 64 - self.precision
+        index = value >> rest_bits
+        rest = value & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1  # 剩余位中第一个 1 的位置
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def to_dict(self):
+        return {'precision': self.precision, 'registers': _pack(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(int(data['precision']))
+        registers = bytearray(_unpack(data['registers'], len(sketch.registers)))
+        if max(registers) > 64 - sketch.precision + 1:
+            raise ValueError("HyperLogLog 寄存器的值超出范围")
+        sketch.registers = registers
+        return sketch
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"HyperLogLog 精度不同，无法合并：{self.precision} 与 {other.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """估计不同元素的个数（小基数时使用线性计数修正）"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return estimate
+
+    def memory(self):
+        """寄存器占用的字节数"""
+        return len(self.registers)
+
+
+class CountMinSketch:
+    """Count-Min 频率估计：depth 行、每行 width 个计数器
+
+    估计值不会低于真实值，超出部分以 1 - e^-depth 的概率不超过 总数 * e / width。
+    参数相同的草图逐个计数器相加即可合并。
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.rows = [array('q', bytes(8 * width)) for _ in range(depth)]
+
+    @classmethod
+    def from_error(cls, epsilon=0.001, delta=0.01):
+        """按误差上限 epsilon（相对总数）和失败概率 delta 选择宽度和深度"""
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def _indexes(self, item):
+        # 由一个64位哈希派生 depth 个下标（Kirsch-Mitzenmacher）
+        value = hash64(item)
+        low, high = value & 0xFFFFFFFF, value >> 32
+        return [(low + i * high) % self.width for i in range(self.depth)]
+
+    def add(self, item, count=1):
+        """计数并返回该元素当前的估计值"""
+        self.total += count
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(item)):
+            row[index] += count
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+    def estimate(self, item):
+        return min(row[index] for row, index in zip(self.rows, self._indexes(item)))
+
+    def to_dict(self):
+        rows = array('q')
+        for row in self.rows:
+            rows.extend(row)
+        if sys.byteorder == 'big':
+            rows.byteswap()
+        return {'width': self.width, 'depth': self.depth, 'total': self.total, 'counters': _pack(rows.tobytes())}
+
+    @classmethod
+    def from_dict(cls, data):
+        width, depth = int(data['width']), int(data['depth'])
+        if width <= 0 or depth <= 0:
+            raise ValueError(f"Count-Min 草图尺寸无效：{width}x{depth}")
+        sketch = cls(width, depth)
+        counters = array('q', _unpack(data['counters'], 8 * width * depth))
+        if sys.byteorder == 'big':
+            counters.byteswap()
+        sketch.rows = [counters[i * width:(i + 1) * width] for i in range(depth)]
+        sketch.total = int(data['total'])
+        return sketch
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError(f"Count-Min 草图尺寸不同，无法合并：{self.width}x{self.depth} 与 {other.width}x{other.depth}")
+        for row, other_row in zip(self.rows, other.rows):
+            for index, value in enumerate(other_row):
+                if value:
+                    row[index] += value
+        self.total += other.total
+        return self
+
+    def memory(self):
+        return self.width * self.depth * 8
+
+
+class HeavyHitters:
+    """配合 Count-Min 草图跟踪出现最多的元素：只保留有限个候选，超过容量的两倍时按估计值裁剪"""
+
+    def __init__(self, sketch, capacity=50):
+        self.sketch = sketch
+        self.capacity = capacity
+        self.candidates = {}  # 元素 -> 最近一次的估计值
+
+    def add(self, item, count=1):
+        self.candidates[item] = self.sketch.add(item, count)
+        if len(self.candidates) > 2 * self.capacity:
+            self._trim()
+
+    def _trim(self):
+        top = sorted(self.candidates.items(), key=lambda x: -x[1])[:self.capacity]
+        self.candidates = dict(top)
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'sketch': self.sketch.to_dict(), 'candidates': list(self.candidates)}
+
+    @classmethod
+    def from_dict(cls, data):
+        tracker = cls(CountMinSketch.from_dict(data['sketch']), int(data['capacity']))
+        # 候选的估计值由草图重新计算，不信任文件中的数值
+        tracker.candidates = {str(item): tracker.sketch.estimate(str(item)) for item in data['candidates']}
+        return tracker
+
+    def merge(self, other):
+        """合并草图和候选，候选按合并后草图的估计值重新排序"""
+        self.sketch.merge(other.sketch)
+        for item in set(self.candidates) | set(other.candidates):
+            self.candidates[item] = self.sketch.estimate(item)
+        self._trim()
+        return self
+
+    def top(self, k=10):
+        """返回 [(元素, 估计次数)]，按估计次数降序"""
+        ranked = sorted(((item, self.sketch.estimate(item)) for item in self.candidates), key=lambda x: (-x[1], x[0]))
+        return ranked[:k]
+
+
+class SketchStatistics:
+    """基于草图的跨群统计，与 analyze_members 并列使用：不保存成员名单，内存占用与成员数无关
+
+    - 各省份不同成员数：每个省份一个 HyperLogLog，按成员身份（学号或昵称哈希）计数，同一人在多个群中只计一次
+    - 城市出现次数（按成员人次）和聊天关键词频率：Count-Min 草图加候选跟踪
+    每个群单独生成草图，保存后可以随时合并。
+    """
+
+    def __init__(self, precision=12, width=2048, depth=4, top_k=50):
+        self.precision = precision
+        self.members = HyperLogLog(precision)
+        self.province_members = {}  # 省份 -> HyperLogLog
+        self.cities = HeavyHitters(CountMinSketch(width, depth), top_k)
+        self.keywords = HeavyHitters(CountMinSketch(width, depth), top_k)
+        self.memberships = 0        # 成员人次（不去重）
+        self.groups = []            # 已计入的群
+
+    def add_members(self, analyzer, members, group_name=''):
+        """按 analyzer 的分类规则计入一个群的成员；members 可以是逐行读取文件的迭代器，
+        只缓存用于识别昵称格式的前 NAME_FORMAT_SAMPLE 个成员，其余逐个分类后丢弃"""
+        from member_overlap import member_identity
+        from wechat_group_analysis import normalize_member_name
+
+        normalized = (normalize_member_name(member) for member in members)
+        normalized = (member for member in normalized if member)
+        sample = list(itertools.islice(normalized, NAME_FORMAT_SAMPLE))
+        analyzer.group_name = group_name
+        analyzer.detect_name_format(sample)
+        for member in itertools.chain(sample, normalized):
+            self.memberships += 1
+            value = hash64(member_identity(member))
+            self.members.add_hash(value)
+            category, province, city = analyzer.classify_member(member)
+            if category != 'province':
+                continue
+            sketch = self.province_members.get(province)
+            if sketch is None:
+                sketch = self.province_members[province] = HyperLogLog(self.precision)
+            sketch.add_hash(value)
+            self.cities.add(f'{province}/{city}' if city != '省会' else f'{province}/未知城市')
+        self.groups.append(group_name)
+
+    def add_text(self, text):
+        """计入一条聊天内容的关键词（英文单词小写，中文按相邻两字切分）"""
+        for token in _WORD.findall(text):
+            if token.isascii():
+                self.keywords.add(token.lower())
+            elif len(token) == 1:
+                self.keywords.add(token)
+            else:
+                for i in range(len(token) - 1):
+                    self.keywords.add(token[i:i + 2])
+
+    def merge(self, other):
+        """合并另一份统计（例如另一个群的草图）"""
+        self.members.merge(other.members)
+        for province, sketch in other.province_members.items():
+            if province in self.province_members:
+                self.province_members[province].merge(sketch)
+            else:
+                self.province_members[province] = HyperLogLog(self.precision).merge(sketch)
+        self.cities.merge(other.cities)
+        self.keywords.merge(other.keywords)
+        self.memberships += other.memberships
+        self.groups.extend(other.groups)
+        return self
+
+    def province_counts(self):
+        """按估计人数降序返回 [(省份, 估计不同成员数)]"""
+        counts = [(province, round(sketch.count())) for province, sketch in self.province_members.items()]
+        return sorted(counts, key=lambda x: (-x[1], x[0]))
+
+    def memory(self):
+        """所有草图占用的字节数"""
+        return (self.members.memory() + sum(sketch.memory() for sketch in self.province_members.values())
+                + self.cities.sketch.memory() + self.keywords.sketch.memory())
+
+    def save(self, path):
+        """保存为JSON草图文件（只含寄存器、计数器和候选，不含成员名单）"""
+        data = {
+            'format': SKETCH_FORMAT,
+            'version': SKETCH_VERSION,
+            'precision': self.precision,
+            'members': self.members.to_dict(),
+            'province_members': {province: sketch.to_dict() for province, sketch in self.province_members.items()},
+            'cities': self.cities.to_dict(),
+            'keywords': self.keywords.to_dict(),
+            'memberships': self.memberships,
+            'groups': self.groups,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """读取 save 保存的草图文件，文件格式不正确时抛出 ValueError"""
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                data = json.load(f)
+            except ValueError as e:
+                raise ValueError(f"{path} 不是草图文件：{e}")
+        if not isinstance(data, dict) or data.get('format') != SKETCH_FORMAT:
+            raise ValueError(f"{path} 不是草图文件")
+        if data.get('version') != SKETCH_VERSION:
+            raise ValueError(f"{path} 的草图格式版本 {data.get('version')} 不受支持")
+        try:
+            statistics = cls(int(data['precision']))
+            statistics.members = HyperLogLog.from_dict(data['members'])
+            statistics.province_members = {str(province): HyperLogLog.from_dict(sketch)
+                                           for province, sketch in data['province_members'].items()}
+            if any(sketch.precision != statistics.precision
+                   for sketch in [statistics.members, *statistics.province_members.values()]):
+                raise ValueError("HyperLogLog 精度不一致")
+            statistics.cities = HeavyHitters.from_dict(data['cities'])
+            statistics.keywords = HeavyHitters.from_dict(data['keywords'])
+            statistics.memberships = int(data['memberships'])
+            statistics.groups = [str(group) for group in data['groups']]
+        except (KeyError, TypeError, AttributeError, ValueError, binascii.Error, zlib.error) as e:
+            raise ValueError(f"草图文件 {path} 已损坏：{e}")
+        return statistics
+
+    def print_summary(self, top=10):
+        print(f"\n草图统计（{len(self.groups)}个群，草图共占用 {self.memory() / 1024:.0f}KB）：")
+        print(f"成员人次：{self.memberships}")
+        print(f"不同成员数（估计）：{round(self.members.count())}")
+        print("\n各省份不同成员数（估计）：")
+        for province, count in self.province_counts():
+            print(f"- {province}：约{count}人")
+        print("\n出现最多的城市（估计人次）：")
+        for city, count in self.cities.top(top):
+            print(f"- {city}：{count}")
+        if self.keywords.sketch.total:
+            print("\n出现最多的关键词（估计次数）：")
+            for keyword, count in self.keywords.top(top):
+                print(f"- {keyword}：{count}")
+
+
+def _zipf_stream(count, distinct, seed=0):
+    """按近似 Zipf 分布生成元素流（用于测试 Count-Min 的误差）"""
+    import random
+
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return [f'k{index}' for index in rng.choices(range(distinct), weights=weights, k=count)]
+
+
+if __name__ == '__main__':
+    import argparse
+    from collections import Counter
+
+    parser = argparse.ArgumentParser(description='HyperLogLog 与 Count-Min 草图的精度/内存测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='HyperLogLog 测试的不同元素数')
+    parser.add_argument('--precisions', type=int, nargs='+', default=[10, 12, 14], help='HyperLogLog 精度')
+    parser.add_argument('--stream', type=int, default=1000000, help='Count-Min 测试的数据流长度')
+    args = parser.parse_args()
+
+    print("HyperLogLog：不同元素数 / 精度 / 寄存器字节 / 相对误差 / 精确集合约占字节（64位哈希）")
+    for size in args.sizes:
+        items = [f'member-{i}' for i in range(size)]
+        hashes = [hash64(item) for item in items]
+        exact = set(hashes)
+        exact_bytes = sys.getsizeof(exact) + sum(sys.getsizeof(value) for value in exact)
+        for precision in args.precisions:
+            sketch = HyperLogLog(precision)
+            for value in hashes:
+                sketch.add_hash(value)
+            error = (sketch.count() - size) / size
+            print(f"{size:>9} {precision:>4} {sketch.memory():>8} {error * 100:+7.2f}% {exact_bytes:>12}")
+
+    # 合并：两个各含 60% 元素、重叠 20% 的草图，合并后应接近全部元素数
+    size = args.sizes[-1]
+    left, right = HyperLogLog(14), HyperLogLog(14)
+    for i in range(size):
+        if i < size * 0.6:
+            left.add(f'member-{i}')
+        if i >= size * 0.4:
+            right.add(f'member-{i}')
+    print(f"\n合并测试：真实 {size}，合并后估计 {round(left.merge(right).count())}")
+
+    print(f"\nCount-Min：流长度 {args.stream}（Zipf 分布，10万个不同元素）")
+    print("宽度x深度 / 计数器字节 / 前100元素平均超估 / 全部元素最大超估 / 理论上限(e/宽度*总数) / 写入耗时")
+    stream = _zipf_stream(args.stream, 100000)
+    exact = Counter(stream)
+    top = [item for item, _ in exact.most_common(100)]
+    for width, depth in ((1024, 4), (4096, 4), (16384, 5)):
+        sketch = CountMinSketch(width, depth)
+        start = time.perf_counter()
+        for item in stream:
+            sketch.add(item)
+        elapsed = time.perf_counter() - start
+        top_error = sum(sketch.estimate(item) - exact[item] for item in top) / len(top)
+        max_error = max(sketch.estimate(item) - count for item, count in exact.items())
+        bound = math.e / width * args.stream
+        print(f"{width:>6}x{depth} {sketch.memory():>9} {top_error:>10.1f} {max_error:>10} {bound:>10.0f} {elapsed:>7.2f}s")
+    exact_bytes = sys.getsizeof(exact) + sum(sys.getsizeof(item) for item in exact)
+    print(f"精确计数（Counter）约占 {exact_bytes} 字节")
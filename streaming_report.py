@@ -0,0 +1,221 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from member_export import member_record
+from wechat_group_analysis import normalize_member_name
+
+
+class StreamingClassifier:
+    """内存有界的流式分类：成员名按分类桶溢写到磁盘，内存中只保留各桶的人数
+
+    适合合并多个群后数十万成员的场景。分类规则与 WeChatGroupAnalyzer.analyze_members 相同，
+    文本报告按与 generate_text_result 相同的格式和排序，从溢写文件逐行写出。
+    """
+
+    def __init__(self, analyzer, spill_dir=None, buffer_size=20000, fuzzy=False, dedupe=True,
+                 exporter=None, group=''):
+        self.analyzer = analyzer
+        self.fuzzy = fuzzy
+        # 可选的 member_export.MemberExportWriter，每个成员分类后同时写出一行导出记录
+        self.exporter = exporter
+        self.group = group
+        self.buffer_size = buffer_size
+        # 去重只保存成员名的64位哈希，不保存成员名本身
+        self._seen = set() if dedupe else None
+        self._own_dir = spill_dir is None
+        self.spill_dir = tempfile.mkdtemp(prefix='group_spill_') if spill_dir is None else spill_dir
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+        # 只保存人数
+        self.total = 0
+        self.admin_count = 0
+        self.province_counts = {}   # 省份 -> {城市: 人数}
+        self.country_counts = {}    # ISO3代码 -> 人数
+        self.unknown_count = 0
+        self.fuzzy_count = 0
+
+        self._bucket_files = {}     # 分类桶 -> 溢写文件路径
+        self._buffers = {}          # 分类桶 -> 尚未写盘的行
+        self._buffered = 0
+
+    def close(self):
+        """删除自动创建的溢写目录"""
+        if self._own_dir and os.path.isdir(self.spill_dir):
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _append(self, bucket, line):
+        """把一行加入分类桶的缓冲区，缓冲总行数达到上限时全部写盘"""
+        self._buffers.setdefault(bucket, []).append(line)
+        self._buffered += 1
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """把所有缓冲区追加写入各自的溢写文件"""
+        for bucket, lines in self._buffers.items():
+            path = self._bucket_files.get(bucket)
+            if path is None:
+                path = os.path.join(self.spill_dir, f'{len(self._bucket_files):05d}.txt')
+                self._bucket_files[bucket] = path
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+                f.write('\n')
+        self._buffers = {}
+        self._buffered = 0
+
+    def _iter_bucket(self, bucket):
+        """按写入顺序逐行读取分类桶"""
+        path = self._bucket_files.get(bucket)
+        if path is None:
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+    def add(self, member):
+        """分类单个成员"""
+        member = normalize_member_name(member)
+        if not member:
+            return
+        if self._seen is not None:
+            digest = int.from_bytes(hashlib.blake2b(member.encode('utf-8'), digest_size=8).digest(), 'little')
+            if digest in self._seen:
+                return
+            self._seen.add(digest)
+        self.total += 1
+
+        category, key, city = self.analyzer.classify_member(member)
+        match = None
+        if category == 'unknown' and self.fuzzy:
+            match = self.analyzer.get_fuzzy_matcher().match(member)
+            if match is not None:
+                category, key, city = 'province', match['province'], match['city'] or '省会'
+                self.fuzzy_count += 1
+                self._append('fuzzy', f"- {member} -> {match['city'] or match['province']}"
+                                      f"（{match['source']}，置信度{match['confidence']:.2f}）")
+
+        if category == 'admin':
+            self.admin_count += 1
+        elif category == 'province':
+            cities = self.province_counts.setdefault(key, {})
+            cities[city] = cities.get(city, 0) + 1
+        elif category == 'foreign':
+            self.country_counts[key] = self.country_counts.get(key, 0) + 1
+        else:
+            self.unknown_count += 1
+        # 二次匹配的成员单独成桶，报告中排在同一城市精确匹配的成员之后（与 analyze_members 的顺序相同）
+        self._append((category, key, city) if match is None else ('fuzzy', key, city), member)
+        if self.exporter is not None:
+            self.exporter.write(member_record(member, category, key, city, self.group, match))
+
+    def _iter_city(self, province, city):
+        """逐行读取某城市的成员：先精确匹配的成员，再二次匹配的成员"""
+        yield from self._iter_bucket(('province', province, city))
+        yield from self._iter_bucket(('fuzzy', province, city))
+
+    def add_all(self, members):
+        """分类一批成员（可以是逐行读取文件的迭代器）"""
+        for member in members:
+            self.add(member)
+
+    def province_totals(self):
+        """按人数降序返回 [(省份, 人数)]"""
+        totals = [(province, sum(cities.values())) for province, cities in self.province_counts.items()]
+        return sorted(totals, key=lambda x: (-x[1], x[0]))
+
+    def get_statistics(self):
+        """返回与 WeChatGroupAnalyzer.get_statistics() 相同结构的统计结果（不含成员名单）"""
+        gazetteer = self.analyzer.get_world_gazetteer()
+        provinces = {}
+        for province, total in self.province_totals():
+            cities = self.province_counts[province]
+            provinces[province] = {
+                'total': total,
+                'cities': dict(sorted(cities.items(), key=lambda x: (-x[1], x[0])))
+            }
+        foreign_count = sum(self.country_counts.values())
+        return {
+            'total': self.total,
+            'admin_count': self.admin_count,
+            'foreign_count': foreign_count,
+            'unknown_count': self.unknown_count,
+            'provinces': provinces,
+            'foreign_countries': {code: {'name': gazetteer.country_name(code), 'total': count}
+                                  for code, count in sorted(self.country_counts.items(),
+                                                            key=lambda x: (-x[1], gazetteer.country_name(x[0])))}
+        }
+
+    def write_report(self, path='group_analysis.txt'):
+        """按 generate_text_result 的格式，从溢写文件逐段写出文本报告"""
+        self.flush()
+        gazetteer = self.analyzer.get_world_gazetteer()
+
+        with open(path, 'w', encoding='utf-8') as f:
+            def write(line=''):
+                f.write(line)
+                f.write('\n')
+
+            write("=== 微信群成员分析报告 ===\n")
+            write(f"该群共有成员{self.total}人，具体构成如下：\n")
+
+            write(f"【马哥教育成员】（{self.admin_count}人）")
+            for member in self._iter_bucket(('admin', None, None)):
+                write(f"- {member}")
+            write()
+
+            write("【地区分布情况】")
+            for province, total in self.province_totals():
+                cities = self.province_counts[province]
+                write(f"\n{province}（共{total}人）：")
+                if cities.get('省会'):
+                    write(f"- {province}未知城市（{cities['省会']}人）")
+                    for member in self._iter_city(province, '省会'):
+                        write(f"  * {member}")
+                for city, count in sorted(cities.items(), key=lambda x: (-x[1], x[0])):
+                    if city != '省会':
+                        write(f"- {city}（{count}人）")
+                        for member in self._iter_city(province, city):
+                            write(f"  * {member}")
+
+            foreign_count = sum(self.country_counts.values())
+            if foreign_count:
+                write(f"\n【国外成员】（{foreign_count}人）")
+                countries = sorted(self.country_counts.items(),
+                                   key=lambda x: (-x[1], gazetteer.country_name(x[0])))
+                for code, count in countries:
+                    write(f"- {gazetteer.country_name(code)}（{count}人）")
+                    for member in self._iter_bucket(('foreign', code, None)):
+                        write(f"  * {member}")
+
+            if self.fuzzy_count:
+                write(f"\n【二次匹配成员】（{self.fuzzy_count}人）")
+                for line in self._iter_bucket('fuzzy'):
+                    write(line)
+
+            if self.unknown_count:
+                write(f"\n【未知地区人员】（{self.unknown_count}人）")
+                for member in self._iter_bucket(('unknown', None, None)):
+                    write(f"- {member}")
+
+    def print_summary(self):
+        """在控制台只输出汇总数字"""
+        print("\n分析结果：")
+        print(f"总成员数：{self.total}")
+        print(f"马哥教育成员数：{self.admin_count}")
+        print(f"国内成员数：{sum(total for _, total in self.province_totals())}"
+              f"（{len(self.province_counts)}个省份）")
+        print(f"国外成员数：{sum(self.country_counts.values())}（{len(self.country_counts)}个国家）")
+        if self.fuzzy:
+            print(f"二次匹配成员数：{self.fuzzy_count}")
+        print(f"未知地区人员：{self.unknown_count}")
+        top = self.province_totals()[:5]
+        if top:
+            print("人数最多的省份：" + '、'.join(f"{province}（{total}人）" for province, total in top))
@@ -1,40 +1,75 @@
 import re
-import pandas as pd
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw, ImageFont
 import os
 import time
 import sys
-from wxauto import WeChat
-import pyperclip
-import numpy as np
-from matplotlib.path import Path
-from matplotlib.patches import PathPatch
-import textwrap
-from datetime import datetime
-import matplotlib.colors as mcolors
-from matplotlib.gridspec import GridSpec
-from wordcloud import WordCloud
-import geopandas as gpd
-import requests
-import zipfile
 import io
 import json
-from shapely.geometry import Polygon, MultiPolygon
+import heapq
+import itertools
+import argparse
+
+# 重量级依赖（wxauto、geopandas、shapely、matplotlib、wordcloud、requests、PIL、numpy）
+# 只在需要它们的阶段内导入，纯文本分类无需加载任何第三方库
+
+# 成员名开头的学号（"学号-城市-昵称"）
+STUDENT_ID_PATTERN = re.compile(r'^(\d+)\s*-')
+
+
+def normalize_member_name(member):
+    """移除不可打印字符并把连续空白压缩为单个空格"""
+    if not member.isprintable():
+        member = ''.join(c for c in member if c.isprintable())  # 移除所有不可打印字符
+    return ' '.join(member.split())  # 分割并重组，确保只有单个空格
+
+
+def parse_student_id(member):
+    """从"学号-城市-昵称"格式的成员名中解析学号，无学号时返回 None"""
+    match = STUDENT_ID_PATTERN.match(member)
+    return match.group(1) if match else None
+
+
+def resolve_location(name, location_info, city_to_province):
+    """把城市或省份名称解析为 (省份, 城市)，只有省份时城市为 None，无法识别时返回 (None, None)"""
+    name = name.strip()
+    for candidate in (name, name.rstrip('市'), name.rstrip('省')):
+        if candidate in city_to_province:
+            return city_to_province[candidate], candidate
+        if candidate in location_info:
+            return candidate, None
+    for province, info in location_info.items():
+        if name in info['aliases']:
+            return province, None
+    return None, None
 
 class WeChatGroupAnalyzer:
-    def __init__(self):
+    def __init__(self, connect_wechat=True):
         self.wx = None
         self.members = []
         self.admin_members = []
         self.province_city_members = {}  # 省份-城市二级结构
         self.foreign_members = []   # 国外成员
+        self.foreign_country_members = {}  # 国家ISO3代码 -> 国外成员
         self.unknown_members = []   # 未知地区人员
+        self.fuzzy_matches = {}     # 二次匹配结果：成员 -> 匹配信息
         self.group_name = ""  # 添加群名属性
-        self.initialize_wechat()
+        self._location_index = None  # 缓存的地名索引
+        self._fuzzy_matcher = None   # 缓存的二次匹配器
+        self._world_gazetteer = None # 缓存的世界地名索引
+        self._world_map = None       # 缓存的世界地图数据
+        self._china_map = None       # 缓存的中国地图数据
+        self._fonts = {}             # 按字号缓存的字体
+        self._glyph_atlas = None     # 缓存的字形（文本图片渲染用）
+        self._admin_rules = None     # 缓存的马哥教育成员识别规则
+        self.admin_rules_path = None # 识别规则文件（None 时使用内置规则）
+        self.name_format = None      # 昵称格式模板名（None 时按成员名自动识别）
+        self.name_parser = None      # 当前群使用的昵称解析器（name_formats.NameParser）
+        if connect_wechat:
+            self.initialize_wechat()
         
     def initialize_wechat(self, max_retries=3):
         """初始化微信连接，包含重试机制"""
+        from wxauto import WeChat
+        
         print("正在连接微信...")
         for i in range(max_retries):
             try:
@@ -85,8 +120,9 @@ class WeChatGroupAnalyzer:
                     chat_text = self.wx.GetAllTestData()
                     if chat_text:
                         # 分析聊天记录中的成员信息
+                        parser = self.get_acquire_parser()
                         for line in chat_text:
-                            if re.match(r'\d+-[^-]+-.*', line):  # 匹配"学号-城市-昵称"格式
+                            if parser.pattern.match(line.strip()):  # 匹配本群的昵称格式（默认"学号-城市-昵称"）
                                 members.append(line.strip())
                             elif '马哥' in line:
                                 members.append(line.strip())
@@ -111,9 +147,10 @@ class WeChatGroupAnalyzer:
                 members = []
                 
                 if chat_text:
+                    parser = self.get_acquire_parser()
                     for line in chat_text:
                         # 匹配群成员格式
-                        if re.match(r'\d+-[^-]+-.*', line):  # 学号-城市-昵称
+                        if parser.pattern.match(line.strip()):  # 本群的昵称格式（默认"学号-城市-昵称"）
                             members.append(line.strip())
                         elif '马哥' in line:  # 马哥教育成员
                             members.append(line.strip())
@@ -139,6 +176,12 @@ class WeChatGroupAnalyzer:
             print(f"- 会话列表状态：{bool(self.wx.GetSessionList())}")
             sys.exit(1)
     
+    def get_acquire_parser(self):
+        """备选获取方式从聊天记录中筛选成员名时使用的昵称格式：指定了 name_format 时用它，否则默认为学号-城市-昵称"""
+        from name_formats import get_name_parser
+        
+        return get_name_parser(self.name_format or 'id-city-nick')
+
     def get_location_info(self):
         """获取地理位置信息"""
         return {
@@ -319,103 +362,184 @@ class WeChatGroupAnalyzer:
             }
         }
         
-    def analyze_members(self, members):
-        """分析成员信息"""
-        location_info = self.get_location_info()
-        # 创建城市到省份的映射
-        city_to_province = {}
-        for province, info in location_info.items():
-            for city in info['cities']:
-                city_to_province[city] = province
-        
-        # 国外城市列表
-        foreign_cities = {
-            '多伦多', '温哥华', '蒙特利尔', '渥太华',  # 加拿大
-            '纽约', '洛杉矶', '芝加哥', '休斯顿', '西雅图',  # 美国
-            '伦敦', '曼彻斯特', '利物浦',  # 英国
-            '巴黎', '马赛', '里昂',  # 法国
-            '柏林', '慕尼黑', '汉堡',  # 德国
-            '东京', '大阪', '名古屋',  # 日本
-            '首尔', '釜山', '仁川',  # 韩国
-            '新加坡',  # 新加坡
-            '悉尼', '墨尔本', '布里斯班',  # 澳大利亚
-            '迪拜', '阿布扎比',  # 阿联酋
-            '莫斯科', '圣彼得堡',  # 俄罗斯
-            '马德里', '巴塞罗那',  # 西班牙
-            '米兰', '罗马', '威尼斯'  # 意大利
-        }
+    def get_location_index(self):
+        """获取地名索引（地理信息、城市到省份映射、按长度降序的城市列表），首次调用后缓存"""
+        if self._location_index is None:
+            location_info = self.get_location_info()
+            # 创建城市到省份的映射
+            city_to_province = {}
+            for province, info in location_info.items():
+                for city in info['cities']:
+                    city_to_province[city] = province
+            # 按城市名长度降序排序，避免"新"匹配到"新疆"
+            sorted_cities = sorted(city_to_province.keys(), key=len, reverse=True)
+            self._location_index = (location_info, city_to_province, sorted_cities)
+        return self._location_index
+
+    def get_world_gazetteer(self):
+        """获取世界地名索引（国家和主要城市），首次调用后缓存"""
+        if self._world_gazetteer is None:
+            from world_gazetteer import WorldGazetteer
+            self._world_gazetteer = WorldGazetteer()
+        return self._world_gazetteer
+
+    def get_foreign_country_counts(self):
+        """按人数降序返回 [(ISO3代码, 中文国名, 人数)]"""
+        gazetteer = self.get_world_gazetteer()
+        counts = [(code, gazetteer.country_name(code), len(members))
+                  for code, members in self.foreign_country_members.items()]
+        return sorted(counts, key=lambda x: (-x[2], x[1]))
+
+    def get_admin_rules(self):
+        """获取马哥教育成员识别规则，首次调用后缓存"""
+        from admin_rules import AdminRules
+        
+        if self._admin_rules is None:
+            self._admin_rules = AdminRules.load(self.admin_rules_path) if self.admin_rules_path else AdminRules()
+        return self._admin_rules
+
+    def explain_admin(self, member):
+        """说明成员是否被判为马哥教育成员以及依据的规则（按当前群的规则）"""
+        return self.get_admin_rules().explain(normalize_member_name(member), self.group_name)
+
+    def detect_name_format(self, members, sample_size=300):
+        """确定本群的昵称格式：指定了 name_format 时直接使用，否则抽样自动识别；返回各模板的得分"""
+        from name_formats import detect_name_format, get_name_parser
+        
+        if self.name_format:
+            self.name_parser = get_name_parser(self.name_format)
+            return []
+        location_info, city_to_province, _ = self.get_location_index()
+        gazetteer = self.get_world_gazetteer()
+        
+        def is_location(text):
+            return resolve_location(text, location_info, city_to_province)[0] is not None or gazetteer.match(text, text)
         
+        self.name_parser, scores = detect_name_format(members, is_location, sample_size)
+        return scores
+
+    def classify_member(self, member, location=None):
+        """对单个（已规范化的）成员分类，返回 (类别, 键, 城市)：
+        ('admin', None, None)、('province', 省份, 城市或'省会')、('foreign', ISO3代码, None) 或 ('unknown', None, None)
+        location 为按昵称格式解析出的地区字段，不传时由 name_parser 解析（未识别昵称格式时扫描整个成员名）
+        """
+        location_info, city_to_province, sorted_cities = self.get_location_index()
+        
+        # 判断马哥教育成员（按规则文件中的包含/排除规则）
+        if self.get_admin_rules().is_admin(member, self.group_name):
+            return 'admin', None, None
+        
+        # 0. 按昵称格式取出地区字段直接查表，识别不了再退回下面的整名扫描
+        if location is None and self.name_parser is not None:
+            location = self.name_parser.location(member)
+        if location:
+            province, city = resolve_location(location, location_info, city_to_province)
+            if province is not None:
+                return 'province', province, city or '省会'
+        
+        # 1. 优先尝试匹配城市（因为城市信息更具体）
+        for city in sorted_cities:
+            if city in member:
+                return 'province', city_to_province[city], city
+        
+        # 2. 如果没有匹配到城市，尝试匹配省份
+        member_parts = member.split('-')
+        if len(member_parts) > 1:
+            location_part = member_parts[1].strip()
+            for province, info in location_info.items():
+                if location_part == province or location_part in info['aliases']:
+                    return 'province', province, '省会'
+        
+        # 3. 检查是否是国外国家或城市（有地区字段时只看地区字段）
+        foreign_match = self.get_world_gazetteer().match(member, location or None)
+        if foreign_match:
+            return 'foreign', foreign_match[0], None
+        
+        # 4. 如果仍然没有匹配到，归类到未知
+        return 'unknown', None, None
+
+    def get_fuzzy_matcher(self):
+        """获取未知地区成员的二次匹配器，首次调用后缓存"""
+        from fuzzy_matcher import LocationFuzzyMatcher
+        
+        if self._fuzzy_matcher is None:
+            self._fuzzy_matcher = LocationFuzzyMatcher(*self.get_location_index())
+        return self._fuzzy_matcher
+
+    def analyze_members(self, members, verbose=True, fuzzy=False):
+        """分析成员信息，fuzzy 为 True 时对未知地区成员进行拼音/繁体/错别字二次匹配"""
         # 初始化分类存储
         self.admin_members = []  # 马哥教育成员
         self.province_city_members = {}  # 按省份和城市分类的成员
         self.foreign_members = []  # 国外成员
+        self.foreign_country_members = {}  # 按国家（ISO3代码）分类的国外成员
         self.unknown_members = []  # 未知分类成员
+        self.fuzzy_matches = {}  # 二次匹配成功的成员
+        
+        # 更严格的空格和不可见字符处理
+        normalized = [normalize_member_name(member) for member in members]
+        
+        # 识别本群的昵称格式，用编译好的模板一次性取出所有成员的地区字段
+        scores = self.detect_name_format(normalized)
+        if self.name_parser is not None:
+            locations = self.name_parser.extract_locations(normalized)
+        else:
+            locations = [None] * len(normalized)
+        if verbose and scores:
+            if self.name_parser is not None:
+                print(f"识别到的昵称格式：{self.name_parser.description}（得分 {scores[0][2]:.2f}）")
+            else:
+                print("未识别到统一的昵称格式，按整个成员名匹配地区")
         
-        for member in members:
-            # 更严格的空格和不可见字符处理
-            member = ''.join(c for c in member if c.isprintable())  # 移除所有不可打印字符
-            member = ' '.join(part.strip() for part in member.split())  # 分割并重组，确保只有单个空格
-            
-            # 判断马哥教育成员
-            if ('马哥' in member or '班' in member or '豆' in member or 
-                '老师' in member or 'magedu' in member.lower() or '助手' in member):
+        for member, location in zip(normalized, locations):
+            category, key, city = self.classify_member(member, location)
+            if category == 'admin':
                 self.admin_members.append(member)
-                continue
-            
-            # 尝试匹配地理位置信息
-            location_found = False
-            member_parts = member.split('-')
-            
-            # 1. 优先尝试匹配城市（因为城市信息更具体）
-            matched_city = None
-            for city in sorted(city_to_province.keys(), key=len, reverse=True):  # 按城市名长度降序排序，避免"新"匹配到"新疆"
-                if city in member:
-                    matched_city = city
-                    province = city_to_province[city]
-                    
-                    # 初始化省份数据结构（如果不存在）
-                    if province not in self.province_city_members:
-                        self.province_city_members[province] = {'total': 0, 'cities': {}}
-                    
-                    # 初始化城市数据结构（如果不存在）
-                    if city not in self.province_city_members[province]['cities']:
-                        self.province_city_members[province]['cities'][city] = []
-                    
-                    # 添加成员到对应的城市
-                    self.province_city_members[province]['cities'][city].append(member)
-                    self.province_city_members[province]['total'] += 1
-                    location_found = True
-                    break
-            
-            # 2. 如果没有匹配到城市，尝试匹配省份
-            if not location_found and len(member_parts) > 1:
-                location_part = member_parts[1].strip()
-                for province, info in location_info.items():
-                    if location_part == province or location_part in info['aliases']:
-                        if province not in self.province_city_members:
-                            self.province_city_members[province] = {'total': 0, 'cities': {}}
-                        if '省会' not in self.province_city_members[province]['cities']:
-                            self.province_city_members[province]['cities']['省会'] = []
-                        self.province_city_members[province]['cities']['省会'].append(member)
-                        self.province_city_members[province]['total'] += 1
-                        location_found = True
-                        break
-            
-            # 3. 检查是否是国外城市
-            if not location_found:
-                for city in foreign_cities:
-                    if city in member:
-                        self.foreign_members.append(member)
-                        location_found = True
-                        break
-            
-            # 4. 如果仍然没有匹配到，归类到未知
-            if not location_found:
+            elif category == 'province':
+                # 初始化省份和城市数据结构（如果不存在）
+                if key not in self.province_city_members:
+                    self.province_city_members[key] = {'total': 0, 'cities': {}}
+                self.province_city_members[key]['cities'].setdefault(city, []).append(member)
+                self.province_city_members[key]['total'] += 1
+            elif category == 'foreign':
+                self.foreign_members.append(member)
+                self.foreign_country_members.setdefault(key, []).append(member)
+            else:
                 self.unknown_members.append(member)
         
+        # 对未知地区成员进行二次匹配
+        if fuzzy and self.unknown_members:
+            self.apply_fuzzy_matching()
+        
+        if verbose:
+            self.print_analysis(len(members))
+
+    def apply_fuzzy_matching(self):
+        """对未知地区成员进行二次匹配，匹配成功的成员移入对应省份和城市"""
+        fuzzy_matcher = self.get_fuzzy_matcher()
+        
+        still_unknown = []
+        for member in self.unknown_members:
+            match = fuzzy_matcher.match(member)
+            if match is None:
+                still_unknown.append(member)
+                continue
+            
+            province = match['province']
+            city = match['city'] or '省会'
+            if province not in self.province_city_members:
+                self.province_city_members[province] = {'total': 0, 'cities': {}}
+            self.province_city_members[province]['cities'].setdefault(city, []).append(member)
+            self.province_city_members[province]['total'] += 1
+            self.fuzzy_matches[member] = match
+        
+        self.unknown_members = still_unknown
+
+    def print_analysis(self, total_count):
+        """在控制台输出分析结果"""
         # 输出分析结果
         print(f"\n分析结果：")
-        print(f"总成员数：{len(members)}")
+        print(f"总成员数：{total_count}")
         print(f"马哥教育成员数：{len(self.admin_members)}")
         
         # 打印马哥教育成员详情
@@ -450,12 +574,21 @@ class WeChatGroupAnalyzer:
                         for member in city_members:
                             print(f"  * {member}")
         
-        # 打印国外成员详情
+        # 打印国外成员详情（按国家）
         if self.foreign_members:
             print("\n国外成员详情：")
             print(f"共计：{len(self.foreign_members)}人")
-            for member in self.foreign_members:
-                print(f"- {member}")
+            for code, country, count in self.get_foreign_country_counts():
+                print(f"- {country}（{count}人）")
+                for member in self.foreign_country_members[code]:
+                    print(f"  * {member}")
+        
+        # 打印二次匹配的成员
+        if self.fuzzy_matches:
+            print("\n二次匹配成员：")
+            for member, match in self.fuzzy_matches.items():
+                print(f"- {member} -> {match['city'] or match['province']}"
+                      f"（{match['source']}，置信度{match['confidence']:.2f}）")
         
         # 打印未知分类成员
         if self.unknown_members:
@@ -464,6 +597,64 @@ class WeChatGroupAnalyzer:
             for member in self.unknown_members:
                 print(f"- {member}")
     
+    def get_statistics(self):
+        """以字典形式返回分析统计结果，便于序列化为JSON"""
+        provinces = {}
+        for province, data in sorted(self.province_city_members.items(),
+                                     key=lambda x: (-x[1]['total'], x[0])):
+            provinces[province] = {
+                'total': data['total'],
+                'cities': {city: len(city_members) for city, city_members in
+                           sorted(data['cities'].items(), key=lambda x: (-len(x[1]), x[0]))}
+            }
+        
+        total_members = (len(self.admin_members) +
+                         sum(data['total'] for data in self.province_city_members.values()) +
+                         len(self.foreign_members) +
+                         len(self.unknown_members))
+        
+        return {
+            'total': total_members,
+            'admin_count': len(self.admin_members),
+            'foreign_count': len(self.foreign_members),
+            'unknown_count': len(self.unknown_members),
+            'provinces': provinces,
+            'foreign_countries': {code: {'name': country, 'total': count}
+                                  for code, country, count in self.get_foreign_country_counts()},
+            'admin_members': list(self.admin_members),
+            'foreign_members': list(self.foreign_members),
+            'unknown_members': list(self.unknown_members)
+        }
+
+    def get_member_locations(self):
+        """返回 {成员: (省份, 城市)}，只匹配到省份的成员城市为 None"""
+        locations = {}
+        for province, data in self.province_city_members.items():
+            for city, city_members in data['cities'].items():
+                for member in city_members:
+                    locations[member] = (province, None if city == '省会' else city)
+        return locations
+
+    def get_member_countries(self):
+        """返回 {成员: 国家名称}（国外成员）"""
+        gazetteer = self.get_world_gazetteer()
+        return {member: gazetteer.country_name(code)
+                for code, country_members in self.foreign_country_members.items() for member in country_members}
+
+    def _get_font(self, size):
+        """获取指定字号的字体，首次加载后缓存"""
+        if size not in self._fonts:
+            from PIL import ImageFont
+            self._fonts[size] = ImageFont.truetype("simhei.ttf", size)
+        return self._fonts[size]
+
+    def get_glyph_atlas(self):
+        """获取字形缓存（glyph_atlas.GlyphAtlas），首次使用时创建"""
+        if self._glyph_atlas is None:
+            from glyph_atlas import GlyphAtlas
+            self._glyph_atlas = GlyphAtlas()
+        return self._glyph_atlas
+
     def clean_text_for_image(self, text):
         """清理文本，移除emoji和其他特殊字符"""
         # 移除emoji和其他特殊字符
@@ -479,10 +670,12 @@ class WeChatGroupAnalyzer:
         return cleaned_text
 
     def create_text_image(self, text, width=1200, font_size=24):
-        """将文本转换为图片"""
+        """将文本转换为图片（字形栅格化一次后缓存，逐行用 NumPy 拼接，结果与 ImageDraw.text 相同）"""
+        from glyph_atlas import TextCanvas
+        
         # 设置字体
-        font = ImageFont.truetype("simhei.ttf", font_size)
-        font_small = ImageFont.truetype("simhei.ttf", font_size - 4)
+        font = self._get_font(font_size)
+        font_small = self._get_font(font_size - 4)
         
         # 计算行高和边距
         line_height = font_size * 1.5
@@ -506,10 +699,10 @@ class WeChatGroupAnalyzer:
             
             # 根据内容类型设置字体和颜色
             if content.startswith('==='):  # 主标题
-                current_font = ImageFont.truetype("simhei.ttf", font_size + 4)
+                current_font = self._get_font(font_size + 4)
                 color = '#FF6B6B'  # 主题色
             elif content.startswith('【'):  # 分类标题
-                current_font = ImageFont.truetype("simhei.ttf", font_size + 2)
+                current_font = self._get_font(font_size + 2)
                 color = '#4ECDC4'  # 次要主题色
             elif content.startswith('- '):  # 一级列表项
                 current_font = font
@@ -533,17 +726,16 @@ class WeChatGroupAnalyzer:
         # 计算所需图片高度
         height = int(len(wrapped_lines) * line_height + padding * 2)
         
-        # 创建图片
-        image = Image.new('RGB', (width, height), '#FFFFFF')  # 纯白背景
-        draw = ImageDraw.Draw(image)
+        # 创建画布
+        canvas = TextCanvas(width, height, '#FFFFFF', self.get_glyph_atlas())  # 纯白背景
         
         # 绘制文本
         y = padding
         for line, line_font, color in wrapped_lines:
-            draw.text((padding, y), line, font=line_font, fill=color)
+            canvas.text((padding, y), line, line_font, color)
             y += line_height
         
-        return image
+        return canvas.to_image()
 
     def generate_text_result(self):
         """生成文本统计结果"""
@@ -594,8 +786,17 @@ class WeChatGroupAnalyzer:
         # 添加国外成员信息
         if self.foreign_members:
             result.append(f"\n【国外成员】（{len(self.foreign_members)}人）")
-            for member in self.foreign_members:
-                result.append(f"- {member}")
+            for code, country, count in self.get_foreign_country_counts():
+                result.append(f"- {country}（{count}人）")
+                for member in self.foreign_country_members[code]:
+                    result.append(f"  * {member}")
+        
+        # 添加二次匹配的成员
+        if self.fuzzy_matches:
+            result.append(f"\n【二次匹配成员】（{len(self.fuzzy_matches)}人）")
+            for member, match in self.fuzzy_matches.items():
+                result.append(f"- {member} -> {match['city'] or match['province']}"
+                              f"（{match['source']}，置信度{match['confidence']:.2f}）")
         
         # 添加未知分类成员
         if self.unknown_members:
@@ -607,6 +808,8 @@ class WeChatGroupAnalyzer:
     
     def create_custom_marker(self):
         """创建自定义人形图标"""
+        import numpy as np
+        
         # 创建人形图标的顶点
         person = np.array([
             # 头部（圆形）
@@ -631,6 +834,8 @@ class WeChatGroupAnalyzer:
 
     def convert_echarts_to_geojson(self, echarts_data):
         """将ECharts地图数据转换为GeoJSON格式"""
+        from shapely.geometry import Polygon, MultiPolygon
+        
         features = []
         
         # 解析JSON数据
@@ -679,6 +884,8 @@ class WeChatGroupAnalyzer:
         if not os.path.exists(map_file):
             print("正在下载地图数据...")
             try:
+                import requests
+                
                 # 使用阿里云数据可视化的地图数据
                 url = "https://geo.datav.aliyun.com/areas_v3/bound/100000_full.json"
                 response = requests.get(url, timeout=30)
@@ -701,21 +908,112 @@ class WeChatGroupAnalyzer:
                 
         return True
 
-    def generate_statistics_charts(self):
-        """生成统计图表"""
+    def load_china_map(self):
+        """读取中国地图数据，首次读取后缓存"""
+        if self._china_map is None:
+            import geopandas as gpd
+            self._china_map = gpd.read_file('data/china/china.geojson')
+        return self._china_map
+
+    def load_world_map(self):
+        """读取 Natural Earth 世界地图数据（不含南极洲），首次读取后缓存"""
+        if self._world_map is None:
+            import geopandas as gpd
+            from world_gazetteer import NATURAL_EARTH_BASE
+            
+            world = gpd.read_file(NATURAL_EARTH_BASE + '.shp')
+            world['code'] = world['ISO_A3_EH'].where(world['ISO_A3_EH'] != '-99', world['ADM0_A3'])
+            self._world_map = world[world['code'] != 'ATA']
+        return self._world_map
+
+    def generate_world_map(self, output='group_world_map.png'):
+        """生成世界分布热力图：国外成员按国家着色，国内成员合计标注在中国"""
+        import matplotlib.pyplot as plt
+        from label_placement import place_annotations
+        
         # 设置中文字体
+        plt.rcParams['font.sans-serif'] = ['SimHei']
+        plt.rcParams['axes.unicode_minus'] = False
+        
+        world = self.load_world_map().copy()
+        gazetteer = self.get_world_gazetteer()
+        country_counts = {code: len(members) for code, members in self.foreign_country_members.items()}
+        world['value'] = world['code'].map(country_counts).fillna(0)
+        domestic_total = sum(data['total'] for data in self.province_city_members.values())
+        
+        fig, ax = plt.subplots(figsize=(20, 10), dpi=150)
+        
+        # 底图
+        world.plot(ax=ax, facecolor='#F5F5F5', edgecolor='#999999', linewidth=0.5)
+        
+        # 有国外成员的国家
+        vmax = max(country_counts.values()) if country_counts else 1
+        norm = plt.Normalize(vmin=0, vmax=vmax)
+        cmap = plt.cm.YlOrRd
+        members_world = world[world['value'] > 0]
+        if len(members_world):
+            members_world.plot(ax=ax, column='value', cmap=cmap, norm=norm,
+                               edgecolor='#666666', linewidth=0.5)
+        
+        # 中国单独着色
+        world[world['code'].isin(['CHN', 'TWN'])].plot(
+            ax=ax, facecolor='#3498DB', edgecolor='#666666', linewidth=0.5)
+        
+        # 颜色条（先于标签添加，标签避让需要最终的坐标轴尺寸）
+        sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+        cbar = plt.colorbar(sm, ax=ax, shrink=0.6)
+        cbar.set_label('国外成员人数', fontsize=12)
+        
+        # 国家标签使用 Natural Earth 提供的标注点，欧洲等国家密集的地区由避让算法错开
+        label_box = dict(boxstyle="round,pad=0.3", fc='white', ec='#333333', alpha=0.9, linewidth=1)
+        anchors = list(zip(members_world['LABEL_X'], members_world['LABEL_Y']))
+        labels = [f"{gazetteer.country_name(code)}\n{int(value)}人"
+                  for code, value in zip(members_world['code'], members_world['value'])]
+        placements = place_annotations(ax, anchors, labels, fontsize=9,
+                                       priorities=list(members_world['value']))
+        for anchor, label, (offset, leader) in zip(anchors, labels, placements):
+            ax.annotate(label, xy=anchor, xytext=offset, textcoords='offset points',
+                        ha='center', va='center', fontsize=9, bbox=label_box,
+                        arrowprops=dict(arrowstyle='-', color='#666666') if leader else None)
+        if domestic_total:
+            china = world[world['code'] == 'CHN']
+            if len(china):
+                row = china.iloc[0]
+                ax.annotate(f"中国\n{domestic_total}人", xy=(row['LABEL_X'], row['LABEL_Y']),
+                            ha='center', va='center', fontsize=10, color='white',
+                            bbox=dict(label_box, fc='#333333'))
+        
+        ax.set_title('群成员世界分布图', pad=20, fontsize=16)
+        ax.axis('off')
+        
+        fig.savefig(output, bbox_inches='tight', pad_inches=0.5)
+        plt.close(fig)
+
+    def warm_up(self):
+        """预先加载地名索引、地图数据和常用字体，供常驻服务使用"""
+        self.get_location_index()
+        self.get_world_gazetteer()
+        try:
+            self.load_china_map()
+            self.load_world_map()
+        except Exception as e:
+            print(f"预加载地图数据时出错：{str(e)}")
+        for size in (20, 24, 26, 28, 36):
+            try:
+                self._get_font(size)
+            except OSError as e:
+                print(f"预加载字体时出错：{str(e)}")
+                break
+
+    def _setup_chart_fonts(self):
+        """设置图表的中文字体"""
+        import matplotlib.pyplot as plt
+        
         plt.rcParams['font.sans-serif'] = ['SimHei']  # 设置中文字体
         plt.rcParams['axes.unicode_minus'] = False    # 解决负号显示问题
-        
-        # 创建一个更大的图表
-        plt.figure(figsize=(20, 30), dpi=300)  # 调整整体尺寸比例
-        
-        # 设置网格布局，调整子图之间的间距和相对大小
-        gs = GridSpec(2, 1, height_ratios=[1, 1.2], hspace=0.3)
-        
-        # 绘制条形图
-        ax1 = plt.subplot(gs[0])
-        
+
+    def _draw_bar_chart(self, ax):
+        """在坐标轴上绘制成员地区分布条形图"""
         # 准备数据
         categories = []
         counts = []
@@ -750,32 +1048,30 @@ class WeChatGroupAnalyzer:
         colors.append('#E74C3C')  # 红色
         
         # 创建水平条形图
-        bars = ax1.barh(categories, counts, color=colors)
+        bars = ax.barh(categories, counts, color=colors)
         
-        # 在条形图上添加数值标签
-        for bar in bars:
-            width = bar.get_width()
-            ax1.text(width, bar.get_y() + bar.get_height()/2,
-                    f'{int(width)}人',
-                    va='center', ha='left', fontsize=10)
+        # 在条形图上添加数值标签（一次性批量添加）
+        ax.bar_label(bars, labels=[f'{int(count)}人' for count in counts], fontsize=10)
         
         # 设置标题和标签
-        ax1.set_title('成员地区分布', pad=20, fontsize=16)
-        ax1.set_xlabel('人数', fontsize=12)
+        ax.set_title('成员地区分布', pad=20, fontsize=16)
+        ax.set_xlabel('人数', fontsize=12)
         
         # 调整条形图的样式
-        ax1.grid(True, axis='x', linestyle='--', alpha=0.7)
-        ax1.set_axisbelow(True)  # 将网格线置于数据下方
+        ax.grid(True, axis='x', linestyle='--', alpha=0.7)
+        ax.set_axisbelow(True)  # 将网格线置于数据下方
         
         # 设置y轴标签的字体大小
-        ax1.tick_params(axis='y', labelsize=10)
-        
-        # 创建地图热力图子图
-        ax2 = plt.subplot(gs[1])
+        ax.tick_params(axis='y', labelsize=10)
+
+    def _draw_province_map(self, ax, city_layer=True):
+        """在坐标轴上绘制省份分布热力图"""
+        import matplotlib.pyplot as plt
+        from label_placement import place_annotations
         
         try:
             # 读取地图数据
-            china = gpd.read_file('data/china/china.geojson')
+            china = self.load_china_map().copy()
             
             # 创建省份人数的字典
             province_counts = {province: data['total'] for province, data in self.province_city_members.items()}
@@ -807,7 +1103,7 @@ class WeChatGroupAnalyzer:
             # 绘制地图
             # 先绘制底图，所有省份使用浅灰色
             china.plot(
-                ax=ax2,
+                ax=ax,
                 facecolor='#F5F5F5',  # 浅灰色底色
                 edgecolor='#666666',  # 深灰色边界
                 linewidth=0.8  # 加粗边界线
@@ -815,7 +1111,7 @@ class WeChatGroupAnalyzer:
             
             # 再绘制有人数的省份
             china[china['value'] > 0].plot(
-                ax=ax2,
+                ax=ax,
                 column='value',
                 cmap=cmap,
                 norm=norm,
@@ -823,83 +1119,130 @@ class WeChatGroupAnalyzer:
                 linewidth=0.8  # 加粗边界线
             )
             
+            # 叠加城市分布：核密度等值面显示热点区域，圆点大小表示城市人数
+            if city_layer:
+                self.draw_city_density(ax, china.total_bounds)
+            
             # 添加颜色条
             sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-            cbar = plt.colorbar(sm, ax=ax2)
+            cbar = plt.colorbar(sm, ax=ax)
             cbar.set_label('人数', fontsize=12)
             
             # 设置地图标题
-            ax2.set_title('群成员地理分布热力图', pad=20, fontsize=16)
+            ax.set_title('群成员地理分布热力图', pad=20, fontsize=16)
             
             # 去除坐标轴
-            ax2.axis('off')
-            
-            # 特殊处理的省份（需要调整标签位置）
-            special_provinces = {
-                '北京市': {'xytext': (-20, 20)},
-                '天津市': {'xytext': (-20, -20)},
-                '上海市': {'xytext': (20, 0)},
-                '重庆市': {'xytext': (-20, 0)},
-                '香港特别行政区': {'xytext': (30, 0)},
-                '澳门特别行政区': {'xytext': (0, -20)},
-                '山东省': {'xytext': (20, 20)}
-            }
+            ax.axis('off')
             
-            # 添加省份标签
+            # 添加省份标签：只标注有成员的省份，标签位置由避让算法计算，人数多的省份优先占据好位置
+            labeled = []
             for idx, row in china.iterrows():
-                # 获取省份中心点坐标
-                centroid = row.geometry.centroid
-                province_name = row['name'].rstrip('市省自治区特别行政区')
+                province_name = province_mapping.get(row['name'], row['name'].rstrip('市省自治区特别行政区'))
                 value = province_counts.get(province_name, 0)
+                if value > 0:
+                    centroid = row.geometry.centroid
+                    labeled.append(((centroid.x, centroid.y), f"{province_name}\n{value}人", value))
+            
+            province_boxes = []
+            placements = place_annotations(
+                ax,
+                [anchor for anchor, _, _ in labeled],
+                [label for _, label, _ in labeled],
+                fontsize=10,
+                priorities=[value for _, _, value in labeled],
+                boxes=province_boxes
+            )
+            
+            for (anchor, label, value), (offset, leader) in zip(labeled, placements):
+                # 根据人数设置文本框的颜色
+                if value >= vmax * 0.7:  # 如果人数较多（超过最大值的70%）
+                    text_color = 'white'  # 使用白色文字
+                    box_color = '#333333'  # 使用深色背景
+                    box_alpha = 0.9  # 增加不透明度
+                else:
+                    text_color = 'black'
+                    box_color = 'white'
+                    box_alpha = 0.9
                 
-                if value > 0:  # 只标注有成员的省份
-                    label = f"{province_name}\n{value}人"
-                    
-                    # 获取特殊省份的标签位置偏移
-                    offset = special_provinces.get(row['name'], {'xytext': (3, 3)})['xytext']
-                    
-                    # 根据人数设置文本框的颜色
-                    if value >= vmax * 0.7:  # 如果人数较多（超过最大值的70%）
-                        text_color = 'white'  # 使用白色文字
-                        box_color = '#333333'  # 使用深色背景
-                        box_alpha = 0.9  # 增加不透明度
-                    else:
-                        text_color = 'black'
-                        box_color = 'white'
-                        box_alpha = 0.9
-                    
-                    ax2.annotate(
-                        label,
-                        xy=(centroid.x, centroid.y),
-                        xytext=offset,
-                        textcoords="offset points",
-                        ha='center',
-                        va='center',
-                        fontsize=10,
-                        color=text_color,
-                        bbox=dict(
-                            boxstyle="round,pad=0.3",
-                            fc=box_color,
-                            ec='#333333',  # 深色边框
-                            alpha=box_alpha,
-                            linewidth=1
-                        ),
-                        arrowprops=dict(
-                            arrowstyle="->",
-                            connectionstyle="arc3,rad=0.2",
-                            color='#666666'
-                        ) if offset != (3, 3) else None  # 只为偏移的标签添加指向线
-                    )
+                ax.annotate(
+                    label,
+                    xy=anchor,
+                    xytext=offset,
+                    textcoords="offset points",
+                    ha='center',
+                    va='center',
+                    fontsize=10,
+                    color=text_color,
+                    bbox=dict(
+                        boxstyle="round,pad=0.3",
+                        fc=box_color,
+                        ec='#333333',  # 深色边框
+                        alpha=box_alpha,
+                        linewidth=1
+                    ),
+                    arrowprops=dict(
+                        arrowstyle="->",
+                        connectionstyle="arc3,rad=0.2",
+                        color='#666666'
+                    ) if leader else None  # 只为离开锚点的标签添加指引线
+                )
+            
+            # 城市标签避开省份标签，放不下的城市只保留圆点
+            if city_layer:
+                self.draw_city_labels(ax, province_boxes)
             
         except Exception as e:
             print(f"绘制地图时出错：{str(e)}")
-            ax2.text(0.5, 0.5, '地图数据加载失败', ha='center', va='center')
+            ax.text(0.5, 0.5, '地图数据加载失败', ha='center', va='center')
+
+    def generate_statistics_charts(self, output='statistics_charts.png', city_layer=True):
+        """生成统计图表（条形图 + 地图），output 可以是文件路径或可写的文件对象；city_layer 为 True 时在省份地图上叠加城市分布密度"""
+        import matplotlib.pyplot as plt
+        from matplotlib.gridspec import GridSpec
+        
+        self._setup_chart_fonts()
+        
+        # 创建一个更大的图表
+        plt.figure(figsize=(20, 30), dpi=300)  # 调整整体尺寸比例
         
-        # 调整布局
+        # 先确定布局，标签避让需要用到最终的屏幕坐标
         plt.subplots_adjust(left=0.15, right=0.95, top=0.95, bottom=0.05, hspace=0.3)
         
+        # 设置网格布局，调整子图之间的间距和相对大小
+        gs = GridSpec(2, 1, height_ratios=[1, 1.2], hspace=0.3)
+        
+        # 绘制条形图
+        self._draw_bar_chart(plt.subplot(gs[0]))
+        
+        # 创建地图热力图子图
+        self._draw_province_map(plt.subplot(gs[1]), city_layer)
+        
         # 保存图表
-        plt.savefig('statistics_charts.png', dpi=300, bbox_inches='tight', pad_inches=0.5)
+        plt.savefig(output, dpi=300, bbox_inches='tight', pad_inches=0.5)
+        plt.close()
+
+    def generate_bar_chart(self, output, **savefig_kwargs):
+        """单独生成条形图（与 generate_statistics_charts 的上半部分相同），用于并行渲染"""
+        import matplotlib.pyplot as plt
+        
+        self._setup_chart_fonts()
+        fig = plt.figure(figsize=(20, 12.5), dpi=300)
+        fig.subplots_adjust(left=0.15, right=0.95, top=0.9, bottom=0.1)
+        self._draw_bar_chart(fig.add_subplot(1, 1, 1))
+        fig.savefig(output, dpi=300, bbox_inches='tight', pad_inches=0.5, **savefig_kwargs)
+        plt.close(fig)
+
+    def generate_map_chart(self, output, city_layer=True, **savefig_kwargs):
+        """单独生成省份地图（与 generate_statistics_charts 的下半部分相同），用于并行渲染"""
+        import matplotlib.pyplot as plt
+        
+        self._setup_chart_fonts()
+        fig = plt.figure(figsize=(20, 15), dpi=300)
+        # 先确定布局，标签避让需要用到最终的屏幕坐标
+        fig.subplots_adjust(left=0.15, right=0.95, top=0.9, bottom=0.1)
+        self._draw_province_map(fig.add_subplot(1, 1, 1), city_layer)
+        fig.savefig(output, dpi=300, bbox_inches='tight', pad_inches=0.5, **savefig_kwargs)
+        plt.close(fig)
 
     def get_province_coordinates(self):
         """获取省份在地图上的大致坐标位置"""
@@ -940,15 +1283,228 @@ class WeChatGroupAnalyzer:
             '澳门': (113.5, 22.2),
         }
 
+    def get_city_coordinates(self):
+        """获取地名表中各城市的大致经纬度"""
+        from city_coordinates import CITY_COORDINATES
+        return CITY_COORDINATES
+
+    def get_city_points(self):
+        """汇总各城市的成员人数，返回 (经度数组, 纬度数组, 人数数组)；只匹配到省份的成员计入省会"""
+        import numpy as np
+        
+        city_coordinates = self.get_city_coordinates()
+        province_coordinates = self.get_province_coordinates()
+        points = {}
+        for province, data in self.province_city_members.items():
+            for city, city_members in data['cities'].items():
+                coordinate = city_coordinates.get(city) if city != '省会' else province_coordinates.get(province)
+                if coordinate is None:
+                    coordinate = province_coordinates.get(province)
+                if coordinate is not None:
+                    points[coordinate] = points.get(coordinate, 0) + len(city_members)
+        
+        if not points:
+            return np.empty(0), np.empty(0), np.empty(0)
+        coordinates = np.array(list(points.keys()), dtype=float)
+        return coordinates[:, 0], coordinates[:, 1], np.array(list(points.values()), dtype=float)
+
+    def compute_city_density(self, bounds, resolution=0.1, bandwidth=0.6):
+        """在经纬度网格上计算按人数加权的高斯核密度，返回 (网格经度, 网格纬度, 密度矩阵)
+
+        高斯核可以按经度和纬度分解，密度矩阵等于两个 (城市数 x 网格边长) 核矩阵的乘积，
+        计算量与成员数无关，只取决于城市数和网格大小。
+        """
+        import numpy as np
+        
+        lons, lats, counts = self.get_city_points()
+        min_x, min_y, max_x, max_y = bounds
+        grid_x = np.arange(min_x, max_x + resolution, resolution)
+        grid_y = np.arange(min_y, max_y + resolution, resolution)
+        if not len(counts):
+            return grid_x, grid_y, np.zeros((len(grid_y), len(grid_x)))
+        
+        kernel_x = np.exp(-0.5 * ((grid_x[None, :] - lons[:, None]) / bandwidth) ** 2)   # (城市数, 经度格数)
+        kernel_y = np.exp(-0.5 * ((grid_y[None, :] - lats[:, None]) / bandwidth) ** 2)   # (城市数, 纬度格数)
+        density = (kernel_y * counts[:, None]).T @ kernel_x                                # (纬度格数, 经度格数)
+        return grid_x, grid_y, density / (2 * np.pi * bandwidth ** 2)
+
+    def draw_city_density(self, ax, bounds):
+        """在地图坐标轴上绘制城市分布密度等值面和城市人数圆点"""
+        import numpy as np
+        
+        lons, lats, counts = self.get_city_points()
+        if not len(counts):
+            return
+        
+        xlim, ylim = ax.get_xlim(), ax.get_ylim()
+        grid_x, grid_y, density = self.compute_city_density(bounds)
+        peak = density.max()
+        if peak > 0:
+            # 低于峰值5%的区域不着色，保留省份底色
+            levels = np.linspace(peak * 0.05, peak, 8)
+            ax.contourf(grid_x, grid_y, density, levels=levels, cmap='PuBu', alpha=0.45, zorder=2)
+        
+        sizes = 15 + 185 * np.sqrt(counts / counts.max())
+        ax.scatter(lons, lats, s=sizes, c='#2C3E50', alpha=0.7, edgecolors='white', linewidths=0.5,
+                   zorder=3, label='城市成员（圆点大小表示人数）')
+        ax.legend(loc='lower left', fontsize=10, frameon=False)
+        ax.set_xlim(xlim)
+        ax.set_ylim(ylim)
+
+    def draw_city_labels(self, ax, obstacles=None, fontsize=8):
+        """在地图上标注城市名称和人数，人数多的城市优先；与其他标签或 obstacles（屏幕坐标矩形）重叠的城市不标注，
+        返回标注的城市数"""
+        from label_placement import place_annotations
+        
+        city_coordinates = self.get_city_coordinates()
+        labeled = []
+        for data in self.province_city_members.values():
+            for city, city_members in data['cities'].items():
+                coordinate = city_coordinates.get(city) if city != '省会' else None
+                if coordinate is not None:
+                    labeled.append((coordinate, f"{city} {len(city_members)}人", len(city_members)))
+        
+        placements = place_annotations(
+            ax,
+            [anchor for anchor, _, _ in labeled],
+            [label for _, label, _ in labeled],
+            fontsize=fontsize,
+            priorities=[count for _, _, count in labeled],
+            pad=0.2,
+            hide_overlapping=True,
+            obstacles=obstacles
+        )
+        shown = 0
+        for (anchor, label, _), placement in zip(labeled, placements):
+            if placement is None:
+                continue
+            offset, leader = placement
+            ax.annotate(
+                label,
+                xy=anchor,
+                xytext=offset,
+                textcoords="offset points",
+                ha='center',
+                va='center',
+                fontsize=fontsize,
+                color='#2C3E50',
+                zorder=4,
+                bbox=dict(boxstyle="round,pad=0.2", fc='white', ec='none', alpha=0.75),
+                arrowprops=dict(arrowstyle="-", color='#999999', linewidth=0.6) if leader else None
+            )
+            shown += 1
+        return shown
+
+    def iter_city_counts(self, province=None):
+        """逐个产出 (人数, 省份, 城市名称)；只匹配到省份的成员显示为"某省（未知城市）"，province 指定时只统计该省"""
+        provinces = [province] if province is not None else list(self.province_city_members)
+        for name in provinces:
+            data = self.province_city_members.get(name)
+            if data is None:
+                continue
+            for city, city_members in data['cities'].items():
+                label = f"{name}（未知城市）" if city == '省会' else city
+                yield len(city_members), name, label
+
+    def top_cities(self, k=30, province=None):
+        """用堆选出人数最多的 k 个城市，其余城市合并，返回 ([(人数, 省份, 城市)], 其他城市人数, 其他城市个数)；
+        k 不大于0时全部城市计入其他"""
+        top = []
+        other_count = 0
+        other_cities = 0
+        for item in self.iter_city_counts(province):
+            # 小根堆只保留 k 个元素，被挤出的城市计入"其他"
+            if len(top) < k:
+                heapq.heappush(top, item)
+                continue
+            if top and item > top[0]:
+                item = heapq.heapreplace(top, item)
+            other_count += item[0]
+            other_cities += 1
+        return sorted(top, key=lambda x: (-x[0], x[2])), other_count, other_cities
+
+    def _draw_ranked_bars(self, ax, labels, counts, colors, fontsize=10):
+        """绘制按人数降序的水平条形图，数值标签一次性批量添加"""
+        # barh 自下而上绘制，反转后人数最多的在最上面
+        bars = ax.barh(range(len(labels)), counts[::-1], color=colors[::-1])
+        ax.set_yticks(range(len(labels)), labels[::-1], fontsize=fontsize)
+        ax.bar_label(bars, labels=[f'{int(c)}人' for c in counts[::-1]], padding=3, fontsize=fontsize)
+        ax.grid(True, axis='x', linestyle='--', alpha=0.7)
+        ax.set_axisbelow(True)
+        ax.margins(x=0.12)
+
+    def generate_city_chart(self, output='group_city_chart.png', top_k=30):
+        """生成城市人数排行条形图：只画人数最多的 top_k 个城市，其余合并为"其他"一项"""
+        import matplotlib.pyplot as plt
+        
+        self._setup_chart_fonts()
+        top, other_count, other_cities = self.top_cities(top_k)
+        if not top:
+            print("没有可绘制的城市数据")
+            return False
+        
+        labels = [f"{city}（{province}）" if city != province and not city.startswith(province) else city
+                  for _, province, city in top]
+        counts = [count for count, _, _ in top]
+        colors = ['#3498DB'] * len(top)
+        if other_count:
+            labels.append(f'其他（{other_cities}个城市）')
+            counts.append(other_count)
+            colors.append('#95A5A6')
+        
+        fig, ax = plt.subplots(figsize=(14, 2 + 0.35 * len(labels)), dpi=150)
+        self._draw_ranked_bars(ax, labels, counts, colors)
+        ax.set_title(f'城市分布（前{len(top)}名）', pad=20, fontsize=16)
+        ax.set_xlabel('人数', fontsize=12)
+        fig.savefig(output, bbox_inches='tight', pad_inches=0.5)
+        plt.close(fig)
+        return True
+
+    def generate_province_city_panels(self, output='group_city_panels.png', provinces=12, cities_per_province=5, columns=3):
+        """生成分省小多图：人数最多的若干省份各占一个子图，显示该省的前几个城市，其余合并为"其他"一项"""
+        import matplotlib.pyplot as plt
+        
+        self._setup_chart_fonts()
+        selected = heapq.nlargest(provinces, self.province_city_members.items(), key=lambda x: (x[1]['total'], x[0]))
+        if not selected:
+            print("没有可绘制的城市数据")
+            return False
+        
+        rows = (len(selected) + columns - 1) // columns
+        height = 1 + 0.45 * (cities_per_province + 1)
+        fig, axes = plt.subplots(rows, columns, figsize=(6 * columns, height * rows), dpi=150,
+                                 squeeze=False, sharex=True)
+        for ax, (province, data) in zip(axes.flat, selected):
+            top, other_count, other_cities = self.top_cities(cities_per_province, province)
+            labels = [city for _, _, city in top]
+            counts = [count for count, _, _ in top]
+            colors = ['#3498DB'] * len(top)
+            if other_count:
+                labels.append(f'其他{other_cities}城')
+                counts.append(other_count)
+                colors.append('#95A5A6')
+            self._draw_ranked_bars(ax, labels, counts, colors, fontsize=9)
+            ax.set_title(f"{province}（{data['total']}人）", fontsize=12)
+        for ax in list(axes.flat)[len(selected):]:
+            ax.axis('off')
+        
+        fig.suptitle('各省份城市分布', fontsize=16)
+        fig.tight_layout(rect=(0, 0, 1, 0.97))
+        fig.savefig(output, bbox_inches='tight', pad_inches=0.5)
+        plt.close(fig)
+        return True
+
     def merge_images(self, text_image, chart_image):
         """合并文本图片和统计图表"""
+        from PIL import Image, ImageDraw
+        
         # 创建标题图片
         title_height = 100
         title_image = Image.new('RGB', (text_image.width, title_height), '#FFFFFF')
         draw = ImageDraw.Draw(title_image)
         
         # 设置标题字体
-        title_font = ImageFont.truetype("simhei.ttf", 36)
+        title_font = self._get_font(36)
         
         # 绘制标题（居中）
         title_text = "马哥大模型1期成员构成分析报告"
@@ -973,8 +1529,77 @@ class WeChatGroupAnalyzer:
         
         return merged_image
 
-    def generate_report(self):
-        """生成完整的分析报告"""
+    def stack_images(self, images):
+        """将多张图片缩放到相同宽度后自上而下拼接"""
+        from PIL import Image
+        
+        width = min(image.width for image in images)
+        resized = []
+        for image in images:
+            if image.width != width:
+                image = image.resize((width, int(image.height * width / image.width)), Image.Resampling.LANCZOS)
+            resized.append(image)
+        
+        stacked = Image.new('RGB', (width, sum(image.height for image in resized)), '#FFFFFF')
+        y = 0
+        for image in resized:
+            stacked.paste(image, (0, y))
+            y += image.height
+        return stacked
+
+    def render_report_image(self, text_content, executor=None):
+        """在内存中渲染完整的报告图片（标题 + 统计图表 + 文本）
+
+        传入进程池 executor 时，条形图、地图和文本图片分别在子进程中同时渲染，全部完成后再合并；
+        串行渲染时在当前进程中逐个渲染同样的三部分，两种方式得到的图片相同。
+        """
+        return self.compose_report_image(self.render_report_pieces(text_content, executor))
+
+    def render_report_pieces(self, text_content, executor=None, pieces=('bar', 'map', 'text')):
+        """分别渲染报告的各部分，返回 {部分: PNG字节}；传入进程池时各部分在子进程中同时渲染"""
+        if executor is None:
+            return {piece: self.render_report_piece(piece, text_content) for piece in pieces}
+        state = self.get_state()
+        futures = {piece: executor.submit(_render_report_piece, state, piece, text_content) for piece in pieces}
+        return {piece: future.result() for piece, future in futures.items()}
+
+    def render_report_piece(self, piece, text_content=None):
+        """渲染报告的一部分（bar/map/text/world），返回PNG字节"""
+        buffer = io.BytesIO()
+        # 条形图、地图和文本图片马上会被解码合并，使用最低的压缩级别
+        if piece == 'bar':
+            self.generate_bar_chart(buffer, pil_kwargs={'compress_level': 1})
+        elif piece == 'map':
+            self.generate_map_chart(buffer, pil_kwargs={'compress_level': 1})
+        elif piece == 'text':
+            self.create_text_image(text_content).save(buffer, format='PNG', compress_level=1)
+        elif piece == 'world':
+            self.generate_world_map(buffer)
+        else:
+            raise ValueError(f"未知的报告部分：{piece}")
+        return buffer.getvalue()
+
+    def compose_report_image(self, pieces):
+        """把 render_report_pieces 渲染的条形图、地图和文本图片合并为完整的报告图片"""
+        from PIL import Image
+        
+        bar_image, map_image, text_image = [Image.open(io.BytesIO(pieces[piece])) for piece in ('bar', 'map', 'text')]
+        return self.merge_images(text_image, self.stack_images([bar_image, map_image]))
+
+    def save_report_image(self, final_image, image_format='png', target_mb=None):
+        """按指定格式编码并保存报告图片（group_analysis.png/.webp/.jpg），返回写出的文件列表；
+        target_mb 指定时自动选择不超过该大小的最高质量"""
+        from image_encoding import save_image
+        
+        start = time.perf_counter()
+        paths = save_image(final_image, 'group_analysis', image_format, target_mb)
+        size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+        print(f"报告图片编码完成：{image_format}，{size:.2f}MB，耗时 {time.perf_counter() - start:.2f}s")
+        return paths
+
+    def generate_report(self, text_only=False, parallel=True, image_format='png', target_mb=None):
+        """生成完整的分析报告，text_only 为 True 时只生成文本报告；parallel 为 True 时各图片在多个进程中同时渲染；
+        image_format、target_mb 为报告图片的编码格式和大小上限（MB）"""
         # 生成文本报告
         text_content = self.generate_text_result()
         
@@ -982,38 +1607,130 @@ class WeChatGroupAnalyzer:
         with open('group_analysis.txt', 'w', encoding='utf-8') as f:
             f.write(text_content)
         
-        # 生成统计图表
-        self.generate_statistics_charts()
-        
-        # 将文本转换为图片
-        text_image = self.create_text_image(text_content)
+        if text_only:
+            print("分析完成！生成的文件：")
+            print("1. group_analysis.txt - 文本格式统计结果")
+            return
         
-        # 读取统计图表
-        chart_image = Image.open('statistics_charts.png')
-        
-        # 合并图片
-        final_image = self.merge_images(text_image, chart_image)
-        
-        # 保存最终图片
-        final_image.save('group_analysis.png', quality=95, dpi=(300, 300))
-        
-        # 删除临时的统计图表文件
-        os.remove('statistics_charts.png')
+        executor = self._create_render_executor() if parallel else None
+        try:
+            # 世界分布图与报告图片互不依赖，一并提交
+            world_future = None
+            if executor is not None and self.foreign_members:
+                world_future = executor.submit(_render_report_piece, self.get_state(), 'world')
+            
+            # 生成报告图片
+            final_image = self.render_report_image(text_content, executor)
+            
+            # 保存最终图片
+            image_paths = self.save_report_image(final_image, image_format, target_mb)
+            
+            # 有国外成员时生成世界分布图
+            world_map_generated = False
+            if self.foreign_members:
+                try:
+                    if world_future is not None:
+                        with open('group_world_map.png', 'wb') as f:
+                            f.write(world_future.result())
+                    else:
+                        self.generate_world_map('group_world_map.png')
+                    world_map_generated = True
+                except Exception as e:
+                    print(f"绘制世界地图时出错：{str(e)}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
         
         print("分析完成！生成的文件：")
-        print("1. group_analysis.png - 完整的图片格式分析报告")
+        print(f"1. {'、'.join(image_paths)} - 完整的图片格式分析报告")
         print("2. group_analysis.txt - 文本格式统计结果")
+        if world_map_generated:
+            print("3. group_world_map.png - 世界分布图")
 
-    def run(self):
-        """运行分析器"""
-        # 获取要分析的群名称
-        group_name = input("请输入要分析的微信群名称：")
+    def _create_render_executor(self):
+        """创建并行渲染用的进程池，单核或无法创建进程池时返回 None（退回顺序渲染）"""
+        from concurrent.futures import ProcessPoolExecutor
+        
+        workers = min(4, os.cpu_count() or 1)
+        if workers < 2:
+            return None
+        try:
+            return ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker)
+        except (OSError, NotImplementedError) as e:
+            print(f"无法创建渲染进程池，改为顺序渲染：{str(e)}")
+            return None
+
+    def get_state(self):
+        """以字典形式返回分类结果，可序列化为JSON，也用于传给渲染子进程"""
+        return {
+            'group_name': self.group_name,
+            'admin_members': self.admin_members,
+            'province_city_members': self.province_city_members,
+            'foreign_members': self.foreign_members,
+            'foreign_country_members': self.foreign_country_members,
+            'unknown_members': self.unknown_members,
+            'fuzzy_matches': self.fuzzy_matches
+        }
+
+    def set_state(self, state):
+        """从 get_state() 返回的字典恢复分类结果"""
+        self.group_name = state.get('group_name', '')
+        self.admin_members = state['admin_members']
+        self.province_city_members = state['province_city_members']
+        self.foreign_members = state['foreign_members']
+        self.foreign_country_members = state.get('foreign_country_members')
+        if self.foreign_country_members is None:
+            # 旧版本保存的结果没有按国家分类，重新识别一次
+            self.foreign_country_members = {}
+            gazetteer = self.get_world_gazetteer()
+            for member in self.foreign_members:
+                foreign_match = gazetteer.match(member)
+                if foreign_match:
+                    self.foreign_country_members.setdefault(foreign_match[0], []).append(member)
+        self.unknown_members = state['unknown_members']
+        self.fuzzy_matches = state.get('fuzzy_matches', {})
+
+    def save_analysis(self, path):
+        """将分类结果保存为JSON，供 render 阶段直接使用"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_state(), f, ensure_ascii=False)
+
+    def load_analysis(self, path):
+        """从JSON读取之前保存的分类结果"""
+        with open(path, 'r', encoding='utf-8') as f:
+            self.set_state(json.load(f))
+
+    def record_history(self, path='group_history.db'):
+        """将本次分析结果追加到历史存储"""
+        from history_store import HistoryStore
         
-        # 分析群成员
-        self.analyze_members(self.get_group_members(group_name))
+        try:
+            with HistoryStore(path) as store:
+                store.record(self.get_statistics(), self.group_name)
+            print(f"分析结果已追加到历史记录 {path}")
+        except Exception as e:
+            print(f"写入历史记录时出错：{str(e)}")
+
+    def run(self):
+        """运行分析器：按阶段获取成员、分类、汇总并生成报告，每个阶段的结果都保存为检查点，
+        出错后可用 pipeline --from-stage 从失败的阶段继续"""
+        from report_pipeline import ReportPipeline
         
-        # 生成报告
-        self.generate_report()
+        ReportPipeline(self).run()
+
+
+def _init_render_worker():
+    """渲染子进程初始化：使用非交互式绘图后端"""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render_report_piece(state, piece, text_content=None):
+    """在子进程中渲染报告的一部分（bar/map/text/world），返回PNG字节"""
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.set_state(state)
+    return analyzer.render_report_piece(piece, text_content)
+
 
 class ModernUIGenerator:
     def __init__(self, width=1200, height=2000):
@@ -1024,9 +1741,12 @@ class ModernUIGenerator:
         self.secondary_color = '#4ECDC4'
         self.text_color = '#2C3E50'
         self.font_path = "simhei.ttf"
+        self._glyph_atlas = None  # 缓存的字形（时间轴渲染用）
         
     def create_gradient_background(self):
         """创建渐变背景"""
+        from PIL import Image, ImageDraw
+        
         image = Image.new('RGB', (self.width, self.height), self.background_color)
         draw = ImageDraw.Draw(image)
         
@@ -1058,6 +1778,8 @@ class ModernUIGenerator:
         
     def create_card(self, x, y, width, height, title, value, icon=None):
         """创建数据卡片"""
+        from PIL import Image, ImageDraw, ImageFont
+        
         card = Image.new('RGB', (width, height), 'white')
         draw = ImageDraw.Draw(card)
         
@@ -1080,6 +1802,9 @@ class ModernUIGenerator:
         
     def create_time_chart(self, data, width, height):
         """创建24小时活跃度图表"""
+        import matplotlib.pyplot as plt
+        import matplotlib.colors as mcolors
+        
         fig, ax = plt.subplots(figsize=(width/100, height/100), dpi=100)
         
         # 使用渐变色填充
@@ -1101,6 +1826,8 @@ class ModernUIGenerator:
 
     def create_word_cloud(self, text_data, width, height):
         """创建词云图"""
+        from wordcloud import WordCloud
+        
         wordcloud = WordCloud(
             width=width,
             height=height,
@@ -1114,6 +1841,9 @@ class ModernUIGenerator:
 
     def create_timeline(self, events, width, height):
         """创建时间轴"""
+        from PIL import Image, ImageDraw, ImageFont
+        from glyph_atlas import GlyphAtlas, TextCanvas
+        
         timeline = Image.new('RGB', (width, height), self.background_color)
         draw = ImageDraw.Draw(timeline)
         
@@ -1121,6 +1851,7 @@ class ModernUIGenerator:
         font = ImageFont.truetype(self.font_path, 16)
         time_font = ImageFont.truetype(self.font_path, 14)
         
+        # 先画时间点和连接线，文本（在它们右侧，互不重叠）随后用字形缓存统一绘制
         y = 30
         for event in events:
             # 绘制时间点
@@ -1130,20 +1861,518 @@ class ModernUIGenerator:
             if y < height - 50:
                 draw.line([25, y+5, 25, y+45], fill=self.primary_color)
             
+            y += 50
+        
+        if self._glyph_atlas is None:
+            self._glyph_atlas = GlyphAtlas()
+        canvas = TextCanvas.from_image(timeline, self._glyph_atlas)
+        y = 30
+        for event in events:
             # 绘制事件文本
-            draw.text((40, y-10), event['time'], font=time_font, fill=self.text_color)
-            draw.text((40, y+10), event['content'], font=font, fill=self.text_color)
+            canvas.text((40, y-10), event['time'], time_font, self.text_color)
+            canvas.text((40, y+10), event['content'], font, self.text_color)
             
             y += 50
             
-        return timeline
+        return canvas.to_image()
+
+def read_members_file(path):
+    """读取成员文件（UTF-8编码，每行一个成员），去掉空行并去重"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+
+def iter_members_file(path):
+    """逐行读取成员文件，不一次性载入内存（去重由调用方负责）"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
 
-def main():
-    # 初始化分析器
+
+def write_members_file(members, path):
+    """将成员列表写入文件，每行一个成员"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(members) + '\n')
+
+
+def cmd_acquire(args):
+    """acquire：从微信获取群成员并保存到成员文件"""
     analyzer = WeChatGroupAnalyzer()
+    analyzer.name_format = args.name_format
+    group_name = args.group or input("请输入要分析的微信群名称：")
+    members = analyzer.get_group_members(group_name)
+    write_members_file(members, args.output)
+    print(f"群成员已保存到 {args.output}")
+
+
+def cmd_analyze(args):
+    """analyze：对成员文件进行分类，保存分类结果"""
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.group_name = args.group or ''
+    analyzer.admin_rules_path = args.admin_rules
+    analyzer.name_format = args.name_format
+    analyzer.analyze_members(read_members_file(args.members), verbose=not args.quiet, fuzzy=args.fuzzy)
+    analyzer.save_analysis(args.output)
+    if not args.no_history:
+        analyzer.record_history(args.history)
+    print(f"分类结果已保存到 {args.output}")
+
+
+def cmd_render(args):
+    """render：读取分类结果，生成文本和图片报告"""
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.load_analysis(args.input)
+    analyzer.generate_report(text_only=args.text_only, parallel=not args.serial,
+                             image_format=args.image_format, target_mb=args.target_mb)
+
+
+def cmd_report(args):
+    """report：完整流程，成员来自成员文件或直接从微信获取"""
+    if args.members:
+        analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+        members = read_members_file(args.members)
+    else:
+        analyzer = WeChatGroupAnalyzer()
+        analyzer.name_format = args.name_format
+        members = analyzer.get_group_members(args.group or input("请输入要分析的微信群名称："))
+    analyzer.group_name = args.group or ''
+    analyzer.admin_rules_path = args.admin_rules
+    analyzer.name_format = args.name_format
+    analyzer.analyze_members(members, verbose=not args.quiet, fuzzy=args.fuzzy)
+    if not args.no_history:
+        analyzer.record_history(args.history)
+    analyzer.generate_report(text_only=args.text_only, parallel=not args.serial,
+                             image_format=args.image_format, target_mb=args.target_mb)
+
+
+def cmd_pipeline(args):
+    """pipeline：分阶段运行完整流程，可从任意阶段继续（读取上游阶段的检查点）"""
+    from report_pipeline import ReportPipeline
+    
+    # 只有需要从微信获取成员时才连接微信
+    analyzer = WeChatGroupAnalyzer(connect_wechat=args.from_stage == 'acquire' and not args.members)
+    analyzer.admin_rules_path = args.admin_rules
+    analyzer.name_format = args.name_format
+    pipeline = ReportPipeline(analyzer, args.checkpoint_dir, args.members, args.fuzzy, parallel=not args.serial,
+                              text_only=args.text_only, history=None if args.no_history else args.history,
+                              verbose=not args.quiet, image_format=args.image_format, target_mb=args.target_mb)
+    try:
+        pipeline.run(args.from_stage, args.to_stage, args.group)
+    except (FileNotFoundError, ValueError) as e:
+        print(str(e))
+
+
+def cmd_trend(args):
+    """trend：从历史记录汇总省份占比并生成趋势图"""
+    from history_store import HistoryStore
+    
+    with HistoryStore(args.history) as store:
+        shares = store.province_share(args.group, args.days)
+        if not shares:
+            print("所选时间范围内没有历史记录")
+            return
+        
+        group_label = args.group if args.group is not None else '全部群'
+        print(f"\n{group_label} 近{args.days}天省份占比：")
+        for province, share, count in shares:
+            print(f"- {province}：{share * 100:.1f}%（{count}人次）")
+        
+        if store.plot_trend(args.output, args.group, args.days, args.top):
+            print(f"\n趋势图已保存到 {args.output}")
+
+
+def cmd_stream(args):
+    """stream：流式分类一个或多个成员文件，成员名单溢写到磁盘，只生成文本报告"""
+    from streaming_report import StreamingClassifier
+    
+    start = time.perf_counter()
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.group_name = args.group or ''
+    analyzer.admin_rules_path = args.admin_rules
+    analyzer.name_format = args.name_format
+    # 流式分类不保留完整名单，用第一个成员文件开头的成员识别昵称格式
+    sample = [normalize_member_name(member) for member in itertools.islice(iter_members_file(args.members[0]), 2000)]
+    analyzer.detect_name_format(sample)
+    if analyzer.name_parser is not None:
+        print(f"识别到的昵称格式：{analyzer.name_parser.description}")
+    exporter = None
+    if args.export:
+        from member_export import MemberExportWriter
+        
+        try:
+            exporter = MemberExportWriter(args.export, args.export_format, args.batch_size)
+        except ImportError:
+            print("导出 Parquet/Arrow 格式需要安装 pyarrow：pip install pyarrow")
+            return
+        except ValueError as e:
+            print(str(e))
+            return
+    with StreamingClassifier(analyzer, args.spill_dir, args.buffer_size, args.fuzzy,
+                             exporter=exporter, group=args.group or '') as classifier:
+        for path in args.members:
+            classifier.add_all(iter_members_file(path))
+        classifier.write_report(args.output)
+        if exporter is not None:
+            exporter.close()
+            print(f"成员明细已导出到 {args.export}（{exporter.rows}行）")
+        classifier.print_summary()
+        if not args.no_history:
+            from history_store import HistoryStore
+            
+            with HistoryStore(args.history) as store:
+                store.record(classifier.get_statistics(), args.group or '')
+            print(f"分析结果已追加到历史记录 {args.history}")
+    print(f"\n文本报告已保存到 {args.output}（耗时 {time.perf_counter() - start:.2f}s）")
+
+
+def cmd_export(args):
+    """export：把分类结果中的每个成员导出为 Parquet/Arrow/JSONL，供数据分析使用"""
+    from member_export import export_analysis
+    
+    start = time.perf_counter()
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.load_analysis(args.input)
+    if args.group:
+        analyzer.group_name = args.group
+    try:
+        rows = export_analysis(analyzer, args.output, args.format, args.batch_size)
+    except ImportError:
+        print("导出 Parquet/Arrow 格式需要安装 pyarrow：pip install pyarrow")
+        return
+    except ValueError as e:
+        print(str(e))
+        return
+    print(f"已导出 {rows} 名成员到 {args.output}（耗时 {time.perf_counter() - start:.2f}s）")
+
+
+def cmd_sketch(args):
+    """sketch：用概率草图统计多个群的不同成员数、城市和关键词频率，草图可以保存后再合并"""
+    from sketches import SketchStatistics
+    
+    start = time.perf_counter()
+    statistics = SketchStatistics(args.precision, args.width, args.depth)
+    try:
+        for path in args.merge or []:
+            statistics.merge(SketchStatistics.load(path))
+    except (OSError, ValueError) as e:
+        print(f"合并草图时出错：{str(e)}")
+        return
+    
+    if args.members:
+        analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+        analyzer.admin_rules_path = args.admin_rules
+        analyzer.name_format = args.name_format
+        for path in args.members:
+            group_name = os.path.splitext(os.path.basename(path))[0]
+            statistics.add_members(analyzer, iter_members_file(path), group_name)
+    for path in args.messages or []:
+        for line in iter_members_file(path):
+            statistics.add_text(line)
+    
+    statistics.print_summary(args.top)
+    if args.save:
+        statistics.save(args.save)
+        print(f"\n草图已保存到 {args.save}")
+    print(f"\n耗时 {time.perf_counter() - start:.2f}s")
+
+
+def cmd_activity(args):
+    """activity：流式统计聊天记录中每个成员的发言数，按省份计算人均发言数"""
+    from chat_activity import ActivityCounter, MemberIndex, write_activity_csv
+    
+    start = time.perf_counter()
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    if args.members:
+        analyzer.admin_rules_path = args.admin_rules
+        analyzer.name_format = args.name_format
+        analyzer.analyze_members(read_members_file(args.members), verbose=False)
+    else:
+        analyzer.load_analysis(args.input)
+    counter = ActivityCounter(MemberIndex(analyzer))
+    try:
+        for path in args.logs:
+            count = counter.add_file(path, args.sender_column)
+            print(f"{path}：{count} 条消息")
+    except (OSError, ValueError) as e:
+        print(f"读取聊天记录时出错：{str(e)}")
+        return
+    elapsed = time.perf_counter() - start
+    
+    matched = counter.messages - counter.unmatched_messages
+    print(f"\n共 {counter.messages} 条消息，对应到成员的 {matched} 条（耗时 {elapsed:.2f}s）")
+    print("\n各地区人均发言数：")
+    for bucket, members, active, messages, per_capita in counter.bucket_activity():
+        print(f"- {bucket}：{members}人，{active}人发言，{messages}条，人均{per_capita:.2f}条")
+    print(f"\n发言最多的 {args.top} 名成员：")
+    for rank, (member, bucket, city, messages) in enumerate(counter.top_speakers(args.top), 1):
+        print(f"{rank}. {member}（{city or bucket}）：{messages}条")
+    if counter.unmatched_messages:
+        print(f"\n未能对应到成员的发送者（{counter.unmatched_messages}条消息，估计次数）：")
+        for sender, messages in counter.unmatched.top(args.top):
+            print(f"- {sender}：{messages}条")
+    
+    write_activity_csv(counter, args.output)
+    print(f"\n统计结果已保存到 {args.output}")
+
+
+def cmd_cities(args):
+    """cities：根据分类结果生成城市排行图和分省小多图"""
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.load_analysis(args.input)
+    
+    top, other_count, other_cities = analyzer.top_cities(args.top)
+    print(f"人数最多的 {len(top)} 个城市：")
+    for count, province, city in top:
+        print(f"- {city}（{province}）：{count}人")
+    if other_count:
+        print(f"- 其他 {other_cities} 个城市：{other_count}人")
+    
+    if analyzer.generate_city_chart(args.output, args.top):
+        print(f"\n城市排行图已保存到 {args.output}")
+    if args.panels and analyzer.generate_province_city_panels(args.panels_output, args.panels, args.cities_per_province):
+        print(f"分省小多图已保存到 {args.panels_output}")
+
+
+def cmd_overlap(args):
+    """overlap：按学号识别成员，计算多个群之间的重叠矩阵"""
+    from member_overlap import MemberOverlapIndex, write_overlap_csv
+    
+    index = MemberOverlapIndex()
+    for path in args.members:
+        group_name = os.path.splitext(os.path.basename(path))[0]
+        index.add_group(group_name, read_members_file(path))
+    
+    matrix = index.overlap_matrix()
+    write_overlap_csv(index, matrix, args.output)
+    print(f"共 {len(index.groups)} 个群、{len(index.identities)} 名成员，重叠矩阵已保存到 {args.output}")
+    
+    repeated = index.members_in_groups(args.min_groups)
+    print(f"\n同时在 {args.min_groups} 个及以上群中的成员（{len(repeated)}人）：")
+    for identity, name, groups in repeated[:args.limit]:
+        print(f"- {name}（{len(groups)}个群）：{'、'.join(groups)}")
+    if len(repeated) > args.limit:
+        print(f"... 其余 {len(repeated) - args.limit} 人未列出")
+
+
+def cmd_reconcile(args):
+    """reconcile：将群成员与花名册比对"""
+    from roster_reconcile import load_roster, reconcile, write_reconciliation_csv
+    
+    start = time.perf_counter()
+    roster = load_roster(args.roster, args.id_column, args.city_column)
+    members = read_members_file(args.members)
+    
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.admin_rules_path = args.admin_rules
+    analyzer.name_format = args.name_format
+    analyzer.analyze_members(members, verbose=False, fuzzy=args.fuzzy)
+    location_info, city_to_province, _ = analyzer.get_location_index()
+    result = reconcile(roster, members, analyzer.get_member_locations(),
+                       location_info, city_to_province, set(analyzer.admin_members),
+                       analyzer.get_member_countries())
+    write_reconciliation_csv(result, args.output)
+    elapsed = time.perf_counter() - start
+    
+    print(f"花名册 {len(roster)} 人，群成员 {len(members)} 人（耗时 {elapsed:.2f}s）")
+    print(f"- 未入群：{len(result['missing'])}人")
+    print(f"- 不在花名册：{len(result['extra'])}人")
+    print(f"- 城市不一致：{len(result['mismatched'])}人")
+    print(f"- 无法从昵称推断地点：{len(result['unresolved'])}人")
+    print(f"比对结果已保存到 {args.output}")
+
+
+def cmd_admin(args):
+    """admin：按识别规则逐个说明成员是否为马哥教育成员"""
+    analyzer = WeChatGroupAnalyzer(connect_wechat=False)
+    analyzer.group_name = args.group or ''
+    analyzer.admin_rules_path = args.admin_rules
+    try:
+        analyzer.get_admin_rules()
+    except (OSError, ValueError) as e:
+        print(f"读取识别规则时出错：{str(e)}")
+        return
+    
+    admin_count = excluded_count = 0
+    for member in read_members_file(args.members):
+        explanation = analyzer.explain_admin(member)
+        if explanation['rule'] is None:
+            continue
+        hits = '、'.join(explanation['hits'])
+        if explanation['admin']:
+            admin_count += 1
+            print(f"- {member}：马哥教育成员（规则：{explanation['rule']}，命中：{hits}）")
+        elif explanation['overridden'] or args.all:
+            # 默认只列出排除规则推翻了包含规则的成员，--all 时列出所有命中规则的成员
+            excluded_count += explanation['overridden']
+            print(f"- {member}：学员（规则：{explanation['rule']}，命中：{hits}）")
+    print(f"\n马哥教育成员 {admin_count} 人，被排除规则判为学员 {excluded_count} 人")
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    from name_formats import NAME_TEMPLATES
+    from image_encoding import IMAGE_FORMATS
+    from report_pipeline import CHECKPOINT_DIR, STAGE_NAMES
+    
+    parser = argparse.ArgumentParser(description='微信群成员分析工具')
+    subparsers = parser.add_subparsers(dest='command')
+
+    acquire = subparsers.add_parser('acquire', help='从微信获取群成员并保存到文件')
+    acquire.add_argument('--group', help='微信群名称（不指定则交互输入）')
+    acquire.add_argument('-o', '--output', default='group_members.txt', help='成员文件路径')
+    acquire.set_defaults(func=cmd_acquire)
+
+    analyze = subparsers.add_parser('analyze', help='对成员文件进行分类')
+    analyze.add_argument('members', help='成员文件（每行一个成员）')
+    analyze.add_argument('--group', help='群名称（仅用于记录）')
+    analyze.add_argument('-o', '--output', default='group_analysis.json', help='分类结果文件路径')
+    analyze.add_argument('-q', '--quiet', action='store_true', help='不在控制台输出成员明细')
+    analyze.set_defaults(func=cmd_analyze)
+
+    render = subparsers.add_parser('render', help='根据分类结果生成报告')
+    render.add_argument('-i', '--input', default='group_analysis.json', help='分类结果文件路径')
+    render.add_argument('--text-only', action='store_true', help='只生成 group_analysis.txt')
+    render.set_defaults(func=cmd_render)
+
+    report = subparsers.add_parser('report', help='完整流程：获取/读取成员、分类并生成报告')
+    report.add_argument('--members', help='成员文件（不指定则从微信获取）')
+    report.add_argument('--group', help='微信群名称')
+    report.add_argument('--text-only', action='store_true', help='只生成 group_analysis.txt，不加载绘图依赖')
+    report.add_argument('-q', '--quiet', action='store_true', help='不在控制台输出成员明细')
+    report.set_defaults(func=cmd_report)
+
+    for stage in (analyze, report):
+        stage.add_argument('--history', default='group_history.db', help='历史记录数据库路径')
+        stage.add_argument('--no-history', action='store_true', help='不追加到历史记录')
+
+    for stage in (render, report):
+        stage.add_argument('--serial', action='store_true', help='按顺序渲染图片，不使用多进程')
+
+    pipeline = subparsers.add_parser('pipeline', help='分阶段运行完整流程，每个阶段保存检查点，可从任意阶段继续')
+    pipeline.add_argument('--members', help='成员文件（不指定则从微信获取）')
+    pipeline.add_argument('--group', help='微信群名称')
+    pipeline.add_argument('--from-stage', choices=STAGE_NAMES, default='acquire', help='从哪个阶段开始（读取之前阶段的检查点）')
+    pipeline.add_argument('--to-stage', choices=STAGE_NAMES, default='compose', help='运行到哪个阶段为止')
+    pipeline.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR, help='检查点目录')
+    pipeline.add_argument('--text-only', action='store_true', help='只生成 group_analysis.txt')
+    pipeline.add_argument('--serial', action='store_true', help='按顺序渲染图片，不使用多进程')
+    pipeline.add_argument('--fuzzy', action='store_true', help='对未知地区成员进行拼音/繁体/错别字二次匹配')
+    pipeline.add_argument('--history', default='group_history.db', help='历史记录数据库路径')
+    pipeline.add_argument('--no-history', action='store_true', help='不追加到历史记录')
+    pipeline.add_argument('-q', '--quiet', action='store_true', help='不在控制台输出成员明细和各阶段耗时')
+    pipeline.set_defaults(func=cmd_pipeline)
+
+    for stage in (render, report, pipeline):
+        stage.add_argument('--image-format', choices=list(IMAGE_FORMATS), default='png',
+                           help='报告图片格式：png（无损）、png8（调色板）、webp、jpeg（渐进式）')
+        stage.add_argument('--target-mb', type=float, help='报告图片的大小上限（MB），自动选择满足上限的最高质量')
+
+    trend = subparsers.add_parser('trend', help='根据历史记录查看省份占比变化')
+    trend.add_argument('--group', help='群名称（不指定则汇总所有群）')
+    trend.add_argument('--days', type=int, default=90, help='统计最近多少天')
+    trend.add_argument('--top', type=int, default=8, help='趋势图中显示的省份数')
+    trend.add_argument('--history', default='group_history.db', help='历史记录数据库路径')
+    trend.add_argument('-o', '--output', default='group_trend.png', help='趋势图输出路径')
+    trend.set_defaults(func=cmd_trend)
+
+    stream = subparsers.add_parser('stream', help='流式分类大量成员（可合并多个成员文件），只生成文本报告')
+    stream.add_argument('members', nargs='+', help='成员文件（每行一个成员）')
+    stream.add_argument('--group', help='群名称（写入历史记录）')
+    stream.add_argument('-o', '--output', default='group_analysis.txt', help='文本报告输出路径')
+    stream.add_argument('--spill-dir', help='成员名单溢写目录（默认使用临时目录，结束后删除）')
+    stream.add_argument('--buffer-size', type=int, default=20000, help='内存中最多缓冲的成员行数')
+    stream.add_argument('--history', default='group_history.db', help='历史记录数据库路径')
+    stream.add_argument('--no-history', action='store_true', help='不追加到历史记录')
+    stream.add_argument('--fuzzy', action='store_true', help='对未知地区成员进行拼音/繁体/错别字二次匹配')
+    stream.add_argument('--export', help='同时导出成员明细（.parquet/.arrow/.jsonl）')
+    stream.add_argument('--export-format', choices=['parquet', 'arrow', 'jsonl'], help='导出格式（默认按扩展名推断）')
+    stream.set_defaults(func=cmd_stream)
+
+    export = subparsers.add_parser('export', help='将分类结果中的成员明细导出为 Parquet/Arrow/JSONL')
+    export.add_argument('-i', '--input', default='group_analysis.json', help='分类结果文件路径')
+    export.add_argument('--group', help='写入 group 列的群名称（默认使用分类结果中的群名称）')
+    export.add_argument('-o', '--output', default='group_members.parquet', help='导出文件路径')
+    export.add_argument('--format', choices=['parquet', 'arrow', 'jsonl'], help='导出格式（默认按扩展名推断）')
+    export.set_defaults(func=cmd_export)
+
+    for stage in (stream, export):
+        stage.add_argument('--batch-size', type=int, default=50000, help='导出时每批写出的行数')
+
+    sketch = subparsers.add_parser('sketch', help='用 HyperLogLog/Count-Min 草图统计多个群（内存与成员数无关，可合并）')
+    sketch.add_argument('members', nargs='*', help='各群的成员文件（文件名作为群名称）')
+    sketch.add_argument('--messages', nargs='+', help='聊天内容文件（每行一条），统计关键词频率')
+    sketch.add_argument('--merge', nargs='+', help='合并之前保存的草图文件')
+    sketch.add_argument('--save', help='把合并后的草图保存到文件')
+    sketch.add_argument('--precision', type=int, default=12, help='HyperLogLog 精度（寄存器数为2的该次方）')
+    sketch.add_argument('--width', type=int, default=2048, help='Count-Min 草图每行的计数器数')
+    sketch.add_argument('--depth', type=int, default=4, help='Count-Min 草图的行数')
+    sketch.add_argument('--top', type=int, default=10, help='列出出现最多的城市和关键词数')
+    sketch.set_defaults(func=cmd_sketch)
+
+    activity = subparsers.add_parser('activity', help='统计聊天记录中各成员和各省份的发言活跃度')
+    activity.add_argument('logs', nargs='+', help='导出的聊天记录（TXT 或 CSV）')
+    activity.add_argument('-i', '--input', default='group_analysis.json', help='分类结果文件路径')
+    activity.add_argument('--members', help='成员文件（指定时直接分类，不读取分类结果）')
+    activity.add_argument('--sender-column', help='CSV聊天记录中的发送者列名（默认自动查找）')
+    activity.add_argument('--top', type=int, default=20, help='列出发言最多的成员数')
+    activity.add_argument('-o', '--output', default='group_activity.csv', help='统计结果CSV输出路径')
+    activity.set_defaults(func=cmd_activity)
+
+    cities = subparsers.add_parser('cities', help='根据分类结果生成城市排行图和分省小多图')
+    cities.add_argument('-i', '--input', default='group_analysis.json', help='分类结果文件路径')
+    cities.add_argument('--top', type=int, default=30, help='城市排行图显示的城市数，其余合并为"其他"')
+    cities.add_argument('--panels', type=int, default=12, help='分省小多图的省份数（0 表示不生成）')
+    cities.add_argument('--cities-per-province', type=int, default=5, help='每个省份子图显示的城市数')
+    cities.add_argument('-o', '--output', default='group_city_chart.png', help='城市排行图输出路径')
+    cities.add_argument('--panels-output', default='group_city_panels.png', help='分省小多图输出路径')
+    cities.set_defaults(func=cmd_cities)
+
+    overlap = subparsers.add_parser('overlap', help='计算多个群之间的成员重叠矩阵')
+    overlap.add_argument('members', nargs='+', help='各群的成员文件（文件名作为群名称）')
+    overlap.add_argument('--min-groups', type=int, default=2, help='列出至少在多少个群中的成员')
+    overlap.add_argument('--limit', type=int, default=50, help='控制台最多列出的成员数')
+    overlap.add_argument('-o', '--output', default='group_overlap.csv', help='重叠矩阵CSV输出路径')
+    overlap.set_defaults(func=cmd_overlap)
+
+    reconcile = subparsers.add_parser('reconcile', help='将群成员与花名册CSV比对')
+    reconcile.add_argument('roster', help='花名册CSV文件')
+    reconcile.add_argument('--members', required=True, help='群成员文件')
+    reconcile.add_argument('--id-column', default='学号', help='花名册中的学号列名')
+    reconcile.add_argument('--city-column', default='城市', help='花名册中的城市列名')
+    reconcile.add_argument('-o', '--output', default='roster_reconciliation.csv', help='比对结果CSV输出路径')
+    reconcile.set_defaults(func=cmd_reconcile)
+
+    admin = subparsers.add_parser('admin', help='说明每个成员是否被判为马哥教育成员及依据的规则')
+    admin.add_argument('members', help='成员文件（每行一个成员）')
+    admin.add_argument('--group', help='群名称（使用该群的规则覆盖）')
+    admin.add_argument('--all', action='store_true', help='列出所有命中规则的成员')
+    admin.set_defaults(func=cmd_admin)
+
+    for stage in (analyze, report, reconcile):
+        stage.add_argument('--fuzzy', action='store_true', help='对未知地区成员进行拼音/繁体/错别字二次匹配')
+
+    for stage in (analyze, report, stream, reconcile, admin, pipeline, sketch, activity):
+        stage.add_argument('--admin-rules', help='马哥教育成员识别规则文件（JSON，默认使用内置规则）')
+
+    for stage in (acquire, analyze, report, stream, reconcile, pipeline, sketch, activity):
+        stage.add_argument('--name-format', choices=[template[0] for template in NAME_TEMPLATES],
+                           help='昵称格式（默认抽样自动识别）')
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    
+    if args.command is None:
+        # 未指定子命令时保持原有的交互式流程
+        analyzer = WeChatGroupAnalyzer()
+        analyzer.run()
+        return
     
-    # 运行分析器
-    analyzer.run()
+    args.func(args)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,223 @@
+import os
+import re
+import struct
+
+NATURAL_EARTH_BASE = 'data/ne_110m_admin_0_countries'
+
+# 由国内地名表处理的国家/地区
+DOMESTIC_CODES = {'CHN', 'TWN', 'HKG', 'MAC'}
+
+# Natural Earth 中没有、但需要识别的国家（110m 数据不含面积过小的国家）
+SUPPLEMENTARY_COUNTRIES = {
+    'SGP': ('新加坡', 'Singapore'),
+}
+
+# 常用的中文简称和英文写法
+COUNTRY_ALIASES = {
+    'USA': ['美利坚', 'usa', 'us', 'america', 'united states'],
+    'GBR': ['英格兰', '苏格兰', '威尔士', 'uk', 'england', 'britain', 'great britain', 'scotland'],
+    'KOR': ['韩国', '南韩', 'korea', 'south korea'],
+    'PRK': ['朝鲜', 'north korea'],
+    'ARE': ['阿联酋', 'uae'],
+    'RUS': ['俄国'],
+    'AUS': ['澳洲'],
+    'NZL': ['纽西兰'],
+    'CZE': ['捷克共和国'],
+    'DEU': ['deutschland'],
+}
+
+# 主要城市：(中文名, 英文名, ISO3)
+MAJOR_CITIES = [
+    ('多伦多', 'Toronto', 'CAN'), ('温哥华', 'Vancouver', 'CAN'), ('蒙特利尔', 'Montreal', 'CAN'),
+    ('渥太华', 'Ottawa', 'CAN'), ('卡尔加里', 'Calgary', 'CAN'),
+    ('纽约', 'New York', 'USA'), ('洛杉矶', 'Los Angeles', 'USA'), ('芝加哥', 'Chicago', 'USA'),
+    ('休斯顿', 'Houston', 'USA'), ('西雅图', 'Seattle', 'USA'), ('旧金山', 'San Francisco', 'USA'),
+    ('波士顿', 'Boston', 'USA'), ('硅谷', 'Silicon Valley', 'USA'), ('华盛顿', 'Washington', 'USA'),
+    ('费城', 'Philadelphia', 'USA'), ('达拉斯', 'Dallas', 'USA'), ('亚特兰大', 'Atlanta', 'USA'),
+    ('拉斯维加斯', 'Las Vegas', 'USA'), ('迈阿密', 'Miami', 'USA'), ('丹佛', 'Denver', 'USA'),
+    ('匹兹堡', 'Pittsburgh', 'USA'), ('底特律', 'Detroit', 'USA'), ('檀香山', 'Honolulu', 'USA'),
+    ('伦敦', 'London', 'GBR'), ('曼彻斯特', 'Manchester', 'GBR'), ('利物浦', 'Liverpool', 'GBR'),
+    ('伯明翰', 'Birmingham', 'GBR'), ('爱丁堡', 'Edinburgh', 'GBR'), ('格拉斯哥', 'Glasgow', 'GBR'),
+    ('巴黎', 'Paris', 'FRA'), ('马赛', 'Marseille', 'FRA'), ('里昂', 'Lyon', 'FRA'),
+    ('柏林', 'Berlin', 'DEU'), ('慕尼黑', 'Munich', 'DEU'), ('汉堡', 'Hamburg', 'DEU'),
+    ('法兰克福', 'Frankfurt', 'DEU'), ('斯图加特', 'Stuttgart', 'DEU'),
+    ('东京', 'Tokyo', 'JPN'), ('大阪', 'Osaka', 'JPN'), ('名古屋', 'Nagoya', 'JPN'),
+    ('京都', 'Kyoto', 'JPN'), ('横滨', 'Yokohama', 'JPN'), ('福冈', 'Fukuoka', 'JPN'),
+    ('札幌', 'Sapporo', 'JPN'), ('神户', 'Kobe', 'JPN'),
+    ('首尔', 'Seoul', 'KOR'), ('釜山', 'Busan', 'KOR'), ('仁川', 'Incheon', 'KOR'),
+    ('新加坡', 'Singapore', 'SGP'),
+    ('悉尼', 'Sydney', 'AUS'), ('墨尔本', 'Melbourne', 'AUS'), ('布里斯班', 'Brisbane', 'AUS'),
+    ('珀斯', 'Perth', 'AUS'), ('阿德莱德', 'Adelaide', 'AUS'), ('堪培拉', 'Canberra', 'AUS'),
+    ('奥克兰', 'Auckland', 'NZL'), ('惠灵顿', 'Wellington', 'NZL'),
+    ('迪拜', 'Dubai', 'ARE'), ('阿布扎比', 'Abu Dhabi', 'ARE'),
+    ('莫斯科', 'Moscow', 'RUS'), ('圣彼得堡', 'Saint Petersburg', 'RUS'),
+    ('马德里', 'Madrid', 'ESP'), ('巴塞罗那', 'Barcelona', 'ESP'),
+    ('米兰', 'Milan', 'ITA'), ('罗马', 'Rome', 'ITA'), ('威尼斯', 'Venice', 'ITA'), ('佛罗伦萨', 'Florence', 'ITA'),
+    ('阿姆斯特丹', 'Amsterdam', 'NLD'), ('鹿特丹', 'Rotterdam', 'NLD'),
+    ('苏黎世', 'Zurich', 'CHE'), ('日内瓦', 'Geneva', 'CHE'),
+    ('斯德哥尔摩', 'Stockholm', 'SWE'), ('哥本哈根', 'Copenhagen', 'DNK'), ('奥斯陆', 'Oslo', 'NOR'),
+    ('赫尔辛基', 'Helsinki', 'FIN'), ('维也纳', 'Vienna', 'AUT'), ('布鲁塞尔', 'Brussels', 'BEL'),
+    ('都柏林', 'Dublin', 'IRL'), ('里斯本', 'Lisbon', 'PRT'), ('雅典', 'Athens', 'GRC'),
+    ('伊斯坦布尔', 'Istanbul', 'TUR'),
+    ('曼谷', 'Bangkok', 'THA'), ('清迈', 'Chiang Mai', 'THA'), ('普吉', 'Phuket', 'THA'),
+    ('河内', 'Hanoi', 'VNM'), ('胡志明', 'Ho Chi Minh City', 'VNM'),
+    ('吉隆坡', 'Kuala Lumpur', 'MYS'), ('槟城', 'Penang', 'MYS'),
+    ('雅加达', 'Jakarta', 'IDN'), ('巴厘岛', 'Bali', 'IDN'), ('马尼拉', 'Manila', 'PHL'),
+    ('新德里', 'New Delhi', 'IND'), ('孟买', 'Mumbai', 'IND'), ('班加罗尔', 'Bangalore', 'IND'),
+    ('特拉维夫', 'Tel Aviv', 'ISR'), ('开罗', 'Cairo', 'EGY'),
+    ('约翰内斯堡', 'Johannesburg', 'ZAF'), ('开普敦', 'Cape Town', 'ZAF'),
+    ('圣保罗', 'Sao Paulo', 'BRA'), ('里约热内卢', 'Rio de Janeiro', 'BRA'),
+    ('墨西哥城', 'Mexico City', 'MEX'), ('布宜诺斯艾利斯', 'Buenos Aires', 'ARG'),
+    ('利雅得', 'Riyadh', 'SAU'), ('多哈', 'Doha', 'QAT'),
+    ('金边', 'Phnom Penh', 'KHM'), ('仰光', 'Yangon', 'MMR'), ('阿拉木图', 'Almaty', 'KAZ'),
+]
+
+# 可以在整个昵称中直接查找的两字国名；其余两字国名（如"马里""古巴""黑山"）容易与昵称用字冲突，
+# 只在独立的地点字段中识别
+COMMON_SHORT_NAMES = {'美国', '日本', '韩国', '英国', '法国', '德国', '俄国', '泰国', '越南',
+                      '澳洲', '荷兰', '瑞士', '瑞典', '挪威', '丹麦', '芬兰'}
+
+_SEGMENT_SPLIT = re.compile(r'[-－—_|｜/,，、()（）\[\]【】]+')
+
+
+def read_dbf(path, fields, encoding='utf-8'):
+    """读取 dBASE 属性表中的指定字段，逐条返回 {字段: 值}（避免为读取属性表加载 geopandas）"""
+    with open(path, 'rb') as f:
+        header = f.read(32)
+        record_count = struct.unpack('<I', header[4:8])[0]
+        header_length, record_length = struct.unpack('<HH', header[8:12])
+
+        descriptors = []
+        while True:
+            descriptor = f.read(32)
+            if not descriptor or descriptor[0] == 0x0D:
+                break
+            name = descriptor[:11].split(b'\0')[0].decode('ascii')
+            descriptors.append((name, descriptor[16]))
+
+        f.seek(header_length)
+        for _ in range(record_count):
+            record = f.read(record_length)
+            if len(record) < record_length:
+                break
+            if record[:1] == b'*':  # 已删除的记录
+                continue
+            row = {}
+            offset = 1
+            for name, length in descriptors:
+                if name in fields:
+                    row[name] = record[offset:offset + length].decode(encoding, errors='ignore').strip('\x00 ')
+                offset += length
+            yield row
+
+
+def country_code(row):
+    """Natural Earth 记录的 ISO3 代码；ISO_A3_EH 为 -99 时使用 ADM0_A3"""
+    code = row.get('ISO_A3_EH', '-99')
+    return row.get('ADM0_A3', '') if code == '-99' else code
+
+
+class WorldGazetteer:
+    """世界地名索引：国家（中英文名，来自 Natural Earth）和主要城市 -> ISO3 代码"""
+
+    def __init__(self, base_path=NATURAL_EARTH_BASE):
+        self.country_names = {}  # ISO3 -> 中文国名
+        self.names = {}          # 地名（英文为小写） -> ISO3
+        self.substring_names = {}  # 长度 -> {可在整个昵称中查找的中文地名}
+
+        dbf_path = base_path + '.dbf'
+        encoding = 'utf-8'
+        if os.path.exists(base_path + '.cpg'):
+            with open(base_path + '.cpg', 'r') as f:
+                encoding = f.read().strip() or encoding
+
+        fields = {'ISO_A3_EH', 'ADM0_A3', 'NAME', 'NAME_LONG', 'NAME_EN', 'NAME_ZH', 'NAME_ZHT'}
+        if os.path.exists(dbf_path):
+            for row in read_dbf(dbf_path, fields, encoding):
+                code = country_code(row)
+                if code in DOMESTIC_CODES:
+                    continue
+                self.country_names[code] = row['NAME_ZH']
+                for name in (row['NAME_ZH'], row['NAME_ZHT']):
+                    self._add_chinese(name, code)
+                for name in (row['NAME'], row['NAME_LONG'], row['NAME_EN']):
+                    self._add_english(name, code)
+        else:
+            print(f"未找到世界地图数据 {dbf_path}，只能识别内置的主要城市")
+
+        for code, (zh_name, en_name) in SUPPLEMENTARY_COUNTRIES.items():
+            self.country_names.setdefault(code, zh_name)
+            self._add_chinese(zh_name, code)
+            self._add_english(en_name, code)
+
+        for code, aliases in COUNTRY_ALIASES.items():
+            for alias in aliases:
+                if alias.isascii():
+                    self._add_english(alias, code)
+                else:
+                    self._add_chinese(alias, code)
+
+        for zh_name, en_name, code in MAJOR_CITIES:
+            self._add_chinese(zh_name, code, city=True)
+            self._add_english(en_name, code)
+
+        # 按长度降序查找，"墨西哥城"优先于"墨西哥"
+        self._lengths = sorted(self.substring_names, reverse=True)
+
+    def _add_chinese(self, name, code, city=False):
+        if not name:
+            return
+        self.names.setdefault(name, code)
+        if city or len(name) >= 3 or name in COMMON_SHORT_NAMES:
+            self.substring_names.setdefault(len(name), set()).add(name)
+
+    def _add_english(self, name, code):
+        if name:
+            self.names.setdefault(' '.join(name.lower().split()), code)
+
+    def country_name(self, code):
+        """ISO3 代码对应的中文国名"""
+        return self.country_names.get(code, code)
+
+    def match(self, member, location=None):
+        """识别成员所在国家，返回 (ISO3, 命中的地名)，无法识别时返回 None
+
+        location 为按昵称格式取出的地区字段，传入时只在该字段中查找。
+        """
+        if location is not None:
+            return self._match_field(location) or self._match_substring(location)
+
+        # 1. 独立的地点字段与地名完全一致。确定是地区字段的（"学号-城市-昵称"的城市字段）中英文均可；
+        #    其他用分隔符隔开的片段只认中文地名，避免把 Georgia 之类的英文昵称当成国家。
+        #    没有分隔符的昵称（如 Jordan、India、马里）不做整段匹配，只走下面的子串查找
+        segments = _SEGMENT_SPLIT.split(member)
+        if len(segments) > 1 and segments[0].strip().isdigit():
+            found = self._match_field(segments[1])
+            if found:
+                return found
+        elif len(segments) > 1:
+            for segment in segments:
+                if not segment.isascii():
+                    found = self._match_field(segment)
+                    if found:
+                        return found
+
+        # 2. 在整个昵称中查找城市名和不易误判的国名
+        return self._match_substring(member)
+
+    def _match_field(self, field):
+        """地区字段整体与地名（中文名、英文名或别名）一致时返回 (ISO3, 地名)"""
+        key = ' '.join(field.lower().split())
+        if key in self.names:
+            return self.names[key], field.strip()
+        return None
+
+    def _match_substring(self, text):
+        """在文本中查找中文城市名、三字及以上的国名和常用两字国名"""
+        for length in self._lengths:
+            candidates = self.substring_names[length]
+            for i in range(len(text) - length + 1):
+                name = text[i:i + length]
+                if name in candidates:
+                    return self.names[name], name
+        return None